@@ -1,6 +1,10 @@
 import streamlit as st
 import pandas as pd
-from component import page_style
+from component import memory_panel, page_style
+from paged_table import paged_table
+from profiler import profiler_panel
+from uploads import PREVIEW_ROWS, load_upload, sample_rows
+from warmup import warmup_panel
 
 page_style()
 
@@ -60,9 +64,28 @@ st.subheader("Example 5: File Upload")
 
 uploaded_file = st.file_uploader("Upload a CSV file", type="csv")
 if uploaded_file is not None:
-    uploaded_df = pd.read_csv(uploaded_file)
-    st.write("Here’s the uploaded DataFrame:")
-    st.dataframe(uploaded_df)
+    try:
+        with st.spinner("Reading the file..."):
+            upload = load_upload(uploaded_file)
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+        st.error(f"Could not read the file as CSV: {e}")
+    else:
+        uploaded_df = upload['frame']
+        if upload['truncated'] == 'rows':
+            st.warning(f"Only the first {upload['rows']:,} rows of the file were loaded.")
+        elif upload['truncated'] == 'memory':
+            st.warning(f"The file is too large to load in full; only the first {upload['rows']:,} rows were loaded.")
+
+        # Show a page (or a random sample) of the rows instead of all of them
+        st.write("Here’s the uploaded DataFrame:")
+        preview = st.radio("Preview", ["Page through rows", "Random sample"], horizontal=True)
+        if preview == "Page through rows":
+            paged_table('upload', uploaded_df, upload['version'])
+        else:
+            st.dataframe(sample_rows(uploaded_df, PREVIEW_ROWS))
+
+        st.write(f"Column profile ({len(uploaded_df):,} rows):")
+        st.dataframe(upload['profile'], hide_index=True)
 
 # Example 6: Button Interaction
 st.subheader("Example 6: Button Interaction")
@@ -72,3 +95,7 @@ if st.button("Click me"):
 
 # Final Remarks
 st.write("That's all for now! 🎈In the next page , we will deep dive into some of the examples of dashboard namely Continents Population Data and US Airport Traffic")
+
+memory_panel()
+profiler_panel('introduction')
+warmup_panel()
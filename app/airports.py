@@ -0,0 +1,240 @@
+import functools
+
+import numpy as np
+import pandas as pd
+
+from datasets import dataset_version, load_dataset
+from geo import GridIndex, cell_size_for_zoom, compact_points, grid_clusters, view_bbox, zoom_for_bbox
+
+# Dictionary mapping state abbreviations to full names
+STATE_NAMES = {
+    "AL": "Alabama", "AK": "Alaska", "AZ": "Arizona", "AR": "Arkansas", "CA": "California", "CO": "Colorado",
+    "CT": "Connecticut", "DE": "Delaware", "FL": "Florida", "GA": "Georgia", "HI": "Hawaii", "ID": "Idaho",
+    "IL": "Illinois", "IN": "Indiana", "IA": "Iowa", "KS": "Kansas", "KY": "Kentucky", "LA": "Louisiana",
+    "ME": "Maine", "MD": "Maryland", "MA": "Massachusetts", "MI": "Michigan", "MN": "Minnesota",
+    "MS": "Mississippi", "MO": "Missouri", "MT": "Montana", "NE": "Nebraska", "NV": "Nevada",
+    "NH": "New Hampshire", "NJ": "New Jersey", "NM": "New Mexico", "NY": "New York", "NC": "North Carolina",
+    "ND": "North Dakota", "OH": "Ohio", "OK": "Oklahoma", "OR": "Oregon", "PA": "Pennsylvania",
+    "RI": "Rhode Island", "SC": "South Carolina", "SD": "South Dakota", "TN": "Tennessee", "TX": "Texas",
+    "UT": "Utah", "VT": "Vermont", "VA": "Virginia", "WA": "Washington", "WV": "West Virginia",
+    "WI": "Wisconsin", "WY": "Wyoming"
+}
+
+# Columns the map layers and their tooltip need
+POINT_COLUMNS = ['lon', 'lat', 'airport', 'city', 'state_full', 'cnt']
+
+# Columns of a context layer, drawn without a tooltip
+CONTEXT_COLUMNS = ['lon', 'lat']
+
+# Level of detail: below this zoom, a map layer of more than
+# MAX_POINTS_PER_LAYER points is drawn as weighted grid clusters. From this
+# zoom on a view only covers a few degrees, so its points are drawn as they
+# are, and a state's map also shows the other airports in view.
+DETAIL_ZOOM = 7
+MAX_POINTS_PER_LAYER = 5000
+
+# Radius (meters) of a cluster holding a single airport
+CLUSTER_RADIUS = 10000
+
+# Cell size (degrees) of the spatial index used for viewport queries
+INDEX_CELL_SIZE = 1.0
+
+# Zoom of a map fitted to a state is capped, so a state with one airport
+# (a box of no size) is not shown at street level
+MAX_MAP_ZOOM = 9
+
+# (column, aggregation) of each edge of a (west, south, east, north) box
+BBOX_EDGES = [('lon', 'min'), ('lat', 'min'), ('lon', 'max'), ('lat', 'max')]
+
+# Airports in the page's rankings, overall and per state
+TOP_AIRPORTS = 10
+
+
+@functools.lru_cache(maxsize=2)
+def _load_airports(version):
+    # Renamed into a frame of its own: the shared dataset is not modified
+    df = load_dataset('us_airports').rename(columns={'long': 'lon'})
+    # Add full state names to the DataFrame, categorical like the codes.
+    # Codes without a name (territories, DC) are shown as they are.
+    states = df['state'].astype('category')
+    df['state_full'] = states.cat.rename_categories(
+        [STATE_NAMES.get(code, code) for code in states.cat.categories]
+    )
+    return df
+
+
+def load_airports():
+    """
+    Function to load the US airport traffic data with full state names,
+    prepared once per version of the source file.
+    """
+    return _load_airports(dataset_version('us_airports'))
+
+
+class AirportGeo:
+    """
+    Spatial layer over the airport data: a partition of the rows per state,
+    a grid index for viewport queries, and cached map layer data.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.index = GridIndex(df['lon'], df['lat'], INDEX_CELL_SIZE)
+
+        states = df['state_full']
+        codes, names = pd.factorize(states)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(names) + 1))
+        self._partition = {name: np.sort(order[bounds[i]:bounds[i + 1]]) for i, name in enumerate(names)}
+
+        self._layer_cache = {}
+
+    def states(self):
+        """
+        Full names of the states with airports, in order of appearance.
+        """
+        return list(self._partition)
+
+    def positions(self, state=None):
+        if state is None:
+            return np.arange(len(self.df))
+        return self._partition.get(state, np.empty(0, dtype=np.int64))
+
+    def _layer(self, positions, zoom, columns=POINT_COLUMNS):
+        points = self.df.take(positions)
+        if zoom >= DETAIL_ZOOM or len(points) <= MAX_POINTS_PER_LAYER:
+            return compact_points(points, columns), False
+        clusters = grid_clusters(points['lon'], points['lat'], points['cnt'], cell_size_for_zoom(zoom))
+        clusters = clusters.rename(columns={'weight': 'cnt'})
+        # Cluster area grows with the number of airports it holds
+        clusters['radius'] = (CLUSTER_RADIUS * np.sqrt(clusters['count'])).round()
+        return compact_points(clusters, ['lon', 'lat', 'cnt', 'count', 'radius']), True
+
+    def layer_data(self, state=None, zoom=3):
+        """
+        Compact data for a map layer of all airports (or one state's) at a
+        zoom level: the points themselves, or traffic-weighted grid clusters
+        below DETAIL_ZOOM when there are more than MAX_POINTS_PER_LAYER of
+        them.
+
+        Returns (data, clustered).
+        """
+        key = (state, round(zoom, 1))
+        if key not in self._layer_cache:
+            self._layer_cache[key] = self._layer(self.positions(state), zoom)
+        return self._layer_cache[key]
+
+    def view_data(self, bbox, zoom, exclude=None):
+        """
+        Like layer_data, for the airports inside a (west, south, east,
+        north) viewport, found through the grid index, leaving out the
+        airports of the state `exclude`. Points only carry their position,
+        for a context layer without tooltip.
+        """
+        key = ('view', tuple(round(edge, 4) for edge in bbox), exclude, round(zoom, 1))
+        if key not in self._layer_cache:
+            positions = self.index.query(bbox)
+            if exclude is not None:
+                positions = np.setdiff1d(positions, self.positions(exclude), assume_unique=True)
+            self._layer_cache[key] = self._layer(positions, zoom, CONTEXT_COLUMNS)
+        return self._layer_cache[key]
+
+
+@functools.lru_cache(maxsize=2)
+def _airport_geo(version):
+    return AirportGeo(_load_airports(version))
+
+
+def airport_geo():
+    """
+    Function to get the AirportGeo of the current data version.
+    """
+    return _airport_geo(dataset_version('us_airports'))
+
+
+def _fit_view(centroid, bbox):
+    """
+    (latitude, longitude, zoom) of a map centered on `centroid` that shows
+    all of `bbox`.
+    """
+    latitude, longitude = centroid
+    west, south, east, north = bbox
+    half_width = max(longitude - west, east - longitude)
+    half_height = max(latitude - south, north - latitude)
+    zoom = zoom_for_bbox((longitude - half_width, latitude - half_height, longitude + half_width, latitude + half_height))
+    return latitude, longitude, min(zoom, MAX_MAP_ZOOM)
+
+
+class AirportSummary:
+    """
+    Derived tables of the airport page, computed once per data version:
+    traffic totals per state, the airports ranked by traffic (overall and
+    per state), and the centroid, bounding box and map view of the country
+    (key None) and of each state.
+    """
+
+    def __init__(self, df):
+        self.state_traffic = df.groupby('state_full', observed=True)['cnt'].sum()
+
+        # Stable sort, so ties keep the first airport like idxmax does
+        ranked = df.take(np.argsort(-df['cnt'].to_numpy(), kind='stable'))
+        self.top = ranked.head(TOP_AIRPORTS).reset_index(drop=True)
+        self.top_by_state = {
+            state: rows.head(TOP_AIRPORTS).reset_index(drop=True)
+            for state, rows in ranked.groupby('state_full', observed=True, sort=False)
+        }
+        self.busiest = self.top.iloc[0] if len(self.top) else None
+        self.busiest_by_state = {state: rows.iloc[0] for state, rows in self.top_by_state.items()}
+
+        # In float64, so the means of float32 coordinates do not drift
+        coordinates = pd.DataFrame({
+            'state_full': df['state_full'], 'lat': df['lat'].astype('float64'), 'lon': df['lon'].astype('float64'),
+        })
+        stats = coordinates.groupby('state_full', observed=True).agg(['mean', 'min', 'max'])
+        self.centroids = {state: (float(row[('lat', 'mean')]), float(row[('lon', 'mean')])) for state, row in stats.iterrows()}
+        self.bboxes = {
+            state: tuple(float(row[(axis, edge)]) for axis, edge in BBOX_EDGES)
+            for state, row in stats.iterrows()
+        }
+        if len(df):
+            self.centroids[None] = (float(coordinates['lat'].mean()), float(coordinates['lon'].mean()))
+            self.bboxes[None] = tuple(float(coordinates[axis].agg(edge)) for axis, edge in BBOX_EDGES)
+        self.views = {state: _fit_view(self.centroids[state], self.bboxes[state]) for state in self.centroids}
+
+    def top_airports(self, n=TOP_AIRPORTS, state=None):
+        """
+        The `n` (up to TOP_AIRPORTS) busiest airports, overall or in one
+        state.
+        """
+        ranked = self.top if state is None else self.top_by_state.get(state, self.top.head(0))
+        return ranked.head(n)
+
+
+@functools.lru_cache(maxsize=2)
+def _airport_summary(version):
+    return AirportSummary(_load_airports(version))
+
+
+def airport_summary():
+    """
+    Function to get the AirportSummary of the current data version.
+    """
+    return _airport_summary(dataset_version('us_airports'))
+
+
+def map_layers(state=None):
+    """
+    Function to get what a map of the country (or of one state) draws: its
+    view as (latitude, longitude, zoom), the layer data of its airports,
+    and for a state shown from DETAIL_ZOOM on the layer data of the other
+    airports in view (None otherwise). Layer data is (data, clustered), see
+    AirportGeo.
+    """
+    geo, summary = airport_geo(), airport_summary()
+    latitude, longitude, zoom = summary.views[state]
+    nearby = None
+    # Further out the view covers most of the country, and the context would
+    # cost more to send than the state's own airports
+    if state is not None and zoom >= DETAIL_ZOOM:
+        nearby = geo.view_data(view_bbox(latitude, longitude, zoom), zoom, exclude=state)
+    return (latitude, longitude, zoom), geo.layer_data(state, zoom), nearby
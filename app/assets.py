@@ -0,0 +1,136 @@
+import base64
+import functools
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OPTIMIZED_DIR = os.path.join(ROOT_DIR, '.cache', 'assets')
+
+# Static images used by the pages. Each one is downsized to fit `max_size`
+# (in pixels) and re-encoded once, and the optimized variant is what gets sent
+# to the browser.
+ASSETS = {
+    'sidebar_background': {
+        'path': 'assets/Background_Analytics.jpg',
+        'max_size': (800, 1200),
+        'format': 'JPEG',
+        'quality': 75,
+    },
+    # Despite their extensions, the banner is a JPEG and the profile photo a
+    # PNG with transparency
+    'banner': {
+        'path': 'photos/My_Photo/Background_Photo.png',
+        'max_size': (1600, 400),
+        'format': 'JPEG',
+        'quality': 85,
+    },
+    'profile_photo': {
+        'path': 'photos/My_Photo/Round_Profile_Photo.jpg',
+        'max_size': (300, 300),
+        'format': 'PNG',
+    },
+    'page_icon': {
+        'path': 'photos/My_Photo/Round_Profile_Photo.jpg',
+        'max_size': (64, 64),
+        'format': 'PNG',
+    },
+    'after_cleaning': {
+        'path': 'assets/After_Cleaning.png',
+        'max_size': (400, 400),
+        'format': 'PNG',
+    },
+}
+
+MIME_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png'}
+
+_lock = threading.Lock()
+
+
+def _optimized_path(name, spec):
+    source = os.path.join(ROOT_DIR, spec['path'])
+    stat = os.stat(source)
+    # Any change to the source file or to its spec gives a new variant
+    key = hashlib.sha256(json.dumps([spec, stat.st_size, stat.st_mtime_ns]).encode()).hexdigest()[:12]
+    return os.path.join(OPTIMIZED_DIR, f"{name}-{key}.{spec['format'].lower()}")
+
+
+def _optimize(spec, path):
+    # Only needed when a variant is (re)built, not to serve one
+    from PIL import Image
+
+    source = os.path.join(ROOT_DIR, spec['path'])
+    image = Image.open(source)
+    source_format = image.format
+    image.thumbnail(spec['max_size'], Image.LANCZOS)
+    if spec['format'] == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    options = {'optimize': True}
+    if 'quality' in spec:
+        options['quality'] = spec['quality']
+    image.save(path + '.tmp', format=spec['format'], **options)
+
+    # Keep the original when re-encoding does not make it any smaller
+    if source_format == spec['format'] and os.path.getsize(path + '.tmp') >= os.path.getsize(source):
+        shutil.copyfile(source, path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+
+def precompute_assets():
+    """
+    Function to write the optimized variant of every asset to .cache/assets,
+    skipping the ones that are already up to date. Returns the paths of the
+    variants by asset name.
+    """
+    os.makedirs(OPTIMIZED_DIR, exist_ok=True)
+    paths = {}
+    with _lock:
+        for name, spec in ASSETS.items():
+            path = _optimized_path(name, spec)
+            if not os.path.exists(path):
+                _optimize(spec, path)
+            paths[name] = path
+
+        # Variants of older sources or specs are no longer needed
+        current = {os.path.basename(path) for path in paths.values()}
+        for filename in os.listdir(OPTIMIZED_DIR):
+            if filename not in current and not filename.endswith('.tmp'):
+                os.remove(os.path.join(OPTIMIZED_DIR, filename))
+    return paths
+
+
+@functools.lru_cache(maxsize=1)
+def _registry():
+    paths = precompute_assets()
+    registry = {}
+    for name, path in paths.items():
+        with open(path, 'rb') as f:
+            registry[name] = f.read()
+    return registry
+
+
+def asset_bytes(name):
+    """
+    Function to get the optimized bytes of an asset, loaded once per process.
+    """
+    return _registry()[name]
+
+
+@functools.lru_cache(maxsize=None)
+def asset_data_uri(name):
+    """
+    Function to get an asset as a base64 data URI, encoded once per process.
+    """
+    mime_type = MIME_TYPES[ASSETS[name]['format']]
+    return f"data:{mime_type};base64,{base64.b64encode(asset_bytes(name)).decode()}"
+
+
+if __name__ == '__main__':
+    # Run at deploy time to have the optimized variants ready before the
+    # first visitor: python app/assets.py
+    for name, path in precompute_assets().items():
+        source = os.path.join(ROOT_DIR, ASSETS[name]['path'])
+        print(f"{name}: {os.path.getsize(source)} -> {os.path.getsize(path)} bytes ({os.path.relpath(path, ROOT_DIR)})")
@@ -1,22 +1,19 @@
 import streamlit as st
-from PIL import Image
-import base64
+import functools
+from assets import asset_bytes, asset_data_uri
+from profiler import ENABLED as DIAGNOSTICS, timed
+from warmup import start as start_warmup
 
-def get_base64_of_bin_file(bin_file):
+@functools.lru_cache(maxsize=1)
+def get_custom_style():
     """
-    Function to encode local file (image or gif) to base64 string
+    Function to build the page CSS once per process, with the sidebar
+    background embedded as a data URI
     """
-    with open(bin_file, 'rb') as f:
-        data = f.read()
-    return base64.b64encode(data).decode()
+    sidebar_background_uri = asset_data_uri('sidebar_background')
 
-def page_style():
-    # Encode the local GIF to base64
-
-    sidebar_background_base64 = get_base64_of_bin_file('assets/Background_Analytics.jpg')
-
-    # Apply custom styles, including the sidebar background GIF
-    custom_style = f"""
+    # Apply custom styles, including the sidebar background image
+    return f"""
         <style>
             #MainMenu {{visibility: hidden;}}
             footer {{visibility: hidden;}}
@@ -25,7 +22,7 @@ def page_style():
             /* Sidebar background with a dark overlay */
             [data-testid="stSidebar"] > div:first-child {{
                 background-image: linear-gradient(rgba(0, 0, 0, 0.7), rgba(0, 0, 0, 0.8)), 
-                                  url("data:image/jpeg;base64,{sidebar_background_base64}");
+                                  url("{sidebar_background_uri}");
                 background-size: cover;
                 background-position: center;
                 background-repeat: no-repeat;
@@ -66,21 +63,24 @@ def page_style():
         </style>
     """
 
+@timed('page_style')
+def page_style():
+    # Start preparing every page's data in the background, once per process
+    start_warmup()
+
     # Set the page configuration
-    icon = Image.open('photos/My_Photo/Round_Profile_Photo.jpg')
-    st.set_page_config(page_title="Fahmi Zainal", page_icon=icon, layout="wide")
+    st.set_page_config(page_title="Fahmi Zainal", page_icon=asset_bytes('page_icon'), layout="wide")
 
     # Apply custom styles to the page
-    st.markdown(custom_style, unsafe_allow_html=True)
+    st.markdown(get_custom_style(), unsafe_allow_html=True)
 
     # Display the main background image
-    image = Image.open('photos/My_Photo/Background_Photo.png')
-    st.image(image)
+    st.image(asset_bytes('banner'))
 
     # Sidebar content
     with st.sidebar:
         # Display the round profile picture at the top of the sidebar
-        st.image("photos/My_Photo/Round_Profile_Photo.jpg", width=150)
+        st.image(asset_bytes('profile_photo'), width=150)
 
         st.markdown("""
             ## Created By: Fahmi Zainal
@@ -125,3 +125,47 @@ def page_style():
             </a>
         """, unsafe_allow_html=True)
 
+def format_bytes(size):
+    """
+    Function to format a number of bytes for display, or "n/a" if unknown
+    """
+    if size is None:
+        return "n/a"
+    for unit in ['B', 'KB', 'MB']:
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+def memory_panel():
+    """
+    Function to show the app's memory accounting in a collapsible sidebar
+    panel. Only shown when the APP_DIAGNOSTICS environment variable is set.
+    """
+    if not DIAGNOSTICS:
+        return
+
+    from memory_report import memory_report
+
+    report = memory_report()
+    with st.sidebar.expander("Memory Usage"):
+        st.markdown(f"""
+            - **Process (RSS):** {format_bytes(report['process_rss_bytes'])}
+            - **Shared dataframes:** {format_bytes(report['shared_frame_bytes'])}
+            - **Memory-mapped tables:** {format_bytes(report['mapped_table_bytes'])}
+            - **Cached charts:** {format_bytes(report['chart_cache_bytes'])}
+            - **Cached uploads:** {format_bytes(report['upload_cache_bytes'])}
+            - **Cached exports:** {format_bytes(report['export_cache_bytes'])}
+        """)
+        footprints = {name: usage['footprint'] for name, usage in report['datasets'].items() if usage['footprint']}
+        if footprints:
+            st.markdown("**Dataset dtypes (parsed → declared):**\n" + "\n".join(
+                f"- **{name}:** {format_bytes(footprint['before_bytes'])} → {format_bytes(footprint['after_bytes'])}"
+                for name, footprint in footprints.items()
+            ))
+        if report['sessions'] is not None:
+            st.markdown(f"""
+                - **Active sessions:** {report['sessions']}
+                - **Session state (all sessions):** {format_bytes(report['session_state_bytes'])}
+                - **Per session:** {format_bytes(report['per_session_bytes'])}
+            """)
@@ -0,0 +1,274 @@
+import email.utils
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+try:
+    import tomllib
+except ModuleNotFoundError:
+    # Python < 3.11: the same parser, from PyPI
+    import tomli as tomllib
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Per-source overrides, e.g.
+#
+#     [gapminder]
+#     url = "http://mirror.local/gapminderDataFiveYear.csv"
+#     ttl = 3600
+#
+# The environment wins over the file: DATASET_URL_<NAME>, DATASET_TTL_<NAME>.
+CONFIG_PATH = os.environ.get('DATA_SOURCES_CONFIG', os.path.join(ROOT_DIR, '.streamlit', 'data_sources.toml'))
+
+# Seconds to connect, and to wait for each read of a response
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 30
+
+# Bounded retries of failed connections and of 429/5xx responses, with
+# exponential backoff (0.5s, 1s, 2s, ...) capped at BACKOFF_MAX seconds
+RETRIES = 3
+BACKOFF_SECONDS = 0.5
+BACKOFF_MAX = 10
+
+# Connections kept open per host, shared by all sessions
+POOL_SIZE = 8
+
+# Size of the chunks a download is streamed to disk in
+CHUNK_BYTES = 1024 * 1024
+
+
+class FetchError(OSError):
+    """
+    A source could not be fetched. An OSError, like the network errors it
+    wraps, so callers can fall back to their local copy.
+    """
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _connection_pool():
+    """
+    The connection pool shared by all sessions. Created, and urllib3
+    imported, on the first request: a fresh snapshot needs no network.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            import urllib3
+
+            _pool = urllib3.PoolManager(
+                num_pools=4,
+                maxsize=POOL_SIZE,
+                timeout=urllib3.Timeout(connect=CONNECT_TIMEOUT, read=READ_TIMEOUT),
+                retries=urllib3.Retry(
+                    total=RETRIES,
+                    backoff_factor=BACKOFF_SECONDS,
+                    backoff_max=BACKOFF_MAX,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=['GET'],
+                ),
+            )
+        return _pool
+
+
+class HttpSource:
+    """
+    Source served over HTTP(S), through the shared connection pool.
+
+    Requests are conditional (If-None-Match / If-Modified-Since), so an
+    unchanged source costs one 304. Downloads are streamed to a partial
+    file; if one is interrupted, the next attempt resumes it with a Range
+    request (If-Range guards against the file changing in between).
+    """
+
+    def __init__(self, url):
+        self.url = url
+
+    def _resume_from(self, partial_path):
+        try:
+            with open(partial_path + '.json') as f:
+                validator = json.load(f)['validator']
+            return validator, os.path.getsize(partial_path)
+        except (OSError, ValueError, KeyError):
+            return None, 0
+
+    def _download(self, headers, partial_path):
+        headers = dict(headers)
+        validator, offset = self._resume_from(partial_path)
+        if validator and offset:
+            headers['Range'] = f'bytes={offset}-'
+            headers['If-Range'] = validator
+
+        import urllib3
+
+        response = _connection_pool().request('GET', self.url, headers=headers, preload_content=False)
+        try:
+            if response.status == 304:
+                return 304, None, response.headers
+            if response.status == 416:
+                # The partial file does not match the source any more
+                _discard(partial_path)
+                raise urllib3.exceptions.ProtocolError("range not satisfiable, restarting the download")
+            if response.status not in (200, 206):
+                raise FetchError(f"{self.url}: HTTP {response.status}")
+
+            # A 200 (no resume, or If-Range did not match) starts over
+            validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+            if response.status == 200:
+                _discard(partial_path)
+                if validator:
+                    with open(partial_path + '.json', 'w') as f:
+                        json.dump({'validator': validator}, f)
+            with open(partial_path, 'ab') as f:
+                for chunk in response.stream(CHUNK_BYTES):
+                    f.write(chunk)
+        finally:
+            response.release_conn()
+
+        with open(partial_path, 'rb') as f:
+            body = f.read()
+        _discard(partial_path)
+        return 200, body, response.headers
+
+    def fetch(self, meta, partial_path):
+        import urllib3
+
+        headers = {}
+        if meta:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        # The pool retries connections and error statuses; a download that
+        # breaks off midway is resumed here, up to RETRIES times
+        for attempt in range(RETRIES + 1):
+            try:
+                return self._download(headers, partial_path)
+            except FetchError:
+                raise
+            except urllib3.exceptions.MaxRetryError as e:
+                raise FetchError(f"{self.url}: {e.reason}") from e
+            except (urllib3.exceptions.HTTPError, OSError) as e:
+                if attempt == RETRIES:
+                    raise FetchError(f"{self.url}: {e}") from e
+                time.sleep(min(BACKOFF_SECONDS * 2 ** attempt, BACKOFF_MAX))
+
+
+class FileSource:
+    """
+    Source read from a local file, e.g. a mirror on a shared volume. Its
+    modification time and size stand in for an ETag.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def fetch(self, meta, partial_path):
+        try:
+            stat = os.stat(self.path)
+        except OSError as e:
+            raise FetchError(f"{self.path}: {e.strerror}") from e
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        headers = {'ETag': etag, 'Last-Modified': email.utils.formatdate(stat.st_mtime, usegmt=True)}
+        if meta and meta.get('etag') == etag:
+            return 304, None, headers
+        with open(self.path, 'rb') as f:
+            return 200, f.read(), headers
+
+
+class StubSource:
+    """
+    Source served from memory by this process (see register_stub), for
+    tests and benchmarks that should not touch the network or the disk.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def fetch(self, meta, partial_path):
+        if self.name not in _stubs:
+            raise FetchError(f"no stub registered for '{self.name}'")
+        body = _stubs[self.name]
+        body = body() if callable(body) else body
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        if meta and meta.get('etag') == etag:
+            return 304, None, {'ETag': etag}
+        return 200, body, {'ETag': etag}
+
+
+_stubs = {}
+_backends = {}
+_lock = threading.Lock()
+
+
+def register_stub(name, body):
+    """
+    Function to serve a source from memory: `body` is the file's bytes, or
+    a function returning them. Point the source at it with the URL 'stub:'.
+    """
+    _stubs[name] = body
+
+
+def _discard(partial_path):
+    for path in (partial_path, partial_path + '.json'):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _read_config():
+    try:
+        with open(CONFIG_PATH, 'rb') as f:
+            return tomllib.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, tomllib.TOMLDecodeError) as e:
+        logger.warning("Ignoring %s (%s)", CONFIG_PATH, e)
+        return {}
+
+
+def configure(sources):
+    """
+    Function to apply the overrides of CONFIG_PATH and of the environment
+    (DATASET_URL_<NAME>, DATASET_TTL_<NAME>) to a catalog of sources, in
+    place.
+    """
+    config = _read_config()
+    for name, source in sources.items():
+        for key in ('url', 'ttl'):
+            if key in config.get(name, {}):
+                source[key] = config[name][key]
+        source['url'] = os.environ.get(f'DATASET_URL_{name.upper()}', source['url'])
+        if f'DATASET_TTL_{name.upper()}' in os.environ:
+            source['ttl'] = float(os.environ[f'DATASET_TTL_{name.upper()}'])
+    return sources
+
+
+def source_backend(name, url):
+    """
+    Function to get the backend of a source URL: HttpSource for http(s),
+    FileSource for file: URLs and plain paths (relative to the project
+    root), StubSource for 'stub:'.
+    """
+    with _lock:
+        if (name, url) not in _backends:
+            scheme = urllib.parse.urlsplit(url).scheme
+            if scheme in ('http', 'https'):
+                backend = HttpSource(url)
+            elif scheme == 'stub':
+                backend = StubSource(name)
+            elif scheme == 'file':
+                backend = FileSource(urllib.request.url2pathname(urllib.parse.urlsplit(url).path))
+            else:
+                backend = FileSource(os.path.join(ROOT_DIR, url))
+            _backends[(name, url)] = backend
+        return _backends[(name, url)]
@@ -0,0 +1,274 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+from data_sources import configure, source_backend
+from lru import SizedLRU
+from profiler import count, stage
+from schemas import apply_schema, frame_bytes, schema_version, table_to_frame
+
+logger = logging.getLogger(__name__)
+
+# Local cache lives at the project root, next to the assets folder, unless
+# DATASET_CACHE_DIR points elsewhere (the benchmarks use a scratch folder)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.environ.get('DATASET_CACHE_DIR', os.path.join(ROOT_DIR, '.cache', 'datasets'))
+
+# Remote datasets used by the pages. 'ttl' is how long (in seconds) a local
+# snapshot is trusted before it is revalidated against the source. The URL
+# can also be a local file or 'stub:' (see data_sources.py).
+SOURCES = {
+    'gapminder': {
+        'url': 'https://raw.githubusercontent.com/plotly/datasets/master/gapminderDataFiveYear.csv',
+        'format': 'csv',
+        'ttl': 24 * 60 * 60,
+    },
+    'us_airports': {
+        'url': 'https://raw.githubusercontent.com/plotly/datasets/master/2011_february_us_airport_traffic.csv',
+        'format': 'csv',
+        'ttl': 24 * 60 * 60,
+    },
+    'malaysia_population': {
+        'url': 'https://storage.dosm.gov.my/population/population_malaysia.parquet',
+        'format': 'parquet',
+        'ttl': 6 * 60 * 60,
+    },
+}
+
+# Overrides from .streamlit/data_sources.toml and DATASET_URL_<NAME>, e.g.
+# to serve the app from a mirror or from local fixtures
+configure(SOURCES)
+
+# Upper bound for the dataframes kept in memory by this process
+MEMORY_LIMIT_BYTES = 512 * 1024 * 1024
+
+
+_memory_cache = SizedLRU(MEMORY_LIMIT_BYTES)
+_source_locks = {name: threading.Lock() for name in SOURCES}
+
+
+def _source_dir(name):
+    return os.path.join(CACHE_DIR, name)
+
+
+def _read_meta(name):
+    try:
+        with open(os.path.join(_source_dir(name), 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(name, meta):
+    path = os.path.join(_source_dir(name), 'meta.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def _snapshot_path(name, version):
+    return os.path.join(_source_dir(name), f'{version}.arrow')
+
+
+def _parse(body, fmt):
+    if fmt == 'parquet':
+        return pd.read_parquet(io.BytesIO(body))
+    return pd.read_csv(io.BytesIO(body))
+
+
+def _open_snapshot(path):
+    """
+    Memory-map an Arrow IPC snapshot. The table's buffers point into the
+    mapped file, so they live in the OS page cache (shared by every process
+    serving the app) instead of the Python heap, and cannot be modified.
+    """
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+
+def _fetch(name, meta):
+    """
+    Conditional fetch of a source. Returns (status, body, headers), where a
+    status of 304 means the local snapshot is still current.
+    """
+    os.makedirs(_source_dir(name), exist_ok=True)
+    backend = source_backend(name, SOURCES[name]['url'])
+    return backend.fetch(meta, os.path.join(_source_dir(name), 'download.part'))
+
+
+def _remove_old_snapshots(name, version):
+    """
+    Only the current snapshot is kept on disk. An older one that is still
+    memory-mapped cannot be removed on Windows: it is skipped, and removed
+    by a later refresh instead.
+    """
+    for filename in os.listdir(_source_dir(name)):
+        if filename != f'{version}.arrow' and filename != 'meta.json':
+            try:
+                os.remove(os.path.join(_source_dir(name), filename))
+            except OSError as e:
+                logger.info("Keeping '%s' of '%s' until a later refresh (%s)", filename, name, e)
+
+
+def _store_snapshot(name, df, body, headers, footprint):
+    os.makedirs(_source_dir(name), exist_ok=True)
+    # Versioned by content and schema: new dtypes make a new snapshot, and
+    # invalidate everything derived from the old one
+    version = hashlib.sha256(body + schema_version(name).encode()).hexdigest()[:16]
+    path = _snapshot_path(name, version)
+    if not os.path.exists(path):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        # Uncompressed, so the snapshot can be memory-mapped as is
+        with pa.OSFile(path + '.tmp', 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(path + '.tmp', path)
+
+    _remove_old_snapshots(name, version)
+    return {
+        'version': version,
+        'etag': headers.get('ETag'),
+        'last_modified': headers.get('Last-Modified'),
+        'checked_at': time.time(),
+        'stale': False,
+        'schema': schema_version(name),
+        'footprint': footprint,
+    }
+
+
+def _remember(name, meta, frame=None):
+    """
+    Keep the memory-mapped table of the current snapshot, reusing the one
+    already in memory if it is the same version.
+    """
+    cached = _memory_cache.get(name)
+    if cached is not None and cached['meta']['version'] == meta['version']:
+        entry = dict(cached, meta=meta)
+        if frame is not None:
+            entry['frame'] = frame
+    else:
+        entry = {'table': _open_snapshot(_snapshot_path(name, meta['version'])), 'frame': frame, 'meta': meta}
+    # Only the pandas copy counts against the limit: the table is mapped
+    _memory_cache.put(name, entry, frame_bytes(entry['frame']))
+    return entry
+
+
+def _refresh(name):
+    source = SOURCES[name]
+    meta = _read_meta(name)
+    snapshot = _snapshot_path(name, meta['version']) if meta else None
+    has_snapshot = snapshot is not None and os.path.exists(snapshot)
+    # A snapshot written with other dtypes is fetched again in full, but
+    # still served when offline
+    current = has_snapshot and meta.get('schema') == schema_version(name)
+
+    # A fresh snapshot on disk: no network at all
+    if current and time.time() - meta['checked_at'] < source['ttl']:
+        return _remember(name, meta)
+
+    try:
+        with stage(f'fetch {name}'):
+            status, body, headers = _fetch(name, meta if current else None)
+    except OSError as e:
+        if not has_snapshot:
+            raise
+        # Offline: serve the last good snapshot and retry after the TTL
+        logger.warning("Could not revalidate '%s' (%s), serving cached snapshot %s", name, e, meta['version'])
+        meta = dict(meta, checked_at=time.time(), stale=True)
+        _write_meta(name, meta)
+        return _remember(name, meta)
+
+    if status == 304:
+        meta = dict(meta, checked_at=time.time(), stale=False)
+        _write_meta(name, meta)
+        _remove_old_snapshots(name, meta['version'])
+        return _remember(name, meta)
+
+    with stage(f'parse {name}'):
+        df, footprint = apply_schema(name, _parse(body, source['format']))
+        meta = _store_snapshot(name, df, body, headers, footprint)
+    _write_meta(name, meta)
+    return _remember(name, meta, df)
+
+
+def _is_fresh(entry, name):
+    return entry is not None and time.time() - entry['meta']['checked_at'] < SOURCES[name]['ttl']
+
+
+def _entry(name):
+    cached = _memory_cache.get(name)
+    count('datasets', _is_fresh(cached, name))
+    if _is_fresh(cached, name):
+        return cached
+
+    with _source_locks[name]:
+        # Another session may have refreshed the source while we waited
+        cached = _memory_cache.get(name)
+        if _is_fresh(cached, name):
+            return cached
+        return _refresh(name)
+
+
+def load_table(name):
+    """
+    Function to get one of the datasets in SOURCES as a read-only Arrow
+    table, memory-mapped from the local snapshot. Displaying or slicing it
+    does not copy the data into the Python heap.
+    """
+    return _entry(name)['table']
+
+
+def load_dataset(name):
+    """
+    Function to load one of the datasets in SOURCES as a dataframe.
+
+    Reruns are served from memory, a restart is served from the local Arrow
+    snapshot, and the remote copy is only revalidated (with ETag /
+    Last-Modified) once the source's TTL has expired. If the network is down
+    the last good snapshot is used instead.
+
+    Columns have the dtypes declared in schemas.SCHEMAS (categoricals,
+    Arrow-backed strings, downcast numbers). The returned dataframe is one
+    copy shared by all sessions and must not be modified in place: derive a
+    new frame (or take an explicit copy) to add or change columns.
+    """
+    entry = _entry(name)
+    if entry['frame'] is None:
+        with _source_locks[name]:
+            entry = _memory_cache.get(name) or entry
+            if entry['frame'] is None:
+                with stage(f'materialize {name}'):
+                    entry = _remember(name, entry['meta'], table_to_frame(entry['table']))
+    return entry['frame']
+
+
+def dataset_version(name):
+    """
+    Function to get the version (content hash) of the loaded copy of a
+    dataset, to be used as part of cache keys.
+    """
+    return _entry(name)['meta']['version']
+
+
+def memory_usage():
+    """
+    Function to report the memory held by the loaded datasets: bytes of
+    pandas copies in the heap and of memory-mapped Arrow tables, per source,
+    and the footprint of the frame as parsed and with its declared dtypes.
+    """
+    usage = {}
+    for name in SOURCES:
+        cached = _memory_cache.get(name)
+        if cached is not None:
+            usage[name] = {
+                'frame_bytes': frame_bytes(cached['frame']),
+                'mapped_bytes': cached['table'].nbytes,
+                'footprint': cached['meta'].get('footprint'),
+            }
+    return usage
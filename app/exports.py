@@ -0,0 +1,175 @@
+import gzip
+import hashlib
+import os
+import threading
+
+import pyarrow as pa
+import streamlit as st
+
+from datasets import ROOT_DIR
+from lru import SizedLRU
+from profiler import count, stage
+
+EXPORT_DIR = os.path.join(ROOT_DIR, '.cache', 'exports')
+
+# Export formats offered next to the filtered tables
+FORMATS = {
+    'csv': {'label': 'CSV', 'extension': 'csv', 'mime': 'text/csv'},
+    'csv.gz': {'label': 'Compressed CSV (gzip)', 'extension': 'csv.gz', 'mime': 'application/gzip'},
+    'parquet': {'label': 'Parquet', 'extension': 'parquet', 'mime': 'application/vnd.apache.parquet'},
+}
+
+# Rows serialized at a time, so a large slice is never held as one string
+CHUNK_ROWS = 50_000
+
+# Upper bound for the exports kept on disk, shared by all sessions
+EXPORT_LIMIT_BYTES = 256 * 1024 * 1024
+
+# Upper bound for the prepared exports kept in memory for the download
+# buttons, shared by all sessions
+EXPORT_CACHE_BYTES = int(os.environ.get('EXPORT_CACHE_BYTES', 64 * 1024 * 1024))
+
+_lock = threading.Lock()
+
+# Contents of the prepared exports by export key
+_export_cache = SizedLRU(EXPORT_CACHE_BYTES)
+
+
+def _chunks(df, positions=None):
+    # At least one (possibly empty) chunk, so an empty export still gets its header
+    rows = len(df) if positions is None else len(positions)
+    for start in range(0, max(rows, 1), CHUNK_ROWS):
+        if positions is None:
+            yield df.iloc[start:start + CHUNK_ROWS]
+        else:
+            yield df.take(positions[start:start + CHUNK_ROWS])
+
+
+def write_export(df, fmt, path, positions=None):
+    """
+    Function to write a dataframe to `path` in one of the FORMATS, chunk by
+    chunk: CSV and gzip CSV are streamed to the file, Parquet gets one row
+    group per chunk. If given, only the rows at `positions` are written,
+    taken one chunk at a time.
+    """
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            for chunk in _chunks(df, positions):
+                table = pa.Table.from_pandas(chunk, schema=writer.schema if writer else None, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+        return
+
+    opener = gzip.open if fmt == 'csv.gz' else open
+    with opener(path, 'wt', newline='') as f:
+        for i, chunk in enumerate(_chunks(df, positions)):
+            chunk.to_csv(f, index=False, header=i == 0)
+
+
+def export_key(name, state, fmt, data_version):
+    """
+    Function to get the cache key of an export: a hash of (export name,
+    filter state, format, data version).
+    """
+    return hashlib.sha256(repr((name, state, fmt, data_version)).encode()).hexdigest()[:16]
+
+
+def _prune(keep):
+    files = [os.path.join(EXPORT_DIR, filename) for filename in os.listdir(EXPORT_DIR) if not filename.endswith('.tmp')]
+    files.sort(key=os.path.getmtime, reverse=True)
+    total = 0
+    for path in files:
+        total += os.path.getsize(path)
+        # Least recently prepared exports go first; the new one always stays
+        if total > EXPORT_LIMIT_BYTES and path != keep:
+            os.remove(path)
+
+
+def export_file(name, df, state, fmt, data_version, positions=None):
+    """
+    Function to get the path of an export of `df` (or of its rows at
+    `positions`), written on the first request for its (name, filter state,
+    format, data version) and reused by every session after that.
+    """
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = os.path.join(EXPORT_DIR, f"{export_key(name, state, fmt, data_version)}.{FORMATS[fmt]['extension']}")
+    count('exports', os.path.exists(path))
+    if os.path.exists(path):
+        os.utime(path)
+        return path
+
+    tmp_path = f'{path}.{threading.get_ident()}.tmp'
+    with stage(f'export {fmt}'):
+        write_export(df, fmt, tmp_path, positions)
+    os.replace(tmp_path, path)
+    with _lock:
+        _prune(path)
+    return path
+
+
+def export_data(key, path):
+    """
+    Function to get the contents of a prepared export, read from `path`
+    once and then served from memory. Raises FileNotFoundError if the file
+    was pruned before it was ever read.
+    """
+    cached = _export_cache.get(key)
+    if cached is None:
+        with open(path, 'rb') as f:
+            cached = {'data': f.read()}
+        _export_cache.put(key, cached, len(cached['data']))
+    return cached['data']
+
+
+def export_controls(name, df, state, data_version, file_stem, positions=None):
+    """
+    Function to show the export controls of a filtered table: a format
+    picker and a button that prepares the file on demand. The download
+    button only appears once the export for the current filters is ready,
+    so reruns never serialize the data, and its contents are served from
+    memory rather than read from disk on every rerun.
+
+    The filtered table is either `df` itself or, without copying it, the
+    rows of `df` at `positions`.
+    """
+    fmt = st.selectbox(
+        "Export format", list(FORMATS), format_func=lambda f: FORMATS[f]['label'], key=f'{name}_export_format'
+    )
+    key = export_key(name, state, fmt, data_version)
+    prepared_key = f'{name}_export'
+
+    data = None
+    prepared = st.session_state.get(prepared_key)
+    if prepared is not None and prepared[0] == key:
+        try:
+            data = export_data(key, prepared[1])
+        except FileNotFoundError:
+            # Pruned by another session before it was read: prepare it again
+            del st.session_state[prepared_key]
+
+    if data is None:
+        if not st.button(f"Prepare {FORMATS[fmt]['label']} Download", key=f'{name}_export_prepare'):
+            return
+        with st.spinner("Preparing the export..."):
+            path = export_file(name, df, state, fmt, data_version, positions)
+            try:
+                data = export_data(key, path)
+            except FileNotFoundError:
+                st.warning("The export was removed before it could be served, please prepare it again.")
+                return
+        st.session_state[prepared_key] = (key, path)
+
+    st.download_button(
+        label=f"Download Filtered Data as {FORMATS[fmt]['label']}",
+        data=data,
+        file_name=f"{file_stem}.{FORMATS[fmt]['extension']}",
+        mime=FORMATS[fmt]['mime'],
+        key=f'{name}_export_download',
+    )
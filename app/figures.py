@@ -0,0 +1,265 @@
+import importlib
+import io
+import json
+import os
+import threading
+
+from lru import SizedLRU
+from profiler import count, stage
+
+# matplotlib and seaborn (with scipy) take over a second to import, so they
+# are imported where an image is drawn, not with this module: a page whose
+# charts are cached, or rendered as vega-lite, never loads them.
+
+# 'matplotlib' renders cached images, 'vega-lite' sends native chart specs to
+# the browser instead.
+RENDERER = os.environ.get('CHART_RENDERER', 'matplotlib')
+
+# Image format of the matplotlib renderer: 'png' or 'svg'
+IMAGE_FORMAT = os.environ.get('CHART_IMAGE_FORMAT', 'png')
+
+# Same resolution st.pyplot renders with
+IMAGE_DPI = 200
+
+# Upper bound for the rendered charts kept in memory by this process
+MEMORY_LIMIT_BYTES = 64 * 1024 * 1024
+
+_chart_cache = SizedLRU(MEMORY_LIMIT_BYTES)
+_render_lock = threading.Lock()
+
+
+class BarChart:
+    """
+    Bar chart of `y` per `x`, split by `hue` if given. With horizontal=True
+    the categories go on the y axis instead. With dodge=False the bars of
+    a category are stacked instead of side by side (e.g. an age pyramid,
+    with one side negative).
+    """
+
+    def __init__(self, data, x, y, title, xlabel, ylabel, hue=None, order=None, hue_order=None,
+                 horizontal=False, rotate_labels=False, figsize=(8, 5), dodge=True):
+        self.data = data
+        self.x, self.y, self.hue = x, y, hue
+        self.order, self.hue_order = order, hue_order
+        self.title, self.xlabel, self.ylabel = title, xlabel, ylabel
+        self.horizontal = horizontal
+        self.rotate_labels = rotate_labels
+        self.figsize = figsize
+        self.dodge = dodge
+
+    def draw(self, ax):
+        import seaborn as sns
+
+        sns.barplot(
+            data=self.data, x=self.x, y=self.y, hue=self.hue,
+            order=self.order, hue_order=self.hue_order, errorbar=None, dodge=self.dodge, ax=ax,
+        )
+
+    def vega_lite(self):
+        category, value = (self.y, self.x) if self.horizontal else (self.x, self.y)
+        category_axis, value_axis = ('y', 'x') if self.horizontal else ('x', 'y')
+        encoding = {
+            category_axis: {
+                'field': category, 'type': 'nominal', 'sort': self.order,
+                'title': self.ylabel if self.horizontal else self.xlabel,
+                'axis': {'labelAngle': -45} if self.rotate_labels else {},
+            },
+            value_axis: {
+                'field': value, 'type': 'quantitative',
+                'title': self.xlabel if self.horizontal else self.ylabel,
+            },
+        }
+        if self.hue:
+            encoding['color'] = {'field': self.hue, 'type': 'nominal', 'sort': self.hue_order}
+            if self.dodge:
+                encoding[category_axis + 'Offset'] = {'field': self.hue, 'sort': self.hue_order}
+        return {
+            'title': self.title,
+            'data': {'values': _records(self.data)},
+            'mark': 'bar',
+            'encoding': encoding,
+        }
+
+
+class LineChart:
+    """
+    Line chart of `y` against the numeric `x`, one line per value of
+    `series` if given. `styles` maps a series to matplotlib line options
+    (e.g. color and linestyle); a '--' linestyle is drawn dashed in Vega-Lite
+    too.
+    """
+
+    def __init__(self, data, x, y, title, xlabel, ylabel, series=None, styles=None,
+                 legend_title=None, rotate_labels=False, figsize=(10, 6)):
+        self.data = data
+        self.x, self.y, self.series = x, y, series
+        self.styles = styles or {}
+        self.title, self.xlabel, self.ylabel = title, xlabel, ylabel
+        self.legend_title = legend_title
+        self.rotate_labels = rotate_labels
+        self.figsize = figsize
+
+    def _groups(self):
+        if self.series is None:
+            return [(None, self.data)]
+        return [(name, self.data[self.data[self.series] == name]) for name in self.data[self.series].unique()]
+
+    def draw(self, ax):
+        for name, group in self._groups():
+            style = dict({'marker': 'o', 'linestyle': '-'}, **self.styles.get(name, {}))
+            ax.plot(group[self.x], group[self.y], label=name, **style)
+        # Without lines (nothing selected) there is nothing to label
+        if self.series is not None and ax.get_legend_handles_labels()[0]:
+            ax.legend(title=self.legend_title)
+
+    def vega_lite(self):
+        encoding = {
+            'x': {
+                'field': self.x, 'type': 'quantitative', 'title': self.xlabel,
+                'axis': dict({'format': 'd'}, **({'labelAngle': -45} if self.rotate_labels else {})),
+                'scale': {'zero': False},
+            },
+            'y': {'field': self.y, 'type': 'quantitative', 'title': self.ylabel},
+        }
+        if self.series:
+            encoding['color'] = {'field': self.series, 'type': 'nominal', 'title': self.legend_title}
+            dashed = [name for name, style in self.styles.items() if style.get('linestyle') == '--']
+            if dashed:
+                encoding['strokeDash'] = {
+                    'condition': {'test': {'field': self.series, 'oneOf': dashed}, 'value': [6, 4]},
+                    'value': [1, 0],
+                }
+        return {
+            'title': self.title,
+            'data': {'values': _records(self.data)},
+            'mark': {'type': 'line', 'point': True},
+            'encoding': encoding,
+        }
+
+
+def _records(data):
+    # Round-trip through JSON so numpy scalars and categoricals serialize
+    return json.loads(data.to_json(orient='records'))
+
+
+def render_image(chart, image_format=IMAGE_FORMAT):
+    """
+    Function to render a chart to PNG or SVG bytes.
+
+    The figure is created without pyplot, so it is never registered in
+    pyplot's global state, and it is cleared as soon as it has been saved.
+    """
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=chart.figsize)
+    try:
+        ax = fig.subplots()
+        chart.draw(ax)
+        ax.set_title(chart.title)
+        ax.set_xlabel(chart.xlabel)
+        ax.set_ylabel(chart.ylabel)
+        if chart.rotate_labels:
+            ax.tick_params(axis='x', labelrotation=45)
+        if isinstance(chart, LineChart):
+            ax.grid(True)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format=image_format, dpi=IMAGE_DPI, bbox_inches='tight')
+        return buffer.getvalue()
+    finally:
+        fig.clear()
+
+
+def import_renderer():
+    """
+    Function to import the image renderer ahead of the first chart, in a
+    fresh chart process.
+    """
+    for module in ('seaborn', 'matplotlib.figure'):
+        importlib.import_module(module)
+    return True
+
+
+def chart_output():
+    """
+    Function to get what charts are rendered to: 'vega-lite', or the image
+    format of the matplotlib renderer.
+    """
+    return 'vega-lite' if RENDERER == 'vega-lite' else IMAGE_FORMAT
+
+
+def cached_chart(name, state, data_version):
+    """
+    Function to look up a rendered chart by (chart name, filter state, data
+    version). Returns None on a cache miss.
+    """
+    cached = _chart_cache.get((name, state, data_version, chart_output()))
+    count('charts', cached is not None)
+    return cached['chart'] if cached is not None else None
+
+
+def store_chart(name, state, data_version, rendered):
+    """
+    Function to add a rendered chart to the cache (see cached_chart).
+    """
+    size = len(json.dumps(rendered)) if isinstance(rendered, dict) else len(rendered)
+    _chart_cache.put((name, state, data_version, chart_output()), {'chart': rendered}, size)
+
+
+def render_chart(chart, output):
+    """
+    Function to render a chart in this process: a Vega-Lite spec, or image
+    bytes. matplotlib is not thread-safe, so image renders take turns.
+    """
+    if output == 'vega-lite':
+        return chart.vega_lite()
+    with _render_lock:
+        return render_image(chart, output)
+
+
+def get_chart(name, state, data_version, build):
+    """
+    Function to get a rendered chart from the cache, keyed by (chart name,
+    filter state, data version). `build` is only called on a cache miss and
+    returns the BarChart/LineChart to render.
+
+    Returns image bytes, or a Vega-Lite spec when RENDERER is 'vega-lite'.
+    """
+    rendered = cached_chart(name, state, data_version)
+    if rendered is not None:
+        return rendered
+
+    with stage(f'render {name}'):
+        rendered = render_chart(build(), chart_output())
+    store_chart(name, state, data_version, rendered)
+    return rendered
+
+
+def display_chart(target, rendered):
+    """
+    Function to display a rendered chart in `target`: the page (st), a
+    container or a placeholder.
+    """
+    if isinstance(rendered, dict):
+        target.vega_lite_chart(rendered, use_container_width=True)
+    elif IMAGE_FORMAT == 'svg':
+        target.image(rendered.decode(), use_column_width=True)
+    else:
+        target.image(rendered, use_column_width=True)
+
+
+def state_key(*parts):
+    """
+    Function to turn widget values (lists, tuples, dicts, scalars) into a
+    hashable cache key. Lists (e.g. multiselect values) are sets of choices,
+    so the same values picked in another order give the same key; tuples
+    (e.g. a slider's range) keep their order.
+    """
+    def freeze(value):
+        if isinstance(value, dict):
+            return tuple((k, freeze(v)) for k, v in sorted(value.items()))
+        if isinstance(value, list):
+            return tuple(sorted((freeze(v) for v in value), key=repr))
+        if isinstance(value, tuple):
+            return tuple(freeze(v) for v in value)
+        return value
+    return freeze(parts)
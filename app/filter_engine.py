@@ -0,0 +1,110 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from profiler import count
+
+
+class FilterIndex:
+    """
+    Index over a dataframe for answering sidebar filters without scanning it.
+
+    Every value of the categorical `columns` gets a packed bitmap of the rows
+    holding it, and `year_column` is kept as a sorted index so a year range is
+    two binary searches. A query ORs the bitmaps of the selected values within
+    a column and ANDs the columns together. The row positions of the most
+    recent queries are memoized.
+    """
+
+    def __init__(self, df, columns, year_column, cache_size=64):
+        self.rows = len(df)
+        self.columns = list(columns)
+
+        self._bitmaps = {}
+        for column in self.columns:
+            values = df[column].astype('category')
+            codes = values.cat.codes.to_numpy()
+            # Values are kept in order of first appearance, like Series.unique()
+            self._bitmaps[column] = {
+                values.cat.categories[code]: np.packbits(codes == code)
+                for code in pd.unique(codes) if code >= 0
+            }
+
+        years = df[year_column].to_numpy()
+        self._year_order = np.argsort(years, kind='stable')
+        self._sorted_years = years[self._year_order]
+
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    @property
+    def year_bounds(self):
+        if self.rows == 0:
+            return None
+        return int(self._sorted_years[0]), int(self._sorted_years[-1])
+
+    def values(self, column):
+        """
+        Distinct values of an indexed column, in order of first appearance.
+        """
+        return list(self._bitmaps[column])
+
+    def _column_bitmap(self, column, selected):
+        bitmap = np.zeros((self.rows + 7) // 8, dtype=np.uint8)
+        for value in selected:
+            value_bitmap = self._bitmaps[column].get(value)
+            if value_bitmap is not None:
+                np.bitwise_or(bitmap, value_bitmap, out=bitmap)
+        return bitmap
+
+    def _year_bitmap(self, start, end):
+        lo = np.searchsorted(self._sorted_years, start, side='left')
+        hi = np.searchsorted(self._sorted_years, end, side='right')
+        mask = np.zeros(self.rows, dtype=bool)
+        mask[self._year_order[lo:hi]] = True
+        return np.packbits(mask)
+
+    def positions(self, selections, year_range=None):
+        """
+        Row positions (ascending) matching `selections`, a dict of column ->
+        selected values, and the inclusive `year_range`. Columns left out of
+        `selections` are not filtered on.
+        """
+        key = (
+            tuple((column, frozenset(selections[column])) for column in self.columns if column in selections),
+            tuple(year_range) if year_range is not None else None,
+        )
+        with self._lock:
+            hit = key in self._cache
+            if hit:
+                self._cache.move_to_end(key)
+                result = self._cache[key]
+        count('filter_index', hit)
+        if hit:
+            return result
+
+        bitmap = np.full((self.rows + 7) // 8, 0xFF, dtype=np.uint8)
+        for column in self.columns:
+            if column in selections:
+                np.bitwise_and(bitmap, self._column_bitmap(column, selections[column]), out=bitmap)
+        if year_range is not None:
+            np.bitwise_and(bitmap, self._year_bitmap(*year_range), out=bitmap)
+
+        result = np.flatnonzero(np.unpackbits(bitmap, count=self.rows))
+        result.flags.writeable = False
+
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def filter(self, df, selections, year_range=None):
+        """
+        Rows of `df` (the dataframe the index was built from) matching the
+        selections.
+        """
+        return df.take(self.positions(selections, year_range))
@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def fit_trends(years, totals):
+    """
+    Function to fit a linear trend to every column of `totals` (years x
+    groups, NaN where a group has no value for a year) by least squares,
+    for all groups at once.
+
+    Returns a (2, groups) array of [intercept, slope] per group. A group with
+    a single year gets a flat trend, and a group with no data gets NaN.
+    """
+    years = np.asarray(years, dtype=float)
+    totals = np.asarray(totals, dtype=float)
+    mask = ~np.isnan(totals)
+    n = mask.sum(axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Years and totals are centred on each group's means first: sums of
+        # squared raw years (~4e6 each) would swamp the slope in rounding
+        year_mean = np.where(mask, years[:, None], 0.0).sum(axis=0) / n
+        total_mean = np.where(mask, totals, 0.0).sum(axis=0) / n
+        x = np.where(mask, years[:, None] - year_mean, 0.0)
+        y = np.where(mask, totals - total_mean, 0.0)
+
+        sum_xx, sum_xy = (x * x).sum(axis=0), (x * y).sum(axis=0)
+        slope = np.where(sum_xx > 0, sum_xy / sum_xx, 0.0)
+        intercept = total_mean - slope * year_mean
+    return np.vstack([intercept, slope])
+
+
+def predict(coefficients, years):
+    """
+    Function to evaluate fitted trends over `years`: a (years x groups)
+    matrix, computed as a single matrix multiply.
+    """
+    years = np.asarray(years, dtype=float)
+    return np.column_stack([np.ones_like(years), years]) @ coefficients
+
+
+class TrendForecaster:
+    """
+    Per-group trend models with their coefficients cached by (group, filter
+    state, data version), so a new forecast horizon or an extra group does
+    not refit the groups that are already known.
+    """
+
+    def __init__(self, cache_size=512):
+        self._coefficients = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def fit(self, groups, state, data_version, yearly_totals):
+        """
+        Coefficients ([intercept, slope] x groups) for `groups`.
+        `yearly_totals(missing)` is only called for groups that are not cached
+        yet and returns a dataframe indexed by year with one column per group.
+        """
+        keys = [(group, state, data_version) for group in groups]
+        with self._lock:
+            known = {group: self._coefficients[key] for group, key in zip(groups, keys) if key in self._coefficients}
+        missing = [group for group in dict.fromkeys(groups) if group not in known]
+
+        if missing:
+            totals = yearly_totals(missing).reindex(columns=missing)
+            fitted = fit_trends(totals.index.to_numpy(), totals.to_numpy())
+            known.update({group: fitted[:, i] for i, group in enumerate(missing)})
+
+        # The result comes from `known`, so groups evicted by other sessions
+        # in the meantime are still returned
+        with self._lock:
+            for group, key in zip(groups, keys):
+                self._coefficients[key] = known[group]
+                self._coefficients.move_to_end(key)
+            while len(self._coefficients) > self._cache_size:
+                self._coefficients.popitem(last=False)
+        return np.column_stack([known[group] for group in groups])
@@ -0,0 +1,188 @@
+import functools
+
+import numpy as np
+import pandas as pd
+
+from datasets import dataset_version, load_dataset
+from ingestion import partition_rows
+
+# Metrics charted per country
+METRICS = ['lifeExp', 'pop', 'gdpPercap']
+
+# Metrics of the comparison engine: the charted ones, plus total GDP
+# (population x GDP per capita)
+COMPARISON_METRICS = METRICS + ['gdp']
+
+METRIC_LABELS = {
+    'lifeExp': "Life Expectancy",
+    'pop': "Population",
+    'gdpPercap': "GDP per Capita",
+    'gdp': "Total GDP",
+}
+
+# What a comparison shows of each metric: its values, its annual growth
+# rate (%) since the previous observation, or the country's rank among all
+# countries with data that year (1 = highest)
+MEASURES = {
+    'value': "Values",
+    'growth': "Annual growth (%)",
+    'rank': "Rank among all countries",
+}
+
+
+class GapminderStore:
+    """
+    Lookup tables over the gapminder data, built once per data version:
+    the countries of each continent, the rows and year-sorted metric arrays
+    of each country, and a (year x country x metric) array of every metric,
+    its growth rates and ranks for the comparisons. The page's selectors and
+    charts are answered from these without scanning the full table.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self._continents = {
+            continent: list(pd.unique(countries))
+            for continent, countries in df.groupby('continent', sort=False, observed=True)['country']
+        }
+
+        # Mean per (country, year), like the page's groupbys, sorted by year.
+        # Only observed pairs: country is categorical.
+        yearly = df.groupby(['country', 'year'], observed=True)[METRICS].mean()
+        self._series = {
+            country: {
+                'year': frame.index.get_level_values('year').to_numpy(),
+                **{metric: frame[metric].to_numpy() for metric in METRICS},
+            }
+            for country, frame in yearly.groupby(level='country', observed=True)
+        }
+
+        # Original rows of each country, in year order
+        years = df['year'].to_numpy()
+        self._rows = {
+            country: positions[np.argsort(years[positions], kind='stable')]
+            for country, positions in partition_rows(df['country']) if country is not None
+        }
+
+        self._build_comparisons(yearly)
+        self._frames = {}
+
+    def _build_comparisons(self, yearly):
+        """
+        Dense (year x country x metric) arrays over all years and countries,
+        NaN where a country has no data: the values, annual growth rates and
+        ranks. Countries are sorted, like the columns of an unstack.
+        """
+        self._years = np.sort(yearly.index.get_level_values('year').unique().to_numpy())
+        self._countries = sorted(self._series)
+        self._country_positions = {country: i for i, country in enumerate(self._countries)}
+
+        values = np.full((len(self._years), len(self._countries), len(COMPARISON_METRICS)), np.nan)
+        rows = np.searchsorted(self._years, yearly.index.get_level_values('year').to_numpy())
+        columns = np.array([self._country_positions[country] for country in yearly.index.get_level_values('country')])
+        for i, metric in enumerate(METRICS):
+            values[rows, columns, i] = yearly[metric].to_numpy()
+        values[:, :, COMPARISON_METRICS.index('gdp')] = (
+            values[:, :, METRICS.index('pop')] * values[:, :, METRICS.index('gdpPercap')]
+        )
+
+        # Compound annual growth since the previous year of the grid
+        growth = np.full_like(values, np.nan)
+        spans = np.diff(self._years).astype('float64')[:, None, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = values[1:] / values[:-1]
+            growth[1:] = np.where(ratio > 0, (ratio ** (1 / spans) - 1) * 100, np.nan)
+
+        # Rank per (year, metric), highest first; ties keep country order
+        order = np.argsort(np.where(np.isnan(values), np.inf, -values), axis=1, kind='stable')
+        ranks = np.empty_like(values)
+        np.put_along_axis(ranks, order, np.arange(1, len(self._countries) + 1, dtype='float64')[None, :, None], axis=1)
+        ranks[np.isnan(values)] = np.nan
+
+        self._comparisons = {'value': values, 'growth': growth, 'rank': ranks}
+
+    def continents(self):
+        """
+        Continents in order of first appearance.
+        """
+        return list(self._continents)
+
+    def countries(self, continent):
+        """
+        Countries of a continent in order of first appearance.
+        """
+        return self._continents.get(continent, [])
+
+    def year_bounds(self, country):
+        years = self._series[country]['year']
+        return int(years[0]), int(years[-1])
+
+    def _year_slice(self, country, year_range):
+        years = self._series[country]['year']
+        if year_range is None:
+            return slice(0, len(years))
+        return slice(np.searchsorted(years, year_range[0], side='left'), np.searchsorted(years, year_range[1], side='right'))
+
+    def metric(self, country, metric, year_range=None):
+        """
+        Series of a metric of a country indexed by year, over the inclusive
+        `year_range` (all years if None).
+        """
+        if country not in self._frames:
+            series = self._series[country]
+            self._frames[country] = pd.DataFrame(
+                {name: series[name] for name in METRICS}, index=pd.Index(series['year'], name='year')
+            )
+        return self._frames[country][metric].iloc[self._year_slice(country, year_range)]
+
+    def rows(self, country, year_range=None):
+        """
+        The original rows of a country in year order, over the inclusive
+        `year_range` (all years if None).
+        """
+        positions = self._rows[country]
+        if year_range is not None:
+            years = self.df['year'].to_numpy()[positions]
+            positions = positions[np.searchsorted(years, year_range[0], side='left'):np.searchsorted(years, year_range[1], side='right')]
+        return self.df.take(positions)
+
+    def all_countries(self):
+        """
+        Every country of the dataset, sorted.
+        """
+        return list(self._countries)
+
+    def comparison_array(self, countries, metrics, measure='value'):
+        """
+        (year x country x metric) array of a measure (see MEASURES) for any
+        countries and metrics (see COMPARISON_METRICS), in the order given,
+        sliced from the precomputed arrays. Unknown countries are skipped.
+
+        Returns (years, countries, array).
+        """
+        countries = [country for country in countries if country in self._country_positions]
+        columns = [self._country_positions[country] for country in countries]
+        metric_positions = [COMPARISON_METRICS.index(metric) for metric in metrics]
+        array = self._comparisons[measure][:, columns][:, :, metric_positions]
+        return self._years, countries, array
+
+    def comparison(self, countries, metric, measure='value'):
+        """
+        Wide (year x country) frame of a measure of one metric for any
+        countries, columns sorted by country and years without data dropped.
+        """
+        years, countries, array = self.comparison_array(sorted(set(countries)), [metric], measure)
+        frame = pd.DataFrame(array[:, :, 0], index=pd.Index(years, name='year'), columns=pd.Index(countries, name='country'))
+        return frame.dropna(how='all')
+
+
+@functools.lru_cache(maxsize=2)
+def _gapminder_store(version):
+    return GapminderStore(load_dataset('gapminder'))
+
+
+def gapminder_store():
+    """
+    Function to get the GapminderStore of the current data version.
+    """
+    return _gapminder_store(dataset_version('gapminder'))
@@ -0,0 +1,145 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+# Pixel size of a level-of-detail cluster on screen
+CLUSTER_PIXELS = 32
+
+
+def bounding_box(lon, lat):
+    """
+    Function to get the (west, south, east, north) bounding box of points.
+    """
+    return float(np.min(lon)), float(np.min(lat)), float(np.max(lon)), float(np.max(lat))
+
+
+def zoom_for_bbox(bbox, width_pixels=800):
+    """
+    Function to estimate the web-mercator zoom level that fits a bounding box
+    into a map `width_pixels` wide.
+    """
+    west, south, east, north = bbox
+    span = max(east - west, (north - south) * 1.5, 1e-6)
+    return max(0.0, min(20.0, math.log2(360 * width_pixels / (256 * span))))
+
+
+def view_bbox(latitude, longitude, zoom, width_pixels=800, height_pixels=500):
+    """
+    Function to estimate the (west, south, east, north) area a web-mercator
+    map `width_pixels` by `height_pixels` shows around a center.
+    """
+    degrees_per_pixel = 360 / (256 * 2 ** zoom)
+    half_width = degrees_per_pixel * width_pixels / 2
+    # Latitude is stretched away from the equator
+    half_height = degrees_per_pixel * height_pixels / 2 * math.cos(math.radians(latitude))
+    return (
+        longitude - half_width, max(-90.0, latitude - half_height),
+        longitude + half_width, min(90.0, latitude + half_height),
+    )
+
+
+def cell_size_for_zoom(zoom):
+    """
+    Function to get the grid cell size (in degrees) that covers about
+    CLUSTER_PIXELS on screen at a zoom level.
+    """
+    return 360 / (256 * 2 ** zoom) * CLUSTER_PIXELS
+
+
+class GridIndex:
+    """
+    Uniform lon/lat grid over a set of points. Points are sorted by cell so
+    the points of a cell are one contiguous slice, and a bounding box query
+    only looks at the cells it overlaps.
+    """
+
+    def __init__(self, lon, lat, cell_size=1.0):
+        self.lon = np.asarray(lon, dtype=float)
+        self.lat = np.asarray(lat, dtype=float)
+        self.cell_size = cell_size
+        self.bbox = bounding_box(self.lon, self.lat) if len(self.lon) else None
+
+        west, south = (self.bbox[0], self.bbox[1]) if self.bbox else (0.0, 0.0)
+        self._origin = (west, south)
+        self._columns = np.floor((self.lon - west) / cell_size).astype(np.int64)
+        self._rows = np.floor((self.lat - south) / cell_size).astype(np.int64)
+        self._rows_per_column = int(self._rows.max()) + 1 if len(self._rows) else 1
+
+        cell_ids = self._columns * self._rows_per_column + self._rows
+        self._order = np.argsort(cell_ids, kind='stable')
+        sorted_ids = cell_ids[self._order]
+        ids, starts = np.unique(sorted_ids, return_index=True)
+        ends = np.append(starts[1:], len(sorted_ids))
+        self._cells = {int(cell): (int(start), int(end)) for cell, start, end in zip(ids, starts, ends)}
+
+    def query(self, bbox):
+        """
+        Positions (ascending) of the points inside `bbox`
+        (west, south, east, north).
+        """
+        west, south, east, north = bbox
+        first_column = int(math.floor((west - self._origin[0]) / self.cell_size))
+        last_column = int(math.floor((east - self._origin[0]) / self.cell_size))
+        first_row = max(0, int(math.floor((south - self._origin[1]) / self.cell_size)))
+        last_row = min(self._rows_per_column - 1, int(math.floor((north - self._origin[1]) / self.cell_size)))
+
+        slices = []
+        for column in range(max(0, first_column), last_column + 1):
+            for row in range(first_row, last_row + 1):
+                cell = self._cells.get(column * self._rows_per_column + row)
+                if cell is not None:
+                    slices.append(self._order[cell[0]:cell[1]])
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+
+        candidates = np.concatenate(slices)
+        inside = (
+            (self.lon[candidates] >= west) & (self.lon[candidates] <= east)
+            & (self.lat[candidates] >= south) & (self.lat[candidates] <= north)
+        )
+        return np.sort(candidates[inside])
+
+
+def grid_clusters(lon, lat, weights, cell_size):
+    """
+    Function to aggregate points into grid clusters of `cell_size` degrees,
+    for drawing many points at a low zoom level. Each cluster is placed at the
+    weighted centroid of its points.
+
+    Returns a dataframe with lon, lat, weight (sum of `weights`) and count.
+    """
+    lon = np.asarray(lon, dtype=float)
+    lat = np.asarray(lat, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+
+    cells = pd.MultiIndex.from_arrays([np.floor(lon / cell_size), np.floor(lat / cell_size)])
+    codes, _ = pd.factorize(cells)
+    counts = np.bincount(codes)
+    totals = np.bincount(codes, weights=weights)
+
+    # Cells whose points all have zero weight fall back to the plain mean
+    weighted = totals > 0
+    point_weights = np.where(weighted[codes], weights, 1.0)
+    divisor = np.where(weighted, totals, counts)
+
+    return pd.DataFrame({
+        'lon': np.bincount(codes, weights=lon * point_weights) / divisor,
+        'lat': np.bincount(codes, weights=lat * point_weights) / divisor,
+        'weight': totals,
+        'count': counts,
+    })
+
+
+def compact_points(df, columns, precision=4):
+    """
+    Function to trim a points dataframe down to what a map layer needs:
+    only `columns`, with lon/lat rounded to `precision` decimals (about 11 m
+    for 4), which keeps the JSON sent to the browser small.
+    """
+    points = df[list(columns)].copy()
+    for column in ('lon', 'lat'):
+        if column in points:
+            # Rounded as float64: float32 values print with all their digits
+            points[column] = points[column].astype('float64').round(precision)
+    return points.reset_index(drop=True)
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+
+def partition_rows(keys):
+    """
+    Function to group row positions by partition key, in one sort instead of
+    one scan per key.
+
+    Returns a list of (key, positions) in sorted key order. Rows whose key is
+    missing are grouped under None, listed first.
+    """
+    codes, uniques = pd.factorize(keys, sort=True)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(-1, len(uniques) + 1))
+
+    partitions = []
+    if bounds[1] > bounds[0]:
+        partitions.append((None, order[bounds[0]:bounds[1]]))
+    for i, key in enumerate(uniques):
+        partitions.append((key, order[bounds[i + 1]:bounds[i + 2]]))
+    return partitions
+
+
+def row_hashes(df):
+    """
+    Function to hash every row of a dataframe, so partitions can be
+    fingerprinted without cleaning them.
+    """
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def fingerprint(hashes):
+    """
+    Function to get the fingerprint of a partition from the hashes of its
+    rows (in order).
+    """
+    return hashlib.sha256(np.ascontiguousarray(hashes).tobytes()).hexdigest()[:16]
+
+
+def concat_frames(frames):
+    """
+    Function to concatenate dataframes with the same columns. Categorical
+    columns are merged into one categorical (categories sorted) instead of
+    falling back to object when the frames have different categories.
+    """
+    frames = list(frames)
+    # Empty frames (e.g. a partition with only invalid rows) add nothing
+    frames = [frame for frame in frames if len(frame)] or frames[:1]
+    combined = pd.concat(frames, ignore_index=True)
+    for column in frames[0].columns:
+        if isinstance(frames[0][column].dtype, pd.CategoricalDtype):
+            combined[column] = union_categoricals([frame[column] for frame in frames], sort_categories=True)
+    return combined
+
+
+class PartitionStore:
+    """
+    Local store of a cleaned dataset split into partitions, one Parquet file
+    per partition, plus a manifest with the fingerprint of the raw rows each
+    partition was built from.
+
+    A new release of the source is diffed against the manifest so only new
+    or changed partitions go through the cleaning step again. The manifest
+    is ignored when it was written for another `schema_version`.
+    """
+
+    def __init__(self, directory, schema_version):
+        self.directory = directory
+        self.schema_version = schema_version
+
+    def _path(self, key, partition_fingerprint):
+        return os.path.join(self.directory, f'{key}-{partition_fingerprint}.parquet')
+
+    def manifest(self):
+        """
+        The manifest of the store: source and data versions, and the
+        fingerprint, row count and stats of each partition.
+        """
+        try:
+            with open(os.path.join(self.directory, 'manifest.json')) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = None
+        if (
+            not manifest or manifest.get('schema_version') != self.schema_version
+            # A partition file went missing: rebuild everything
+            or not all(os.path.exists(self._path(key, p['fingerprint'])) for key, p in manifest['partitions'].items())
+        ):
+            return {'schema_version': self.schema_version, 'partitions': {}}
+        return manifest
+
+    def read(self, key, partition_fingerprint):
+        return pd.read_parquet(self._path(key, partition_fingerprint))
+
+    def write(self, key, partition_fingerprint, df):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key, partition_fingerprint)
+        df.to_parquet(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+
+    def commit(self, manifest):
+        """
+        Write the manifest of a new release and remove the partition files
+        it no longer refers to.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, 'manifest.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(dict(manifest, schema_version=self.schema_version), f)
+        os.replace(path + '.tmp', path)
+
+        current = {
+            os.path.basename(self._path(key, partition['fingerprint']))
+            for key, partition in manifest['partitions'].items()
+        }
+        current.add('manifest.json')
+        for filename in os.listdir(self.directory):
+            if filename not in current and not filename.endswith('.tmp'):
+                os.remove(os.path.join(self.directory, filename))
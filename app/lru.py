@@ -0,0 +1,39 @@
+import threading
+from collections import OrderedDict
+
+
+class SizedLRU:
+    """
+    Thread-safe LRU of dict entries, evicting the least recently used ones
+    once the total of their sizes goes over `limit_bytes`.
+    """
+
+    def __init__(self, limit_bytes):
+        self.limit_bytes = limit_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry, size):
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)['size']
+            entry['size'] = size
+            self._entries[key] = entry
+            self.total_bytes += size
+            # Always keep the newest entry, even if it alone is over the limit
+            while self.total_bytes > self.limit_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= evicted['size']
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
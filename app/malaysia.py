@@ -0,0 +1,335 @@
+import functools
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from datasets import CACHE_DIR, dataset_version, load_dataset
+from figures import BarChart, LineChart
+from filter_engine import FilterIndex
+from forecasting import TrendForecaster, predict
+from ingestion import PartitionStore, concat_frames, fingerprint, partition_rows, row_hashes
+from lru import SizedLRU
+from population_cube import RollupCube
+from profiler import stage
+from schemas import frame_bytes
+
+# Cleaned partitions are only reused when they were written with this
+# number, so bump it whenever the cleaning rules below change.
+CLEANING_VERSION = 2
+
+CLEAN_DIR = os.path.join(os.path.dirname(CACHE_DIR), 'malaysia')
+
+# Cleaned data, one partition per date, and the partitions of the current
+# release kept in memory with their cube cells
+_store = PartitionStore(CLEAN_DIR, CLEANING_VERSION)
+_partitions = {}
+_ingest_lock = threading.Lock()
+
+# Trend models behind the prediction charts, shared by all sessions, and the
+# yearly totals their historical lines are drawn from
+_forecaster = TrendForecaster()
+_history_cache = SizedLRU(16 * 1024 * 1024)
+
+# Columns the dashboard's sidebar filters on
+FILTER_COLUMNS = ['Gender', 'Age_Group', 'Ethnicity']
+
+# Lookup tables for the DOSM codes. Codes that are not listed are 'Unknown'
+# and dropped from the cleaned dataset.
+ETHNICITY_GROUPS = {
+    'overall': 'Overall',
+    'bumi': 'Malay',
+    'bumi_malay': 'Malay',
+    'chinese': 'Chinese',
+    'indian': 'Indian',
+    'other': 'Others',
+    'bumi_other': 'Others',
+    'other_citizen': 'Others',
+    'other_noncitizen': 'Others',
+}
+
+AGE_GROUPS = {
+    'overall': 'Overall',
+    '15-19': '18-24 (Gen Z)',
+    '20-24': '18-24 (Gen Z)',
+    '25-29': '25-40 (Millennial)',
+    '30-34': '25-40 (Millennial)',
+    '35-39': '25-40 (Millennial)',
+    '40-44': '41-56 (Gen X)',
+    '45-49': '41-56 (Gen X)',
+    '50-54': '41-56 (Gen X)',
+    '55-59': '41-56 (Gen X)',
+    '60-64': '57+ (Baby Boomers)',
+    '65-69': '57+ (Baby Boomers)',
+    '70+': '57+ (Baby Boomers)',
+    '70-74': '57+ (Baby Boomers)',
+    '75-79': '57+ (Baby Boomers)',
+    '80+': '57+ (Baby Boomers)',
+    '80-84': '57+ (Baby Boomers)',
+    '85+': '57+ (Baby Boomers)',
+}
+
+
+def _map_codes(values, lookup):
+    """
+    Map a column of codes through a lookup table. The lookup is done once
+    per distinct code instead of once per row.
+    """
+    categorical = values.astype('category')
+    groups = pd.Categorical(categorical.cat.categories.map(lookup))
+    row_codes = categorical.cat.codes.to_numpy()
+    codes = np.where(row_codes >= 0, groups.codes[row_codes], -1)
+    return pd.Series(pd.Categorical.from_codes(codes, groups.categories), index=values.index)
+
+
+def clean_population(df_raw):
+    """
+    Function to clean the raw DOSM population data: classify ethnicity and
+    age group, drop unknown codes, invalid dates and duplicates, and rename
+    the columns for display.
+
+    Text columns are stored as categoricals, the year as int16 and the date
+    at millisecond resolution, the coarsest the partition files keep.
+    """
+    df = pd.DataFrame({
+        'Date': pd.to_datetime(df_raw['date'], errors='coerce').astype('datetime64[ms]'),
+        'Gender': df_raw['sex'].astype('category'),
+        'Age': df_raw['age'].astype('category'),
+        'Ethnicity': _map_codes(df_raw['ethnicity'], ETHNICITY_GROUPS),
+        'Sample_Population': df_raw['population'],
+        'Age_Group': _map_codes(df_raw['age'], AGE_GROUPS),
+    })
+
+    # Codes missing from the lookup tables come back as NaN
+    df = df[df['Ethnicity'].notna() & df['Age_Group'].notna()]
+    df = df.drop_duplicates()
+
+    invalid_dates = int(df['Date'].isna().sum())
+    df = df[df['Date'].notna()]
+
+    for column in ['Gender', 'Age', 'Ethnicity', 'Age_Group']:
+        df[column] = df[column].astype('category').cat.remove_unused_categories()
+    df['Year'] = df['Date'].dt.year.astype('int16')
+
+    return df.reset_index(drop=True), {'invalid_dates': invalid_dates}
+
+
+def _partition_key(date):
+    return 'invalid' if date is None else date.strftime('%Y-%m-%d')
+
+
+def _clean_partitions(df_raw, changed):
+    """
+    Clean the rows of the changed partitions in one pass and split the
+    result by date. Duplicates always share a date, so this matches
+    cleaning each partition on its own.
+    """
+    df, stats = clean_population(df_raw.take(np.concatenate([positions for _, _, positions in changed])))
+    by_date = dict(partition_rows(df['Date'].dt.normalize()))
+    for date, key, _ in changed:
+        positions = by_date.get(date, np.empty(0, dtype=np.int64))
+        partition = df.take(positions).reset_index(drop=True)
+        cells = RollupCube.aggregate(partition, FILTER_COLUMNS, 'Year', 'Sample_Population')
+        # Invalid dates are all counted in their own partition
+        yield key, partition, cells, {'invalid_dates': stats['invalid_dates'] if date is None else 0}
+
+
+def _ingest_release(source_version, manifest):
+    """
+    Diff a new release of the source against the manifest, per date, and
+    clean only the dates that are new or whose rows changed.
+    """
+    df_raw = load_dataset('malaysia_population')
+    dates = pd.to_datetime(df_raw['date'], errors='coerce').dt.normalize()
+    hashes = row_hashes(df_raw)
+
+    partitions, fingerprints, changed = {}, {}, []
+    for date, positions in partition_rows(dates):
+        key = _partition_key(date)
+        fingerprints[key] = fingerprint(hashes[positions])
+        known = manifest['partitions'].get(key)
+        if known is not None and known['fingerprint'] == fingerprints[key]:
+            partitions[key] = known
+        else:
+            changed.append((date, key, positions))
+
+    if changed:
+        for key, df, cells, stats in _clean_partitions(df_raw, changed):
+            _store.write(key, fingerprints[key], df)
+            _partitions[(key, fingerprints[key])] = (df, cells)
+            partitions[key] = {'fingerprint': fingerprints[key], 'rows': len(df), 'stats': stats}
+
+    data_version = hashlib.sha256(json.dumps(
+        [CLEANING_VERSION, sorted((key, p['fingerprint']) for key, p in partitions.items())]
+    ).encode()).hexdigest()[:16]
+    manifest = {'source_version': source_version, 'data_version': data_version, 'partitions': partitions}
+    _store.commit(manifest)
+    return manifest
+
+
+@functools.lru_cache(maxsize=2)
+def _ingest(version):
+    with _ingest_lock:
+        manifest = _store.manifest()
+        if manifest.get('source_version') != version:
+            with stage('malaysia ingest'):
+                manifest = _ingest_release(version, manifest)
+
+        frames, cells = [], []
+        for key, partition in sorted(manifest['partitions'].items()):
+            cache_key = (key, partition['fingerprint'])
+            if cache_key not in _partitions:
+                df = _store.read(*cache_key)
+                _partitions[cache_key] = (df, RollupCube.aggregate(df, FILTER_COLUMNS, 'Year', 'Sample_Population'))
+            frames.append(_partitions[cache_key][0])
+            cells.append(_partitions[cache_key][1])
+
+        # Partitions of older releases are no longer needed
+        current = {(key, p['fingerprint']) for key, p in manifest['partitions'].items()}
+        for cache_key in list(_partitions):
+            if cache_key not in current:
+                del _partitions[cache_key]
+
+    # A release without a single valid row still has the cleaned columns
+    df = concat_frames(frames) if frames else clean_population(load_dataset('malaysia_population').head(0))[0]
+    df.attrs.update({
+        'invalid_dates': sum(p['stats']['invalid_dates'] for p in manifest['partitions'].values()),
+        'data_version': manifest['data_version'],
+    })
+    return {'data': df, 'cells': cells, 'data_version': manifest['data_version']}
+
+
+def _load_clean(version):
+    return _ingest(version)['data']
+
+
+def load_population():
+    """
+    Function to load the cleaned Malaysian population dataset.
+
+    The cleaned data is kept in a local store with one partition per date.
+    A new release of the source only cleans the dates that are new or whose
+    rows changed, and reruns and restarts only read the store. Rows are
+    ordered by date. The returned dataframe is shared between sessions and
+    must not be modified in place.
+    """
+    return _load_clean(dataset_version('malaysia_population'))
+
+
+def population_version():
+    """
+    Function to get the version of the cleaned dataset, to be used as part of
+    cache keys. It only changes when the cleaned content does, not with every
+    new release of the source file.
+    """
+    return _ingest(dataset_version('malaysia_population'))['data_version']
+
+
+@functools.lru_cache(maxsize=2)
+def _filter_index(version):
+    return FilterIndex(_load_clean(version), FILTER_COLUMNS, 'Year')
+
+
+def population_filter_index():
+    """
+    Function to get the FilterIndex over the cleaned dataset, built once per
+    version of the source file.
+    """
+    return _filter_index(dataset_version('malaysia_population'))
+
+
+@functools.lru_cache(maxsize=2)
+def _population_cube(version):
+    # Built from the cells of each partition, aggregated when it was cleaned
+    return RollupCube.from_cells(_ingest(version)['cells'], FILTER_COLUMNS, 'Year')
+
+
+def population_cube():
+    """
+    Function to get the (Year, Gender, Age_Group, Ethnicity) rollup cube of
+    the cleaned dataset, built once per version of the source file.
+    """
+    return _population_cube(dataset_version('malaysia_population'))
+
+
+def population_forecaster():
+    """
+    Function to get the TrendForecaster shared by the prediction charts.
+    """
+    return _forecaster
+
+
+def group_totals(cube, column, groups, selections, year_filter):
+    """
+    Function to get the yearly totals of `groups` (values of `column`) within
+    the selections: a dataframe indexed by year with one column per group.
+    """
+    group_selections = dict(selections, **{column: [value for value in selections[column] if value in groups]})
+    history = cube.rollup(['Year', column], group_selections, year_filter)
+    return history.pivot(index='Year', columns=column, values='sum')
+
+
+def group_forecast(cube, column, groups, selections, year_filter, state, data_version, years):
+    """
+    Function to get the yearly totals of `groups` and their linear trends
+    over `years` (a years x groups array), for the prediction charts.
+
+    Totals are cached by (column, groups, filter state, data version), and
+    trends per group by the forecaster, so a new horizon aggregates nothing
+    and an extra group only aggregates that group to fit it.
+    """
+    key = (column, tuple(groups), state, data_version)
+    cached = _history_cache.get(key)
+    if cached is None:
+        cached = {'totals': group_totals(cube, column, groups, selections, year_filter)}
+        _history_cache.put(key, cached, frame_bytes(cached['totals']))
+
+    coefficients = _forecaster.fit(
+        groups, state, data_version, lambda missing: group_totals(cube, column, missing, selections, year_filter),
+    )
+    return cached['totals'], predict(coefficients, years)
+
+
+def default_filters(filter_index):
+    """
+    Function to get the sidebar's default filters: every value of each
+    filter column and the full year range.
+    """
+    return {column: filter_index.values(column) for column in FILTER_COLUMNS}, filter_index.year_bounds
+
+
+def population_charts(cube, filter_index, selections, year_filter):
+    """
+    Function to get the builders of the dashboard's distribution and trend
+    charts for one filter state, by chart name (see scheduler.PageTasks.chart).
+    """
+    return {
+        # Mean population per row, as seaborn would estimate it from the rows
+        'age_group_distribution': lambda: BarChart(
+            cube.rollup(['Age_Group', 'Gender'], selections, year_filter), x='Age_Group', y='mean', hue='Gender',
+            order=[group for group in filter_index.values('Age_Group') if group in selections['Age_Group']],
+            hue_order=[gender for gender in filter_index.values('Gender') if gender in selections['Gender']],
+            title="Population Distribution by Age Group", xlabel="Age Group", ylabel="Population", rotate_labels=True,
+        ),
+        'ethnicity_distribution': lambda: BarChart(
+            cube.rollup(['Ethnicity'], selections, year_filter), x='sum', y='Ethnicity', horizontal=True,
+            title="Population Distribution by Ethnicity", xlabel="Population", ylabel="Ethnicity",
+        ),
+        'population_trend': lambda: LineChart(
+            cube.rollup(['Year'], selections, year_filter), x='Year', y='sum',
+            title="Population Growth Trend in Malaysia", xlabel="Year", ylabel="Total Population",
+        ),
+        'age_group_trend': lambda: LineChart(
+            cube.rollup(['Year', 'Age_Group'], selections, year_filter), x='Year', y='sum', series='Age_Group',
+            legend_title='Age_Group', title="Population Growth by Age Group", xlabel="Year", ylabel="Population",
+            rotate_labels=True,
+        ),
+        'ethnicity_trend': lambda: LineChart(
+            cube.rollup(['Year', 'Ethnicity'], selections, year_filter), x='Year', y='sum', series='Ethnicity',
+            legend_title='Ethnicity', title="Population Growth by Ethnicity", xlabel="Year", ylabel="Population",
+            rotate_labels=True,
+        ),
+    }
@@ -0,0 +1,82 @@
+import os
+import sys
+
+from datasets import memory_usage as dataset_memory_usage
+
+
+def process_rss_bytes():
+    """
+    Function to get the resident memory of this process, in bytes, or None
+    where it cannot be read (Windows).
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        pass
+
+    # Not Linux: fall back to the peak, reported in KiB (bytes on macOS)
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def session_stats():
+    """
+    Function to get (number of active sessions, total bytes of their session
+    state) from the Streamlit runtime, or None outside a running server.
+    """
+    from streamlit.runtime import Runtime
+
+    if not Runtime.exists():
+        return None
+    runtime = Runtime.instance()
+    # Streamlit has no public API for the number of sessions: without the
+    # private session manager, there is no readout
+    num_active_sessions = getattr(getattr(runtime, '_session_mgr', None), 'num_active_sessions', None)
+    if num_active_sessions is None:
+        return None
+    sessions = num_active_sessions()
+    state_bytes = sum(
+        stat.byte_length for stat in runtime.stats_mgr.get_stats() if stat.category_name == 'st_session_state'
+    )
+    return sessions, state_bytes
+
+
+def memory_report():
+    """
+    Function to account for the memory of the app: what is shared by all
+    sessions (dataset frames in the heap, memory-mapped Arrow tables, rendered
+    charts, parsed uploads, prepared exports) against what each session holds
+    on its own.
+    """
+    # Only account for the chart, upload and export caches if a page (or the
+    # warm-up, which may still be importing them) has loaded them
+    chart_cache = getattr(sys.modules.get('figures'), '_chart_cache', None)
+    upload_cache = getattr(sys.modules.get('uploads'), '_upload_cache', None)
+    export_cache = getattr(sys.modules.get('exports'), '_export_cache', None)
+
+    datasets = dataset_memory_usage()
+    report = {
+        'process_rss_bytes': process_rss_bytes(),
+        'shared_frame_bytes': sum(usage['frame_bytes'] for usage in datasets.values()),
+        'mapped_table_bytes': sum(usage['mapped_bytes'] for usage in datasets.values()),
+        'chart_cache_bytes': chart_cache.total_bytes if chart_cache is not None else 0,
+        'upload_cache_bytes': upload_cache.total_bytes if upload_cache is not None else 0,
+        'export_cache_bytes': export_cache.total_bytes if export_cache is not None else 0,
+        'datasets': datasets,
+        'sessions': None,
+        'session_state_bytes': None,
+        'per_session_bytes': None,
+    }
+
+    stats = session_stats()
+    if stats is not None:
+        sessions, state_bytes = stats
+        report['sessions'] = sessions
+        report['session_state_bytes'] = state_bytes
+        report['per_session_bytes'] = state_bytes // sessions if sessions else 0
+    return report
@@ -0,0 +1,208 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+
+from ingestion import partition_rows
+from profiler import count
+
+# Rows sent to the browser per page
+PAGE_ROWS = 50
+
+# Columns with at most this many distinct values can be filtered on
+FILTER_MAX_VALUES = 1000
+
+# Page slices kept per session, and table indexes shared by all sessions
+SESSION_CACHE_SIZE = 16
+INDEX_CACHE_SIZE = 16
+
+
+class TableIndex:
+    """
+    Sort and filter index over a dataframe or Arrow table, built column by
+    column the first time a column is sorted or filtered on.
+
+    Sorting uses a rank per row (from the sorted distinct values, missing
+    values last) and filtering a partition of the rows per distinct value,
+    so a query never compares the rows themselves.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.rows = data.num_rows if isinstance(data, pa.Table) else len(data)
+        self.columns = list(data.column_names if isinstance(data, pa.Table) else data.columns)
+        self._ranks = {}
+        self._orders = {}
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def _values(self, column):
+        if isinstance(self.data, pa.Table):
+            return self.data.column(column).to_pandas()
+        return self.data[column]
+
+    def _rank(self, column):
+        if column not in self._ranks:
+            codes, uniques = pd.factorize(self._values(column), sort=True)
+            self._ranks[column] = (np.where(codes < 0, len(uniques), codes), len(uniques))
+        return self._ranks[column]
+
+    def order(self, column, descending=False):
+        """
+        Positions of all rows sorted by `column` (stable, missing last).
+        """
+        with self._lock:
+            key = (column, descending)
+            if key not in self._orders:
+                self._orders[key] = np.argsort(self._sort_key(column, descending), kind='stable')
+            return self._orders[key]
+
+    def _sort_key(self, column, descending):
+        rank, distinct = self._rank(column)
+        if not descending:
+            return rank
+        # Missing values (ranked `distinct`) stay last
+        return np.where(rank == distinct, distinct, distinct - 1 - rank)
+
+    def filter_values(self, column):
+        """
+        Distinct values of `column` that can be filtered on, or None when it
+        has more than FILTER_MAX_VALUES of them.
+        """
+        with self._lock:
+            if column not in self._groups:
+                values = self._values(column)
+                if values.nunique() > FILTER_MAX_VALUES:
+                    self._groups[column] = None
+                else:
+                    self._groups[column] = {
+                        value: positions for value, positions in partition_rows(values) if value is not None
+                    }
+            groups = self._groups[column]
+        return None if groups is None else list(groups)
+
+    def _mask(self, base):
+        mask = np.zeros(self.rows, dtype=bool)
+        mask[base] = True
+        return mask
+
+    def positions(self, sort=None, descending=False, filter_column=None, filter_values=(), base=None):
+        """
+        Positions of the rows matching the filter, in display order. `base`
+        (ascending positions) limits them to a subset of the rows.
+        """
+        if filter_column is None:
+            if sort is None:
+                return np.arange(self.rows) if base is None else base
+            order = self.order(sort, descending)
+            return order if base is None else order[self._mask(base)[order]]
+
+        self.filter_values(filter_column)
+        groups = self._groups[filter_column] or {}
+        selected = [groups[value] for value in filter_values if value in groups]
+        positions = np.sort(np.concatenate(selected)) if selected else np.empty(0, dtype=np.int64)
+        if base is not None:
+            positions = positions[self._mask(base)[positions]]
+        if sort is not None:
+            with self._lock:
+                sort_key = self._sort_key(sort, descending)
+            positions = positions[np.argsort(sort_key[positions], kind='stable')]
+        return positions
+
+    def window(self, positions):
+        """
+        The rows at `positions` as a dataframe.
+        """
+        if isinstance(self.data, pa.Table):
+            return self.data.take(pa.array(positions, type=pa.int64())).to_pandas()
+        return self.data.take(positions)
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def table_index(name, version, data):
+    """
+    Function to get the shared TableIndex of a table, by (name, version).
+    """
+    key = (name, version)
+    with _indexes_lock:
+        if key in _indexes:
+            _indexes.move_to_end(key)
+            return _indexes[key]
+        index = _indexes[key] = TableIndex(data)
+        while len(_indexes) > INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+        return index
+
+
+def _session_cache():
+    if '_paged_table_cache' not in st.session_state:
+        st.session_state['_paged_table_cache'] = OrderedDict()
+    return st.session_state['_paged_table_cache']
+
+
+def paged_table(name, data, version, page_rows=PAGE_ROWS, base=None, base_state=None):
+    """
+    Function to show a dataframe or Arrow table one page at a time, with
+    sorting and filtering done on the server. Only the visible page is sent
+    to the browser, and the page slices of the session are cached by
+    (table, version, base state, sort, filter, page).
+
+    `version` identifies the content of `data`; tables with the same name
+    and version share their index across sessions. `base`, ascending row
+    positions of `data` identified by `base_state`, limits the table to
+    those rows without taking them: only the visible page is ever taken.
+    """
+    index = table_index(name, version, data)
+
+    with st.expander("Sort and filter"):
+        sort = st.selectbox("Sort by", [None] + index.columns, format_func=lambda c: '—' if c is None else c,
+                            key=f'{name}_sort')
+        descending = st.checkbox("Descending", key=f'{name}_descending')
+        filter_column = st.selectbox("Filter on", [None] + index.columns, format_func=lambda c: '—' if c is None else c,
+                                     key=f'{name}_filter_column')
+        filter_values = ()
+        if filter_column is not None:
+            options = index.filter_values(filter_column)
+            if options is None:
+                st.caption(f"{filter_column} has too many distinct values to filter on.")
+                filter_column = None
+            else:
+                filter_values = tuple(st.multiselect("Values", options, key=f'{name}_filter_values_{filter_column}'))
+                if not filter_values:
+                    filter_column = None
+
+    query = (sort, descending, filter_column, filter_values)
+    cache = _session_cache()
+    positions_key = (name, version, base_state, query)
+    if filter_column is None and (base is None or sort is None):
+        # Unfiltered orders are shared by all sessions through the index, and
+        # the base positions by whoever made them
+        positions = index.positions(*query, base=base)
+    else:
+        if positions_key not in cache:
+            cache[positions_key] = index.positions(*query, base=base)
+        cache.move_to_end(positions_key)
+        positions = cache[positions_key]
+
+    # A new sort or filter starts again from the first page
+    pages = max(1, -(-len(positions) // page_rows))
+    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1,
+                           key=f'{name}_page_{hash((version, base_state, query))}')
+
+    page_key = (name, version, base_state, query, page)
+    count('page_slices', page_key in cache)
+    if page_key not in cache:
+        cache[page_key] = index.window(positions[(page - 1) * page_rows:page * page_rows])
+    cache.move_to_end(page_key)
+    while len(cache) > SESSION_CACHE_SIZE:
+        cache.popitem(last=False)
+
+    st.dataframe(cache[page_key], use_container_width=True)
+    first = (page - 1) * page_rows + 1 if len(positions) else 0
+    st.caption(f"Rows {first:,}–{min(page * page_rows, len(positions)):,} of {len(positions):,}")
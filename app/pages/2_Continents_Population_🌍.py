@@ -1,95 +1,119 @@
 import streamlit as st
-import pandas as pd
-from component import page_style
+from component import memory_panel, page_style
+from datasets import dataset_version, load_dataset
+from exports import export_controls
+from gapminder import COMPARISON_METRICS, MEASURES, METRIC_LABELS, gapminder_store
+from paged_table import paged_table
+from profiler import profiled_fragment, profiler_panel
+from warmup import wait_for, warmup_panel
 
 page_style()
 
 # Title
 st.title("Continents Population Data Analysis 🌍")
 
-# Load the dataset
-df = pd.read_csv("https://raw.githubusercontent.com/plotly/datasets/master/gapminderDataFiveYear.csv")
+# Load the dataset, once the warm-up has prepared it
+wait_for('gapminder')
+df = load_dataset('gapminder')
 
 # Display the dataset
 st.write("Here's a preview of the dataset:")
-st.write(df.head())
+paged_table('gapminder', df, dataset_version('gapminder'))
 
 # Interactive Analytics Dashboard Header
 st.header("Interactive Analytics Dashboard")
 st.write("This dashboard allows you to explore data interactively by selecting a continent and country. It displays key metrics such as life expectancy, population, and GDP per capita over time.")
 
-# Continent selection
-continent = st.selectbox("Select a Continent", df['continent'].unique())
-
-# Filter data based on selected continent
-df_continent = df[df['continent'] == continent]
+# Continent and country selection, answered from the precomputed store
+store = gapminder_store()
+continent = st.selectbox("Select a Continent", store.continents())
 
 # Country selection within the selected continent
-country = st.selectbox("Select a Country", df_continent['country'].unique())
-
-# Filter data based on selected country
-df_country = df_continent[df_continent['country'] == country]
+country = st.selectbox("Select a Country", store.countries(continent))
 
 # Line charts for various metrics
 st.subheader(f"Data for {country} in {continent}")
 
 st.write("### Life Expectancy at Birth (Years)")
-st.line_chart(df_country.groupby('year')['lifeExp'].mean())
+st.line_chart(store.metric(country, 'lifeExp'))
 
 st.write("### Population")
-st.line_chart(df_country.groupby('year')['pop'].mean())
+st.line_chart(store.metric(country, 'pop'))
 
 st.write("### GDP per Capita")
-st.line_chart(df_country.groupby('year')['gdpPercap'].mean())
+st.line_chart(store.metric(country, 'gdpPercap'))
+
 
 # Additional Interaction: Year Filter
-st.header("Advanced Filtering Options")
+@st.fragment
+@profiled_fragment('continents')
+def year_section(store, continent, country):
+    """
+    Year filter with its charts and the download of the filtered rows. A
+    fragment: moving the slider only reruns this section.
+    """
+    st.header("Advanced Filtering Options")
 
-# Year filter
-year_range = st.slider("Select Year Range", min_value=int(df_country['year'].min()), max_value=int(df_country['year'].max()), value=(int(df_country['year'].min()), int(df_country['year'].max())))
-df_country_filtered = df_country[(df_country['year'] >= year_range[0]) & (df_country['year'] <= year_range[1])]
+    # Year filter
+    year_min, year_max = store.year_bounds(country)
+    year_range = st.slider("Select Year Range", min_value=year_min, max_value=year_max, value=(year_min, year_max))
 
-st.write(f"Data for {country} from {year_range[0]} to {year_range[1]}")
+    st.write(f"Data for {country} from {year_range[0]} to {year_range[1]}")
 
-# Filtered Line Charts
-st.write("### Life Expectancy (Filtered)")
-st.line_chart(df_country_filtered.groupby('year')['lifeExp'].mean())
+    # Filtered Line Charts
+    st.write("### Life Expectancy (Filtered)")
+    st.line_chart(store.metric(country, 'lifeExp', year_range))
 
-st.write("### Population (Filtered)")
-st.line_chart(df_country_filtered.groupby('year')['pop'].mean())
+    st.write("### Population (Filtered)")
+    st.line_chart(store.metric(country, 'pop', year_range))
 
-st.write("### GDP per Capita (Filtered)")
-st.line_chart(df_country_filtered.groupby('year')['gdpPercap'].mean())
+    st.write("### GDP per Capita (Filtered)")
+    st.line_chart(store.metric(country, 'gdpPercap', year_range))
 
-# Additional Chart: Comparison Between Countries
-st.header("Comparison Between Countries")
+    # Download Filtered Data
+    st.header("Download Filtered Data")
 
-# Multi-select box for countries
-countries_selected = st.multiselect("Select countries to compare", df_continent['country'].unique(), default=[country])
+    # Provide an option for users to download the filtered data
+    st.write("You can download the filtered data for further analysis.")
+    export_controls(
+        'gapminder', store.rows(country, year_range), (continent, country, year_range), dataset_version('gapminder'),
+        f'{country}_data_filtered',
+    )
 
-# Filter data for the selected countries
-df_countries = df_continent[df_continent['country'].isin(countries_selected)]
 
-# Chart comparing life expectancy across selected countries
-st.write("### Life Expectancy Comparison")
-st.line_chart(df_countries.groupby(['year', 'country'])['lifeExp'].mean().unstack())
+year_section(store, continent, country)
 
-# Chart comparing GDP per capita across selected countries
-st.write("### GDP per Capita Comparison")
-st.line_chart(df_countries.groupby(['year', 'country'])['gdpPercap'].mean().unstack())
 
-# Download Filtered Data
-st.header("Download Filtered Data")
-
-# Provide an option for users to download the filtered data
-st.write("You can download the filtered data for further analysis.")
-csv = df_country_filtered.to_csv(index=False)
-st.download_button(
-    label="Download Filtered Data as CSV",
-    data=csv,
-    file_name=f'{country}_data_filtered.csv',
-    mime='text/csv',
-)
+# Additional Chart: Comparison Between Countries
+@st.fragment
+@profiled_fragment('continents')
+def comparison_section(store, country):
+    """
+    Comparison of any countries on any metrics, as values, growth rates or
+    ranks. A fragment: changing the selection only reruns this section.
+    """
+    st.header("Comparison Between Countries")
+
+    # Multi-select boxes for countries from any continent, and for metrics
+    countries_selected = st.multiselect("Select countries to compare", store.all_countries(), default=[country])
+    metrics_selected = st.multiselect(
+        "Select metrics to compare", COMPARISON_METRICS, default=['lifeExp', 'gdpPercap'], format_func=METRIC_LABELS.get,
+    )
+    measure = st.radio("Show", list(MEASURES), format_func=MEASURES.get, horizontal=True)
+    if measure == 'rank':
+        st.caption(f"Rank 1 is the highest of the {len(store.all_countries())} countries in a given year.")
+
+    # One chart per metric, comparing the selected countries
+    for metric in metrics_selected:
+        st.write(f"### {METRIC_LABELS[metric]} Comparison")
+        st.line_chart(store.comparison(countries_selected, metric, measure))
+
+
+comparison_section(store, country)
 
 # Final Remarks
 st.write("That's the end of this dashboard. 🎉 Explore more by changing the selections and viewing the dynamic changes!")
+
+memory_panel()
+profiler_panel('continents')
+warmup_panel()
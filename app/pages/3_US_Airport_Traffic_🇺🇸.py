@@ -1,116 +1,133 @@
 import streamlit as st
-import pandas as pd
-import pydeck as pdk
-from component import page_style
+from component import memory_panel, page_style
+from airports import TOP_AIRPORTS, airport_geo, airport_summary, load_airports, map_layers
+from datasets import dataset_version
+from paged_table import paged_table
+from profiler import profiled_fragment, profiler_panel, timed
+from warmup import wait_for, warmup_panel
 
 page_style()
 
 # Section 2: United States Airport Traffic Analysis
 st.title("United States Airport Traffic Analysis 🛩️")
 
-# Load the US airport dataset
-us_airport_df = pd.read_csv("https://raw.githubusercontent.com/plotly/datasets/master/2011_february_us_airport_traffic.csv")
-us_airport_df.rename(columns={'long': 'lon'}, inplace=True)
-
-# Dictionary mapping state abbreviations to full names
-state_names = {
-    "AL": "Alabama", "AK": "Alaska", "AZ": "Arizona", "AR": "Arkansas", "CA": "California", "CO": "Colorado",
-    "CT": "Connecticut", "DE": "Delaware", "FL": "Florida", "GA": "Georgia", "HI": "Hawaii", "ID": "Idaho",
-    "IL": "Illinois", "IN": "Indiana", "IA": "Iowa", "KS": "Kansas", "KY": "Kentucky", "LA": "Louisiana",
-    "ME": "Maine", "MD": "Maryland", "MA": "Massachusetts", "MI": "Michigan", "MN": "Minnesota",
-    "MS": "Mississippi", "MO": "Missouri", "MT": "Montana", "NE": "Nebraska", "NV": "Nevada",
-    "NH": "New Hampshire", "NJ": "New Jersey", "NM": "New Mexico", "NY": "New York", "NC": "North Carolina",
-    "ND": "North Dakota", "OH": "Ohio", "OK": "Oklahoma", "OR": "Oregon", "PA": "Pennsylvania",
-    "RI": "Rhode Island", "SC": "South Carolina", "SD": "South Dakota", "TN": "Tennessee", "TX": "Texas",
-    "UT": "Utah", "VT": "Vermont", "VA": "Virginia", "WA": "Washington", "WV": "West Virginia",
-    "WI": "Wisconsin", "WY": "Wyoming"
-}
-
-# Add full state names to the DataFrame
-us_airport_df['state_full'] = us_airport_df['state'].map(state_names)
-
-# Display a sample of the data
-st.write("Here’s a sample of the US airport traffic data:")
-st.write(us_airport_df.sample(5))
+# Load the US airport dataset, with full state names, its spatial layer and
+# its summary tables, once the warm-up has prepared them
+wait_for('us_airports')
+us_airport_df = load_airports()
+geo = airport_geo()
+summary = airport_summary()
+
+# Display the data, one page at a time
+st.write("Here’s the US airport traffic data:")
+paged_table('us_airports', us_airport_df, dataset_version('us_airports'), page_rows=10)
 
 # Display a map of US airport traffic using PyDeck
 st.subheader("Airport Traffic Map")
 
-# PyDeck configuration
-view_state = pdk.ViewState(
-    latitude=us_airport_df['lat'].mean(),
-    longitude=us_airport_df['lon'].mean(),
-    zoom=3,
-    pitch=40,
-)
-
-layer = pdk.Layer(
-    'ScatterplotLayer',
-    data=us_airport_df,
-    get_position='[lon, lat]',
-    get_radius=10000,
-    get_color='[200, 30, 0, 160]',
-    pickable=True,
-)
+# Columns of the airport rankings
+RANKING_COLUMNS = ['iata', 'airport', 'city', 'cnt']
 
 tooltip = {"html": "<b>Airport:</b> {airport}<br/><b>City:</b> {city}<br/><b>State:</b> {state_full}"}
+cluster_tooltip = {"html": "<b>Airports:</b> {count}<br/><b>Traffic Volume:</b> {cnt}"}
+
+
+@timed('airport map')
+def airport_map(state, color):
+    """
+    PyDeck map of all airports (or one state's, with the other airports in
+    view in grey when zoomed in), fitted to their bounding box and drawn as
+    points or, for large datasets at a low zoom, as traffic-weighted
+    clusters.
+    """
+    # Loaded with the map, after the page's header and metrics are out
+    import pydeck as pdk
+
+    (latitude, longitude, zoom), (data, clustered), nearby = map_layers(state)
+
+    def scatter(data, clustered, color, pickable):
+        return pdk.Layer(
+            'ScatterplotLayer',
+            data=data,
+            get_position='[lon, lat]',
+            get_radius='radius' if clustered else 10000,
+            get_color=color,
+            pickable=pickable,
+        )
+
+    layers = [scatter(data, clustered, color, True)]
+    if nearby is not None:
+        # Context only: the tooltip is about the selected state's airports
+        layers.insert(0, scatter(*nearby, '[150, 150, 150, 90]', False))
+    return pdk.Deck(
+        layers=layers,
+        initial_view_state=pdk.ViewState(latitude=latitude, longitude=longitude, zoom=zoom, pitch=40),
+        tooltip=cluster_tooltip if clustered else tooltip,
+    )
+
+
+# The map is fitted to the airports, so there is nothing to fit without any
+if len(us_airport_df):
+    st.pydeck_chart(airport_map(None, '[200, 30, 0, 160]'))
+else:
+    st.info("There are no airports in the data to map.")
 
-r = pdk.Deck(
-    layers=[layer],
-    initial_view_state=view_state,
-    tooltip=tooltip
-)
-
-st.pydeck_chart(r)
 
 # Filter US airport data by state using full state names
-st.subheader("Filter Airport Traffic by State")
-
-selected_state = st.selectbox("Select a State", us_airport_df['state_full'].unique())
-df_state = us_airport_df[us_airport_df['state_full'] == selected_state]
-
-# Create a filtered map for the selected state
-st.write(f"Airports in {selected_state}")
-filtered_view_state = pdk.ViewState(
-    latitude=df_state['lat'].mean(),
-    longitude=df_state['lon'].mean(),
-    zoom=6,
-    pitch=40,
-)
-
-filtered_layer = pdk.Layer(
-    'ScatterplotLayer',
-    data=df_state,
-    get_position='[lon, lat]',
-    get_radius=10000,
-    get_color='[0, 100, 200, 160]',
-    pickable=True,
-)
-
-filtered_r = pdk.Deck(
-    layers=[filtered_layer],
-    initial_view_state=filtered_view_state,
-    tooltip=tooltip
-)
-
-st.pydeck_chart(filtered_r)
+@st.fragment
+@profiled_fragment('airports')
+def state_section(geo, summary):
+    """
+    State selection with its map and busiest airports. A fragment: picking
+    another state only reruns this section, not the national map and the
+    traffic chart.
+    """
+    st.subheader("Filter Airport Traffic by State")
+
+    selected_state = st.selectbox("Select a State", geo.states())
+    if selected_state is None:
+        st.info("There are no states with airports in the data.")
+        return
+
+    # Create a filtered map for the selected state
+    st.write(f"Airports in {selected_state}")
+    st.pydeck_chart(airport_map(selected_state, '[0, 100, 200, 160]'))
+
+    state_busiest = summary.busiest_by_state[selected_state]
+    st.write(f"Busiest airport in {selected_state}: **{state_busiest['airport']}** in {state_busiest['city']} ({state_busiest['cnt']})")
+
+    # Ranking of the state's airports
+    st.write(f"Busiest airports in {selected_state}:")
+    st.dataframe(summary.top_airports(state=selected_state)[RANKING_COLUMNS], use_container_width=True)
+
+
+state_section(geo, summary)
 
 # Highlight the busiest airport in the US dataset
 st.subheader("Busiest Airport Information")
 
-busiest_airport = us_airport_df.loc[us_airport_df['cnt'].idxmax()]
+busiest_airport = summary.busiest
+
+# None when the data has no airports
+if busiest_airport is None:
+    st.info("There are no airports in the data to rank.")
+else:
+    st.write(f"🛫 **Busiest Airport**: {busiest_airport['airport']} in {busiest_airport['city']}, {busiest_airport['state_full']}")
+    st.write(f"**Traffic Volume**: {busiest_airport['cnt']}")
 
-st.write(f"🛫 **Busiest Airport**: {busiest_airport['airport']} in {busiest_airport['city']}, {busiest_airport['state_full']}")
-st.write(f"**Traffic Volume**: {busiest_airport['cnt']}")
+# Ranking of the busiest airports in the country
+st.write(f"Top {TOP_AIRPORTS} airports by traffic volume:")
+st.dataframe(summary.top_airports()[RANKING_COLUMNS + ['state_full']], use_container_width=True)
 
 # Traffic Volume by State
 st.subheader("Traffic Volume by State")
 
-# Summarize traffic data by state
-df_state_traffic = us_airport_df.groupby('state_full')['cnt'].sum().reset_index()
-
-# Display a bar chart
-st.bar_chart(df_state_traffic.set_index('state_full'))
+# Display a bar chart of the precomputed traffic totals per state
+st.bar_chart(summary.state_traffic)
 
 # Final Results
-st.write("Explore both the US-specific data interactively with this dashboard. Adjust the selections to view data trends and visualize traffic patterns dynamically.")
\ No newline at end of file
+st.write("Explore both the US-specific data interactively with this dashboard. Adjust the selections to view data trends and visualize traffic patterns dynamically.")
+
+memory_panel()
+profiler_panel('airports')
+warmup_panel()
@@ -1,91 +1,57 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from PIL import Image
-from sklearn.linear_model import LinearRegression
 import numpy as np
+from assets import asset_bytes
+from component import memory_panel
+from datasets import dataset_version, load_table
+from exports import export_controls
+from figures import LineChart, state_key
+from paged_table import paged_table
+from malaysia import (
+    group_forecast, load_population, population_charts, population_cube, population_filter_index, population_version,
+)
+from population_analytics import BREAKDOWNS, MODES, SAMPLE_ROWS, population_analytics, structure_charts
+from profiler import profiled_fragment, profiler_panel
+from scheduler import PageTasks
+from warmup import wait_for, warmup_panel
 
 # Set up the Streamlit app title
 st.title("Malaysian Population Data Dashboard 🇲🇾")
 
-# Load the dataset
-URL_DATA = 'https://storage.dosm.gov.my/population/population_malaysia.parquet'
-df_raw = pd.read_parquet(URL_DATA)
-df_malaysia = df_raw.copy()
-
-# Convert 'date' column to datetime format
-if 'date' in df_malaysia.columns:
-    df_malaysia['date'] = pd.to_datetime(df_malaysia['date'], errors='coerce')
-
-# Clean and classify ethnicity
-def classify_ethnicity(ethnicity):
-    if ethnicity in ['overall']:
-        return 'Overall'
-    elif ethnicity in ['bumi', 'bumi_malay']:
-        return 'Malay'
-    elif ethnicity == 'chinese':
-        return 'Chinese'
-    elif ethnicity == 'indian':
-        return 'Indian'
-    elif ethnicity in ['other', 'bumi_other', 'other_citizen', 'other_noncitizen']:
-        return 'Others'
-    else:
-        return 'Unknown'
-
-df_malaysia['ethnicity'] = df_malaysia['ethnicity'].apply(classify_ethnicity)
-
-# Clean and classify age groups
-def classify_age_group(age):
-    if age == 'overall':
-        return 'Overall'
-    age_ranges = {
-        '18-24 (Gen Z)': ['15-19', '20-24'],
-        '25-40 (Millennial)': ['25-29', '30-34', '35-39'],
-        '41-56 (Gen X)': ['40-44', '45-49', '50-54', '55-59'],
-        '57+ (Baby Boomers)': ['60-64', '65-69', '70+', '70-74', '75-79', '80+', '80-84', '85+']
-    }
-    for group, ranges in age_ranges.items():
-        if age in ranges:
-            return group
-    return 'Unknown'
-
-df_malaysia['age_group'] = df_malaysia['age'].apply(classify_age_group)
-
-# Remove rows with 'Unknown' in ethnicity or age_group
-df_malaysia = df_malaysia[(df_malaysia['ethnicity'] != 'Unknown') & (df_malaysia['age_group'] != 'Unknown')]
-
-# Remove duplicate rows
-df_malaysia = df_malaysia.drop_duplicates()
-
-# Rename columns in the cleaned dataset
-df_malaysia = df_malaysia.rename(columns={
-    'date': 'Date',
-    'sex': 'Gender',
-    'age': 'Age',
-    'age_group': 'Age_Group',
-    'ethnicity': 'Ethnicity',
-    'population': 'Sample_Population'
-})
-
-# Check for any NaT values after conversion
-if df_malaysia['Date'].isna().any():
+# Wait for the warm-up to prepare the data and the default charts
+wait_for('malaysia_population')
+
+# Load the dataset, as the shared memory-mapped table for display
+df_raw = load_table('malaysia_population')
+
+# Cleaned and classified data, updated incrementally with each new release
+df_malaysia = load_population()
+
+# Rows whose date could not be parsed are left out of the cleaned dataset
+if df_malaysia.attrs.get('invalid_dates'):
     st.warning("There are some NaT values in the Date column after conversion. Please check the data.")
 
+# Indexes over the cleaned data, built once per version of the source file
+filter_index = population_filter_index()
+if filter_index.year_bounds is None:
+    st.warning("There are no rows with a valid date in the population data.")
+    st.stop()
+year_min, year_max = filter_index.year_bounds
+
 # Sidebar filters for interaction
 st.sidebar.header("Filter the Data:")
-sex_filter = st.sidebar.multiselect("Select Gender:", options=df_malaysia['Gender'].unique(), default=df_malaysia['Gender'].unique())
-age_filter = st.sidebar.multiselect("Select Age Group:", options=df_malaysia['Age_Group'].unique(), default=df_malaysia['Age_Group'].unique())
-ethnicity_filter = st.sidebar.multiselect("Select Ethnicity:", options=df_malaysia['Ethnicity'].unique(), default=df_malaysia['Ethnicity'].unique())
-year_filter = st.sidebar.slider("Select Year Range:", int(df_malaysia['Date'].dt.year.min()), int(df_malaysia['Date'].dt.year.max()), (int(df_malaysia['Date'].dt.year.min()), int(df_malaysia['Date'].dt.year.max())))
-
-# Filter the data based on selections
-filtered_data = df_malaysia[
-    (df_malaysia['Gender'].isin(sex_filter)) &
-    (df_malaysia['Age_Group'].isin(age_filter)) &
-    (df_malaysia['Ethnicity'].isin(ethnicity_filter)) &
-    (df_malaysia['Date'].dt.year.between(year_filter[0], year_filter[1]))
-]
+sex_filter = st.sidebar.multiselect("Select Gender:", options=filter_index.values('Gender'), default=filter_index.values('Gender'))
+age_filter = st.sidebar.multiselect("Select Age Group:", options=filter_index.values('Age_Group'), default=filter_index.values('Age_Group'))
+ethnicity_filter = st.sidebar.multiselect("Select Ethnicity:", options=filter_index.values('Ethnicity'), default=filter_index.values('Ethnicity'))
+year_filter = st.sidebar.slider("Select Year Range:", year_min, year_max, (year_min, year_max))
+
+# Filter the data based on selections. The table and the export take the
+# matching rows of the shared data by position, and charts derived from them
+# are cached by (filter state, data version).
+selections = {'Gender': sex_filter, 'Age_Group': age_filter, 'Ethnicity': ethnicity_filter}
+filter_state = state_key(selections, year_filter)
+data_version = population_version()
+filtered_positions = filter_index.positions(selections, year_filter)
 
 # Display raw and filtered datasets side by side
 st.write("### Dataset Comparison")
@@ -93,62 +59,51 @@ col1, col2, col3 = st.columns([4, 1, 8])
 
 with col1:
     st.write("### Raw Dataset")
-    st.write(df_raw)
+    paged_table('malaysia_raw', df_raw, dataset_version('malaysia_population'))
 
 with col2:
     for _ in range(10):  # Adjust this range to increase/decrease vertical space
         st.text("")
-    image = Image.open('assets/After_Cleaning.png')  # Load the uploaded image
-    st.image(image, use_column_width=True)
+    st.image(asset_bytes('after_cleaning'), use_column_width=True)
 
 with col3:
     st.write("### Cleaned Dataset")
-    st.write(filtered_data)
+    paged_table('malaysia_filtered', df_malaysia, data_version, base=filtered_positions, base_state=filter_state)
+
+# Export the filtered data, prepared on demand
+st.write("You can download the filtered data for further analysis.")
+export_controls(
+    'malaysia', df_malaysia, filter_state, data_version, 'malaysian_population_filtered', positions=filtered_positions
+)
 
 # Arrange visualizations in columns and rows
 st.write("### Visualizations")
 
+# All charts are answered from the rollup cube with the same selections, and
+# rendered charts are cached by (chart, filter state, data version). The
+# charts of the default filters are pre-rendered by the warm-up. Charts
+# that are not cached are built and rendered in parallel while the rest of
+# the page is drawn, and appear as they are ready.
+cube = population_cube()
+charts = population_charts(cube, filter_index, selections, year_filter)
+tasks = PageTasks()
+
 # Columns for population by age group and by ethnicity
 col4, col5 = st.columns(2)
 
-# Set a consistent figure size
-fig_size = (8, 5)
-
 # Population distribution by age group
 with col4:
-    if 'Age_Group' in filtered_data.columns and 'Sample_Population' in filtered_data.columns:
-        st.subheader("Population Distribution by Age Group")
-        fig, ax = plt.subplots(figsize=fig_size)
-        sns.barplot(x='Age_Group', y='Sample_Population', data=filtered_data, hue='Gender', ax=ax)
-        plt.xticks(rotation=45)
-        plt.title("Population Distribution by Age Group")
-        plt.xlabel("Age Group")
-        plt.ylabel("Population")
-        st.pyplot(fig)
+    st.subheader("Population Distribution by Age Group")
+    tasks.chart('age_group_distribution', filter_state, data_version, charts['age_group_distribution'])
 
 # Population distribution by ethnicity
 with col5:
-    if 'Ethnicity' in filtered_data.columns and 'Sample_Population' in filtered_data.columns:
-        st.subheader("Population Distribution by Ethnicity")
-        fig, ax = plt.subplots(figsize=fig_size)
-        ethnicity_dist = filtered_data.groupby('Ethnicity')['Sample_Population'].sum().reset_index()
-        sns.barplot(x='Sample_Population', y='Ethnicity', data=ethnicity_dist, ax=ax)
-        plt.title("Population Distribution by Ethnicity")
-        plt.xlabel("Population")
-        plt.ylabel("Ethnicity")
-        st.pyplot(fig)
+    st.subheader("Population Distribution by Ethnicity")
+    tasks.chart('ethnicity_distribution', filter_state, data_version, charts['ethnicity_distribution'])
 
 # Population trend over time, arranged below the above visualizations
 st.write("### Population Trend Over Time")
-if 'Date' in filtered_data.columns and 'Sample_Population' in filtered_data.columns:
-    fig, ax = plt.subplots(figsize=(10, 6))
-    population_trend = filtered_data.groupby(filtered_data['Date'].dt.year)['Sample_Population'].sum()
-    ax.plot(population_trend.index, population_trend.values, marker='o', linestyle='-')
-    plt.title("Population Growth Trend in Malaysia")
-    plt.xlabel("Year")
-    plt.ylabel("Total Population")
-    plt.grid(True)
-    st.pyplot(fig)
+tasks.chart('population_trend', filter_state, data_version, charts['population_trend'])
 
 # Population trend by age group and ethnicity arranged in columns
 st.write("### Population Growth Trend by Age Group and Ethnicity")
@@ -159,123 +114,160 @@ col6, col7 = st.columns(2)
 # Population trend by age group
 with col6:
     st.subheader("Population Growth Trend by Age Group")
-    if 'Date' in filtered_data.columns and 'Sample_Population' in filtered_data.columns:
-        age_group_trend = filtered_data.groupby(['Date', 'Age_Group'])['Sample_Population'].sum().reset_index()
-        fig1, ax1 = plt.subplots(figsize=(10, 6))
-        sns.lineplot(data=age_group_trend, x='Date', y='Sample_Population', hue='Age_Group', markers=True, dashes=False, ax=ax1)
-        plt.title("Population Growth by Age Group")
-        plt.xlabel("Year")
-        plt.ylabel("Population")
-        plt.xticks(rotation=45)
-        plt.grid(True)
-        st.pyplot(fig1)
+    tasks.chart('age_group_trend', filter_state, data_version, charts['age_group_trend'])
 
 # Population trend by ethnicity
 with col7:
     st.subheader("Population Growth Trend by Ethnicity")
-    if 'Date' in filtered_data.columns and 'Sample_Population' in filtered_data.columns:
-        ethnicity_trend = filtered_data.groupby(['Date', 'Ethnicity'])['Sample_Population'].sum().reset_index()
-        fig2, ax2 = plt.subplots(figsize=(10, 6))
-        sns.lineplot(data=ethnicity_trend, x='Date', y='Sample_Population', hue='Ethnicity', markers=True, dashes=False, ax=ax2)
-        plt.title("Population Growth by Ethnicity")
-        plt.xlabel("Year")
-        plt.ylabel("Population")
-        plt.xticks(rotation=45)
-        plt.grid(True)
-        st.pyplot(fig2)
+    tasks.chart('ethnicity_trend', filter_state, data_version, charts['ethnicity_trend'])
+
+# Fill in the charts above as they finish, before the sections below wait
+# for their own
+tasks.run()
+
+
+# Population structure section
+@st.fragment
+@profiled_fragment('malaysia')
+def structure_section(selections, year_filter, filter_state):
+    """
+    Population shares, growth, dependency ratios and age pyramid, computed
+    from the analytics array of the raw data (every age, including the
+    under-15s). A fragment: changing its inputs only reruns this section.
+    """
+    st.header("Population Structure")
+
+    col10, col11 = st.columns(2)
+    with col10:
+        breakdown = st.selectbox("Break down by:", list(BREAKDOWNS), format_func=BREAKDOWNS.get)
+    with col11:
+        mode = st.radio("Computation:", list(MODES), format_func=MODES.get, horizontal=True)
+
+    # Exact, or estimated from a sample of the rows for very large releases
+    analytics = population_analytics(mode)
+    if analytics.mode == 'sampled':
+        st.caption(f"Estimated from a {analytics.sample_rate:.1%} sample of the rows.")
+    elif mode == 'sampled':
+        st.caption(f"Computed from all {analytics.rows:,} rows: only releases with more than {SAMPLE_ROWS:,} rows are sampled.")
+
+    years = [int(year) for year in analytics.years if year_filter[0] <= year <= year_filter[1]]
+    if not years:
+        st.warning("There is no data in the selected year range.")
+        return
+    pyramid_year = st.select_slider("Age pyramid year:", options=years, value=years[-1])
+
+    charts = structure_charts(analytics, selections, year_filter, breakdown, pyramid_year)
+    version = dataset_version('malaysia_population')
+    structure_state = state_key(filter_state, breakdown, analytics.sample_rate)
+    tasks = PageTasks()
+
+    # Shares and growth of the chosen breakdown, side by side
+    col12, col13 = st.columns(2)
+    with col12:
+        tasks.chart('population_shares', structure_state, version, charts['population_shares'])
+    with col13:
+        tasks.chart('population_growth', structure_state, version, charts['population_growth'])
+
+    # Dependency ratios next to the age pyramid of the chosen year
+    col14, col15 = st.columns(2)
+    with col14:
+        tasks.chart('dependency_ratios', state_key(filter_state, analytics.sample_rate), version, charts['dependency_ratios'])
+    with col15:
+        tasks.chart('age_pyramid', state_key(filter_state, analytics.sample_rate, pyramid_year), version, charts['age_pyramid'])
+
+    tasks.run()
+
+
+structure_section(selections, year_filter, filter_state)
 
-# Prediction section
-st.header("Predict Future Population Growth")
-
-# Input fields for prediction
-start_year = st.number_input("Select Start Year:", min_value=int(df_malaysia['Date'].dt.year.min()), max_value=2124, value=int(df_malaysia['Date'].dt.year.max()), step=1)
-end_year = st.number_input("Select End Year:", min_value=start_year + 1, max_value=2124, value=start_year + 10, step=1)
-
-# Multi-select for ethnicity and age group
-selected_age_groups = st.multiselect("Select Age Groups for Prediction:", options=df_malaysia['Age_Group'].unique())
-selected_ethnicities = st.multiselect("Select Ethnicities for Prediction:", options=df_malaysia['Ethnicity'].unique())
 
-# Create columns for the two graphs
-col8, col9 = st.columns(2)
-
-# Predict future population for selected age groups
-with col8:
-    if selected_age_groups:  # Check if any age groups are selected
-        # Prepare filtered data
-        filtered_age_group_data = filtered_data[filtered_data['Age_Group'].isin(selected_age_groups)]
-        
-        # Prepare data for prediction
-        X_age = filtered_age_group_data['Date'].dt.year.values.reshape(-1, 1)
-        y_age = filtered_age_group_data['Sample_Population'].values
-
-        # Train linear regression model
-        model_age = LinearRegression()
-        model_age.fit(X_age, y_age)
-
-        # Predict future population
-        future_years = np.arange(start_year, end_year + 1).reshape(-1, 1)
-        predicted_population_age = model_age.predict(future_years)
-
-        # Plot the prediction for age groups
-        fig_age, ax_age = plt.subplots(figsize=(10, 6))
-        
-        # Plot historical data with labels for selected age groups
-        for age_group in selected_age_groups:
-            age_group_data = filtered_age_group_data[filtered_age_group_data['Age_Group'] == age_group]
-            ax_age.plot(age_group_data['Date'].dt.year, age_group_data['Sample_Population'], marker='o', linestyle='-', label=f'Historical: {age_group}')
-        
-        # Plot predicted data
-        ax_age.plot(future_years, predicted_population_age, label='Predicted Population', color='orange', marker='o', linestyle='--')
-        
-        plt.title(f"Population Growth Prediction for Selected Age Groups: {', '.join(selected_age_groups)}")
-        plt.xlabel("Year")
-        plt.ylabel("Population")
-        plt.xticks(rotation=45)
-        plt.grid(True)
-        plt.legend()
-        st.pyplot(fig_age)
-    else:
-        st.warning("Please select at least one Age Group for prediction.")
-
-# Predict future population for selected ethnicities
-with col9:
-    if selected_ethnicities:  # Check if any ethnicities are selected
-        # Prepare filtered data
-        filtered_ethnicity_data = filtered_data[filtered_data['Ethnicity'].isin(selected_ethnicities)]
-        
-        # Prepare data for prediction
-        X_ethnicity = filtered_ethnicity_data['Date'].dt.year.values.reshape(-1, 1)
-        y_ethnicity = filtered_ethnicity_data['Sample_Population'].values
-
-        # Train linear regression model
-        model_ethnicity = LinearRegression()
-        model_ethnicity.fit(X_ethnicity, y_ethnicity)
-
-        # Predict future population
-        future_years = np.arange(start_year, end_year + 1).reshape(-1, 1)
-        predicted_population_ethnicity = model_ethnicity.predict(future_years)
-
-        # Plot the prediction for ethnicities
-        fig_ethnicity, ax_ethnicity = plt.subplots(figsize=(10, 6))
-        
-        # Plot historical data with labels for selected ethnicities
-        for ethnicity in selected_ethnicities:
-            ethnicity_data = filtered_ethnicity_data[filtered_ethnicity_data['Ethnicity'] == ethnicity]
-            ax_ethnicity.plot(ethnicity_data['Date'].dt.year, ethnicity_data['Sample_Population'], marker='o', linestyle='-', label=f'Historical: {ethnicity}')
-
-        # Plot predicted data
-        ax_ethnicity.plot(future_years, predicted_population_ethnicity, label='Predicted Population', color='orange', marker='o', linestyle='--')
-        
-        plt.title(f"Population Growth Prediction for Selected Ethnicities: {', '.join(selected_ethnicities)}")
-        plt.xlabel("Year")
-        plt.ylabel("Population")
-        plt.xticks(rotation=45)
-        plt.grid(True)
-        plt.legend()
-        st.pyplot(fig_ethnicity)
-    else:
-        st.warning("Please select at least one Ethnicity for prediction.")
+# Prediction section
+@st.fragment
+@profiled_fragment('malaysia')
+def prediction_section(cube, filter_index, selections, year_filter, filter_state, data_version):
+    """
+    Inputs and charts of the predictions. A fragment: changing its inputs
+    only reruns this section, with the filters of the last full run, instead
+    of reloading the data and redrawing the charts above.
+    """
+    st.header("Predict Future Population Growth")
+    if filter_index.year_bounds is None:
+        st.warning("There is no data to predict from.")
+        return
+    year_min, year_max = filter_index.year_bounds
+
+    # Input fields for prediction. Stepping through years fires one change
+    # per click, so the years are only applied when the form is submitted.
+    with st.form('prediction_years', border=False):
+        start_year = st.number_input("Select Start Year:", min_value=year_min, max_value=2124, value=year_max, step=1)
+        end_year = st.number_input("Select End Year:", min_value=start_year + 1, max_value=2124, value=start_year + 10, step=1)
+        st.form_submit_button("Update Years")
+
+    # Multi-select for ethnicity and age group. Charts are cached whatever
+    # order the groups were picked in, so they are drawn in the options' order.
+    selected_age_groups = st.multiselect("Select Age Groups for Prediction:", options=filter_index.values('Age_Group'))
+    selected_ethnicities = st.multiselect("Select Ethnicities for Prediction:", options=filter_index.values('Ethnicity'))
+    selected_age_groups = [group for group in filter_index.values('Age_Group') if group in selected_age_groups]
+    selected_ethnicities = [group for group in filter_index.values('Ethnicity') if group in selected_ethnicities]
+
+    def prediction_chart(column, selected, label):
+        """
+        Historical yearly population of each selected group, plus its linear
+        trend projected from start_year to end_year.
+        """
+        # Per-group trends, fitted together and cached per group, so changing the
+        # horizon or adding a group does not aggregate or refit the others
+        future_years = np.arange(start_year, end_year + 1)
+        yearly_totals, predicted = group_forecast(
+            cube, column, selected, selections, year_filter, state_key(column, filter_state), data_version, future_years,
+        )
+
+        lines, styles = [], {}
+        for i, group in enumerate(selected):
+            color = f'C{i % 10}'
+            if group in yearly_totals.columns:
+                lines.append(pd.DataFrame({'Year': yearly_totals.index, 'Population': yearly_totals[group].values, 'Series': f'Historical: {group}'}))
+            lines.append(pd.DataFrame({'Year': future_years, 'Population': predicted[:, i], 'Series': f'Predicted: {group}'}))
+            styles[f'Historical: {group}'] = {'color': color}
+            styles[f'Predicted: {group}'] = {'color': color, 'linestyle': '--'}
+
+        return LineChart(
+            pd.concat(lines).dropna(), x='Year', y='Population', series='Series', styles=styles,
+            title=f"Population Growth Prediction for Selected {label}: {', '.join(selected)}",
+            xlabel="Year", ylabel="Population", rotate_labels=True,
+        )
+
+    # Create columns for the two graphs
+    tasks = PageTasks()
+    col8, col9 = st.columns(2)
+
+    # Predict future population for selected age groups
+    with col8:
+        if selected_age_groups:  # Check if any age groups are selected
+            prediction_state = state_key(filter_state, selected_age_groups, start_year, end_year)
+            tasks.chart('age_group_prediction', prediction_state, data_version,
+                        lambda: prediction_chart('Age_Group', selected_age_groups, 'Age Groups'))
+        else:
+            st.warning("Please select at least one Age Group for prediction.")
+
+    # Predict future population for selected ethnicities
+    with col9:
+        if selected_ethnicities:  # Check if any ethnicities are selected
+            prediction_state = state_key(filter_state, selected_ethnicities, start_year, end_year)
+            tasks.chart('ethnicity_prediction', prediction_state, data_version,
+                        lambda: prediction_chart('Ethnicity', selected_ethnicities, 'Ethnicities'))
+        else:
+            st.warning("Please select at least one Ethnicity for prediction.")
+
+    tasks.run()
+
+
+prediction_section(cube, filter_index, selections, year_filter, filter_state, data_version)
 
 # Footer for the app
 st.write("### Data Source:")
 st.write("[Department of Statistics Malaysia](https://www.dosm.gov.my/)")
+
+memory_panel()
+profiler_panel('malaysia')
+warmup_panel()
@@ -0,0 +1,425 @@
+import functools
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from datasets import dataset_version, load_dataset
+from figures import BarChart, LineChart, state_key
+from lru import SizedLRU
+from malaysia import AGE_GROUPS, ETHNICITY_GROUPS
+from profiler import count, stage
+
+# In 'auto' mode, releases with more rows than this (of the dates that are
+# analysed) are analysed from a sample of SAMPLE_ROWS of them; 'exact'
+# always uses every row. 'sampled' samples SAMPLE_ROWS rows too, so a
+# release with fewer rows than that to analyse is analysed exactly in
+# every mode, as the current DOSM release is.
+EXACT_MAX_ROWS = int(os.environ.get('ANALYTICS_EXACT_MAX_ROWS', 2_000_000))
+SAMPLE_ROWS = int(os.environ.get('ANALYTICS_SAMPLE_ROWS', 500_000))
+
+# Results of the analyses, by (analysis, filter state, data version, sample rate)
+ANALYTICS_CACHE_BYTES = 32 * 1024 * 1024
+
+# DOSM codes that are totals of other codes of the same column. A total is
+# only counted in the years its parts are missing, so nothing is counted
+# twice. Age totals ('overall', '70+', '80+') are found from the bands:
+# they are left out where narrower bands cover their whole range.
+SEX_PARTS = {'both': ['male', 'female']}
+ETHNICITY_PARTS = {
+    'overall': ['bumi', 'bumi_malay', 'bumi_other', 'chinese', 'indian', 'other', 'other_citizen', 'other_noncitizen'],
+    'bumi': ['bumi_malay', 'bumi_other'],
+    'other': ['other_citizen', 'other_noncitizen'],
+}
+
+# Age bands of the dependency ratios: dependants under 15 and from 65, per
+# 100 people of working age (15-64)
+YOUNG_MAX_AGE = 14
+OLD_MIN_AGE = 65
+
+# Columns the structure charts can break the population down by, and the
+# ways the analytics can be computed
+BREAKDOWNS = {'Ethnicity': "Ethnicity", 'Gender': "Gender", 'Age_Group': "Age Group"}
+MODES = {'auto': "Automatic", 'exact': "Exact", 'sampled': "Fast (sampled)"}
+
+_results = SizedLRU(ANALYTICS_CACHE_BYTES)
+
+
+def age_bounds(code):
+    """
+    Function to get the (lowest, highest) age of a DOSM age code, e.g.
+    (15, 19) for '15-19', (85, inf) for '85+' and (0, inf) for 'overall'.
+    None for codes that are not age bands.
+    """
+    if code == 'overall':
+        return 0, np.inf
+    match = re.fullmatch(r'(\d+)(?:-(\d+)|\+)', str(code))
+    if match is None:
+        return None
+    return int(match.group(1)), int(match.group(2)) if match.group(2) else np.inf
+
+
+def _covered_by_parts(present, codes, parts):
+    """
+    (year x code) mask of the total codes with any of their parts present.
+    """
+    positions = {code: i for i, code in enumerate(codes)}
+    covered = np.zeros_like(present)
+    for code, code_parts in parts.items():
+        part_positions = [positions[part] for part in code_parts if part in positions]
+        if code in positions and part_positions:
+            covered[:, positions[code]] = present[:, part_positions].any(axis=1)
+    return covered
+
+
+def _covered_by_bands(present, codes):
+    """
+    (year x code) mask of the age codes whose whole range is covered by
+    narrower bands present the same year, e.g. '70+' when 70-74, 75-79 and
+    80+ (or 80-84 and 85+) are.
+    """
+    bounds = [age_bounds(code) for code in codes]
+    top = max([b[1] for b in bounds if b is not None and np.isfinite(b[1])] + [0]) + 2
+    # Ages each band spans, with the open-ended ones running to `top`
+    spans = np.zeros((len(codes), top), dtype=bool)
+    for i, b in enumerate(bounds):
+        if b is not None:
+            spans[i, b[0]:int(min(b[1], top - 1)) + 1] = True
+    widths = spans.sum(axis=1)
+
+    covered = np.zeros_like(present)
+    for i, b in enumerate(bounds):
+        narrower = [j for j in range(len(codes)) if widths[j] < widths[i] and (spans[j] <= spans[i]).all()]
+        if b is not None and narrower:
+            ages = (present[:, narrower].astype('int64') @ spans[narrower].astype('int64')) > 0
+            covered[:, i] = ages[:, spans[i]].all(axis=1)
+    return covered
+
+
+def _part_positions(codes, parts):
+    """
+    Positions of the parts of each total code, by the total's position.
+    """
+    positions = {code: i for i, code in enumerate(codes)}
+    return {
+        positions[code]: [positions[part] for part in code_parts if part in positions]
+        for code, code_parts in parts.items() if code in positions
+    }
+
+
+def _band_positions(codes):
+    """
+    Positions of the narrower age bands inside each age code's range, by
+    the code's position, e.g. 70-74, 75-79, 80+, 80-84 and 85+ for '70+'.
+    """
+    bounds = [age_bounds(code) for code in codes]
+
+    def inside(inner, outer):
+        return inner is not None and inner != outer and outer[0] <= inner[0] and inner[1] <= outer[1]
+
+    return {
+        i: [j for j, inner in enumerate(bounds) if inside(inner, outer)]
+        for i, outer in enumerate(bounds) if outer is not None
+    }
+
+
+def analysed_rows(df_raw):
+    """
+    Function to get the dates of the raw DOSM rows, the latest date of each
+    year, and the positions of the rows that are analysed: those of the
+    latest date of their year with a known ethnicity code.
+    """
+    dates = pd.to_datetime(df_raw['date'], errors='coerce')
+    # The latest date of each year stands for the year's population
+    distinct = pd.Series(pd.unique(dates.dropna()))
+    latest = distinct.groupby(distinct.dt.year).max().to_numpy()
+    rows = np.flatnonzero(np.isin(dates.to_numpy(), latest) & df_raw['ethnicity'].isin(ETHNICITY_GROUPS).to_numpy())
+    return dates, latest, rows
+
+
+def sample_rate(rows, mode):
+    """
+    Function to get the share of the `rows` rows to analyse that `mode`
+    uses: every row for 'exact', SAMPLE_ROWS of them for 'sampled' and, in
+    'auto' mode, for releases with more than EXACT_MAX_ROWS rows. Below
+    SAMPLE_ROWS rows every mode is exact.
+    """
+    if mode == 'sampled' or (mode == 'auto' and rows > EXACT_MAX_ROWS):
+        return min(1.0, SAMPLE_ROWS / max(rows, 1))
+    return 1.0
+
+
+class PopulationAnalytics:
+    """
+    Population of every (year, sex, age band, ethnicity) in a dense NumPy
+    array, built from the raw DOSM rows, so all ages are kept, including the
+    under-15 bands the dashboard's age groups leave out. Each year is its
+    latest release date, and total codes are only counted where their parts
+    are missing.
+
+    With a `sample_rate` below 1 (see sample_rate), it is built from a
+    random sample of the rows, each weighted by the inverse of the rate.
+    Sampled shares and ratios stay close to the exact ones when the cells
+    have many rows each; single cells can be off.
+    """
+
+    def __init__(self, df_raw, sample_rate=1.0, seed=0):
+        dates, latest, rows = analysed_rows(df_raw)
+        # Rows to analyse, before sampling
+        self.rows = len(rows)
+        self.sample_rate = sample_rate
+        self.mode = 'exact' if self.sample_rate >= 1 else 'sampled'
+        if self.mode == 'sampled':
+            rows = rows[np.random.default_rng(seed).random(len(rows)) < self.sample_rate]
+
+        self.years = np.sort(pd.DatetimeIndex(latest).year.to_numpy())
+        year_codes = np.searchsorted(self.years, dates.take(rows).dt.year.to_numpy())
+        sexes = pd.Categorical(df_raw['sex'].take(rows)).remove_unused_categories()
+        ages = pd.Categorical(df_raw['age'].take(rows)).remove_unused_categories()
+        ethnicities = pd.Categorical(df_raw['ethnicity'].take(rows)).remove_unused_categories()
+
+        shape = (len(self.years), len(sexes.categories), len(ages.categories), len(ethnicities.categories))
+        flat = np.ravel_multi_index((year_codes, sexes.codes, ages.codes, ethnicities.codes), shape)
+        weights = df_raw['population'].take(rows).fillna(0).to_numpy(dtype='float64') / self.sample_rate
+        values = np.bincount(flat, weights=weights, minlength=int(np.prod(shape))).reshape(shape)
+
+        # Which codes of each column have rows in each year, and the totals
+        # to leave out where their parts are there
+        presence = np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape) > 0
+        sex_codes, age_codes, ethnicity_codes = list(sexes.categories), list(ages.categories), list(ethnicities.categories)
+        present = {axis: presence.any(axis=tuple(a for a in range(1, 4) if a != axis)) for axis in range(1, 4)}
+        for axis, covered in (
+            (1, _covered_by_parts(present[1], sex_codes, SEX_PARTS)),
+            (2, _covered_by_bands(present[2], age_codes)),
+            (3, _covered_by_parts(present[3], ethnicity_codes, ETHNICITY_PARTS)),
+        ):
+            mask = np.expand_dims(covered, tuple(a for a in range(1, 4) if a != axis))
+            values = np.where(mask, 0.0, values)
+
+        # Age bands in age order, 'overall' and unknown codes last
+        order = sorted(
+            range(len(age_codes)),
+            key=lambda i: (age_codes[i] != 'overall' and age_bounds(age_codes[i])) or (np.inf, np.inf),
+        )
+        self.values = values[:, :, order, :]
+        self.sexes = np.array(sex_codes, dtype=object)
+        self.ages = np.array([age_codes[i] for i in order], dtype=object)
+        self.ethnicities = np.array(ethnicity_codes, dtype=object)
+
+        # Labels of each code on the dashboard's filters
+        self._labels = {
+            'Gender': self.sexes,
+            'Age_Group': np.array([AGE_GROUPS.get(age) for age in self.ages], dtype=object),
+            'Ethnicity': np.array([ETHNICITY_GROUPS[code] for code in self.ethnicities], dtype=object),
+            'Age': self.ages,
+        }
+        self._axes = {'Gender': 1, 'Age_Group': 2, 'Age': 2, 'Ethnicity': 3}
+        # Parts of the total codes of each axis, see _select
+        self._parts = {
+            1: _part_positions(self.sexes, SEX_PARTS),
+            2: _band_positions(self.ages),
+            3: _part_positions(self.ethnicities, ETHNICITY_PARTS),
+        }
+
+    def _select(self, selections, year_range, ignore=()):
+        """
+        Sub-array of the years in `year_range` and the codes whose labels
+        are selected, plus its years. Columns in `ignore` are not filtered.
+        A total code selected without any of its parts (e.g. 'both' alone)
+        stands for its parts, as it is only counted where they are missing.
+        """
+        years = np.ones(len(self.years), dtype=bool)
+        if year_range is not None:
+            years = (self.years >= year_range[0]) & (self.years <= year_range[1])
+        masks = [np.ones(n, dtype=bool) for n in self.values.shape[1:]]
+        for column, selected in selections.items():
+            if column in self._labels and column not in ignore:
+                masks[self._axes[column] - 1] &= np.isin(self._labels[column], list(selected))
+        for axis, mask in enumerate(masks, start=1):
+            for total, parts in self._parts[axis].items():
+                if mask[total] and parts and not mask[parts].any():
+                    mask[parts] = True
+        return self.years[years], self.values[np.ix_(years, *masks)], masks
+
+    def totals(self, by, selections, year_range=None):
+        """
+        Population per year and label of `by` ('Gender', 'Age_Group',
+        'Ethnicity' or 'Age'), over the selected cells.
+        """
+        years, values, masks = self._select(selections, year_range)
+        axis = self._axes[by]
+        labels = self._labels[by][masks[axis - 1]]
+        per_code = values.sum(axis=tuple(a for a in range(1, 4) if a != axis))
+
+        # Codes are summed into their labels with one matrix product
+        groups = [label for label in dict.fromkeys(labels) if label is not None]
+        if by == 'Age':
+            groups = list(labels)
+        one_hot = (labels[:, None] == np.array(groups, dtype=object)[None, :]).astype('float64')
+        totals = pd.DataFrame(per_code @ one_hot, index=pd.Index(years, name='Year'), columns=pd.Index(groups, name=by))
+        # Labels of totals that were only counted through their parts
+        return totals.loc[:, (totals != 0).any(axis=0)]
+
+    def shares(self, by, selections, year_range=None):
+        """
+        Share (%) of each label of `by` in the selected population, per year.
+        """
+        totals = self.totals(by, selections, year_range)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return totals.div(totals.sum(axis=1), axis=0) * 100
+
+    def growth(self, by, selections, year_range=None):
+        """
+        Year-over-year growth (%) of each label of `by`, annualized when
+        years are missing in between. The first year has none.
+        """
+        totals = self.totals(by, selections, year_range)
+        values = totals.to_numpy()
+        growth = np.full_like(values, np.nan)
+        if len(values) > 1:
+            spans = np.diff(totals.index.to_numpy()).astype('float64')[:, None]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratio = values[1:] / values[:-1]
+                growth[1:] = np.where(ratio > 0, (ratio ** (1 / spans) - 1) * 100, np.nan)
+        return pd.DataFrame(growth, index=totals.index, columns=totals.columns)
+
+    def dependency_ratios(self, selections, year_range=None):
+        """
+        Young (under 15), old-age (65 and over) and total dependants per 100
+        people aged 15-64, per year. The age group filter does not apply, as
+        the ratios need every age.
+        """
+        years, values, masks = self._select(selections, year_range, ignore=('Age_Group',))
+        by_age = values.sum(axis=(1, 3))
+        bounds = [age_bounds(age) for age in self.ages[masks[1]]]
+        young = np.array([b is not None and b[1] <= YOUNG_MAX_AGE for b in bounds])
+        old = np.array([b is not None and b[0] >= OLD_MIN_AGE for b in bounds])
+        working = np.array([b is not None and b[0] > YOUNG_MAX_AGE and b[1] < OLD_MIN_AGE for b in bounds])
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            base = by_age[:, working].sum(axis=1) / 100
+            young_ratio = by_age[:, young].sum(axis=1) / base
+            old_ratio = by_age[:, old].sum(axis=1) / base
+        return pd.DataFrame(
+            {'Young (0-14)': young_ratio, 'Old-age (65+)': old_ratio, 'Total': young_ratio + old_ratio},
+            index=pd.Index(years, name='Year'),
+        ).replace([np.inf, -np.inf], np.nan)
+
+    def pyramid(self, year, selections):
+        """
+        Age structure of one year: the share (%) of the selected population
+        in each age band, for males and females. The gender and age group
+        filters do not apply.
+        """
+        _, values, masks = self._select(selections, (year, year), ignore=('Gender', 'Age_Group'))
+        by_sex = values.sum(axis=3)[0] if len(values) else np.zeros(values.shape[1:3])
+        sexes = list(self.sexes[masks[0]])
+        ages = self.ages[masks[1]]
+        columns = {sex.capitalize(): by_sex[sexes.index(sex)] if sex in sexes else np.zeros(len(ages)) for sex in ('male', 'female')}
+        frame = pd.DataFrame(columns, index=pd.Index(ages, name='Age'))
+        # Only bands with people in them, without the totals left over
+        frame = frame[(frame.sum(axis=1) > 0) & np.array([age_bounds(age) is not None and age != 'overall' for age in ages])]
+        total = frame.to_numpy().sum()
+        return frame / total * 100 if total else frame
+
+    def nbytes(self):
+        return self.values.nbytes
+
+
+@functools.lru_cache(maxsize=4)
+def _analysed_row_count(version):
+    return len(analysed_rows(load_dataset('malaysia_population'))[2])
+
+
+@functools.lru_cache(maxsize=4)
+def _population_analytics(version, sample_rate):
+    with stage('population analytics'):
+        return PopulationAnalytics(load_dataset('malaysia_population'), sample_rate)
+
+
+def population_analytics(mode='auto'):
+    """
+    Function to get the PopulationAnalytics of the current release in one
+    of the MODES, built once per version and sample rate, so modes that
+    come down to the same rate (e.g. 'auto' and 'exact' below
+    EXACT_MAX_ROWS rows) share it.
+    """
+    version = dataset_version('malaysia_population')
+    return _population_analytics(version, sample_rate(_analysed_row_count(version), mode))
+
+
+def analysis(analytics, name, *args, selections, year_range=None):
+    """
+    Function to run one of the analyses of a PopulationAnalytics ('shares',
+    'growth', 'dependency_ratios', 'pyramid') with cached results, by
+    analysis, arguments, filter state, data version and mode.
+    """
+    key = (name, args, state_key(selections, year_range), dataset_version('malaysia_population'), analytics.sample_rate)
+    cached = _results.get(key)
+    count('analytics', cached is not None)
+    if cached is not None:
+        return cached['result']
+
+    method = getattr(analytics, name)
+    if name == 'pyramid':
+        result = method(*args, selections)
+    else:
+        result = method(*args, selections, year_range)
+    _results.put(key, {'result': result}, int(result.memory_usage(deep=True).sum()))
+    return result
+
+
+def _long(frame, column, value):
+    # (year x label) frame to the long rows the line charts take
+    return frame.reset_index().melt(id_vars='Year', var_name=column, value_name=value).dropna()
+
+
+def structure_charts(analytics, selections, year_range, by, pyramid_year):
+    """
+    Function to get the build functions of the population structure charts,
+    by name: shares and growth broken down `by` a filter column, dependency
+    ratios, and the age pyramid of `pyramid_year`. Each analysis is cached
+    per filter state.
+    """
+    label = BREAKDOWNS[by]
+
+    def shares_chart():
+        shares = analysis(analytics, 'shares', by, selections=selections, year_range=year_range)
+        return LineChart(
+            _long(shares, by, 'Share'), x='Year', y='Share', series=by, legend_title=label,
+            title=f"Share of the Population by {label}", xlabel="Year", ylabel="Share (%)",
+        )
+
+    def growth_chart():
+        growth = analysis(analytics, 'growth', by, selections=selections, year_range=year_range)
+        return LineChart(
+            _long(growth, by, 'Growth'), x='Year', y='Growth', series=by, legend_title=label,
+            title=f"Year-over-Year Growth by {label}", xlabel="Year", ylabel="Growth (%)",
+        )
+
+    def dependency_chart():
+        ratios = analysis(analytics, 'dependency_ratios', selections=selections, year_range=year_range)
+        return LineChart(
+            _long(ratios, 'Ratio', 'Dependants'), x='Year', y='Dependants', series='Ratio',
+            title="Dependency Ratios", xlabel="Year", ylabel="Dependants per 100 aged 15-64",
+        )
+
+    def pyramid_chart():
+        pyramid = analysis(analytics, 'pyramid', pyramid_year, selections=selections)
+        # Males to the left of the axis, females to the right
+        data = pyramid.assign(Male=-pyramid['Male']).reset_index().melt(
+            id_vars='Age', var_name='Gender', value_name='Share',
+        )
+        return BarChart(
+            data, x='Share', y='Age', hue='Gender', order=list(pyramid.index[::-1]), hue_order=['Male', 'Female'],
+            title=f"Age Pyramid, {pyramid_year}", xlabel="Share of the population (%, males left)", ylabel="Age",
+            horizontal=True, dodge=False,
+        )
+
+    return {
+        'population_shares': shares_chart,
+        'population_growth': growth_chart,
+        'dependency_ratios': dependency_chart,
+        'age_pyramid': pyramid_chart,
+    }
@@ -0,0 +1,68 @@
+from filter_engine import FilterIndex
+from ingestion import concat_frames
+
+
+class RollupCube:
+    """
+    Materialized rollup of a measure over (year, *dimensions), holding the
+    sum and the row count of every group.
+
+    Charts are answered by slicing the cube with the same selections as the
+    row-level filters and re-summing it, so their cost depends on the number
+    of groups instead of the number of rows. Means are recovered as
+    sum / count, which keeps them equal to the row-level means.
+    """
+
+    def __init__(self, df, dimensions, year_column, measure):
+        self.dimensions = list(dimensions)
+        self.year_column = year_column
+        self.data = self.aggregate(df, dimensions, year_column, measure)
+        self._index = FilterIndex(self.data, self.dimensions, year_column)
+
+    @staticmethod
+    def aggregate(df, dimensions, year_column, measure):
+        """
+        Cells (sum and count of the measure per year and dimensions) of a
+        dataframe, or of one partition of it.
+        """
+        return (
+            df.groupby([year_column] + list(dimensions), observed=True)[measure]
+            .agg(['sum', 'count'])
+            .reset_index()
+        )
+
+    @classmethod
+    def from_cells(cls, parts, dimensions, year_column):
+        """
+        Cube of a dataset from the cells of its partitions, so a new release
+        only has to aggregate the partitions that changed. Cells of the same
+        group in different partitions are added up.
+        """
+        cube = cls.__new__(cls)
+        cube.dimensions = list(dimensions)
+        cube.year_column = year_column
+        keys = [year_column] + cube.dimensions
+        cube.data = (
+            concat_frames(parts)
+            .groupby(keys, observed=True)[['sum', 'count']].sum()
+            .reset_index()
+        )
+        cube._index = FilterIndex(cube.data, cube.dimensions, year_column)
+        return cube
+
+    def select(self, selections, year_range=None):
+        """
+        Cells of the cube matching `selections` (column -> values) and the
+        inclusive `year_range`.
+        """
+        return self._index.filter(self.data, selections, year_range)
+
+    def rollup(self, by, selections, year_range=None):
+        """
+        Sum, count and mean of the measure grouped by the `by` columns, over
+        the cells matching the selections.
+        """
+        cells = self.select(selections, year_range)
+        result = cells.groupby(by, observed=True)[['sum', 'count']].sum().reset_index()
+        result['mean'] = result['sum'] / result['count']
+        return result
@@ -0,0 +1,285 @@
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOG_PATH = os.path.join(ROOT_DIR, '.cache', 'profiler', 'runs.jsonl')
+
+# Instrumentation is opt-in: with APP_DIAGNOSTICS unset, stage() and
+# count() do nothing
+ENABLED = bool(os.environ.get('APP_DIAGNOSTICS'))
+
+# The log is rotated (to runs.jsonl.1) once it reaches this size
+LOG_LIMIT_BYTES = 10 * 1024 * 1024
+
+# Runs read back from the log for the percentile summaries
+SUMMARY_RUNS = 2000
+
+PERCENTILES = [50, 90, 99]
+
+if ENABLED and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+_log_lock = threading.Lock()
+_records_lock = threading.Lock()
+
+# Records a worker thread reports to, see recording()
+_local = threading.local()
+
+
+def _records():
+    """
+    Records of the current rerun: stored in the session when called from a
+    script run, the ones handed to recording() in a worker thread, or None
+    from other background threads.
+    """
+    records = getattr(_local, 'records', None)
+    if records is not None:
+        return records
+
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None:
+        return None
+    state = ctx.session_state
+    records = state['_profiler_records'] if '_profiler_records' in state else None
+    # Every run, full or fragment, starts with a new set of widget ids:
+    # records of an earlier run that was never reported are dropped
+    if records is None or records['run'] is not ctx.widget_ids_this_run:
+        records = state['_profiler_records'] = {'stages': [], 'cache': {}, 'run': ctx.widget_ids_this_run}
+    return records
+
+
+def current_records():
+    """
+    Function to get the records of the current rerun, to hand to the
+    threads that do part of its work (see recording()). None when the
+    profiler is off or outside a rerun.
+    """
+    return _records() if ENABLED else None
+
+
+@contextlib.contextmanager
+def recording(records):
+    """
+    Context manager sending the stages and cache counts of this thread to
+    `records` (see current_records()), e.g. in a pool thread computing a
+    chart of a rerun, which has no script run of its own.
+    """
+    previous = getattr(_local, 'records', None)
+    _local.records = records
+    try:
+        yield
+    finally:
+        _local.records = previous
+
+
+@contextlib.contextmanager
+def stage(name):
+    """
+    Context manager timing a named stage of a rerun, with the change in
+    traced Python memory over the stage.
+    """
+    if not ENABLED:
+        yield
+        return
+
+    memory_before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record = {
+            'stage': name,
+            'ms': (time.perf_counter() - start) * 1000,
+            'memory_delta': tracemalloc.get_traced_memory()[0] - memory_before,
+        }
+        records = _records()
+        if records is not None:
+            with _records_lock:
+                records['stages'].append(record)
+
+
+def timed(name):
+    """
+    Decorator timing every call of a function as a stage (see stage()).
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(cache, hit):
+    """
+    Function to count a hit (or miss) of a named cache in the current rerun.
+    """
+    if not ENABLED:
+        return
+    records = _records()
+    if records is not None:
+        with _records_lock:
+            records['cache'].setdefault(cache, [0, 0])[0 if hit else 1] += 1
+
+
+def profiled_fragment(page):
+    """
+    Decorator for the st.fragment functions of `page`: a rerun of the
+    fragment alone is logged as a run of its own, as profiler_panel() at
+    the end of the page is not reached. Put it under @st.fragment.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _log_fragment_run(page, function.__name__)
+        return wrapper
+    return decorator
+
+
+def _log_fragment_run(page, fragment):
+    if not ENABLED:
+        return
+
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx(suppress_warning=True)
+    # In a full run, the fragment's records are part of the page's
+    if ctx is None or not ctx.fragment_ids_this_run:
+        return
+    records = _records()
+    del ctx.session_state['_profiler_records']
+    _append_log({
+        'time': time.time(),
+        'page': page,
+        'fragment': fragment,
+        'stages': records['stages'],
+        'cache': records['cache'],
+    })
+
+
+def _append_log(run):
+    os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
+    with _log_lock:
+        if os.path.exists(LOG_PATH) and os.path.getsize(LOG_PATH) > LOG_LIMIT_BYTES:
+            os.replace(LOG_PATH, LOG_PATH + '.1')
+        with open(LOG_PATH, 'a') as f:
+            f.write(json.dumps(run) + '\n')
+
+
+def read_log(limit=SUMMARY_RUNS):
+    """
+    Function to read the most recent runs from the JSONL log.
+    """
+    try:
+        with open(LOG_PATH) as f:
+            lines = f.readlines()[-limit:]
+    except OSError:
+        return []
+    runs = []
+    for line in lines:
+        try:
+            runs.append(json.loads(line))
+        except ValueError:
+            # A line cut short by a crash
+            continue
+    return runs
+
+
+def summarize(runs):
+    """
+    Function to get the percentiles (PERCENTILES) of each stage's time and
+    memory delta across runs, and the hit rate of each cache.
+
+    Returns (stages, caches): dicts keyed by stage and cache name.
+    """
+    import numpy as np
+
+    times, memory = defaultdict(list), defaultdict(list)
+    hits = defaultdict(lambda: [0, 0])
+    for run in runs:
+        key_prefix = f"{run.get('page', '')}: " if run.get('page') else ''
+        if run.get('fragment'):
+            key_prefix = f"{run.get('page', '')} / {run['fragment']}: "
+        for record in run['stages']:
+            times[key_prefix + record['stage']].append(record['ms'])
+            memory[key_prefix + record['stage']].append(record['memory_delta'])
+        for cache, (hit, miss) in run.get('cache', {}).items():
+            hits[cache][0] += hit
+            hits[cache][1] += miss
+
+    stages = {}
+    for name, values in times.items():
+        stages[name] = {
+            'runs': len(values),
+            **{f'p{p}_ms': float(np.percentile(values, p)) for p in PERCENTILES},
+            **{f'p{p}_memory': float(np.percentile(memory[name], p)) for p in PERCENTILES},
+        }
+    caches = {
+        name: {'hits': hit, 'misses': miss, 'hit_rate': hit / (hit + miss) if hit + miss else None}
+        for name, (hit, miss) in hits.items()
+    }
+    return stages, caches
+
+
+def profiler_panel(page):
+    """
+    Function to close the profile of the current rerun of `page`: append it
+    to the JSONL log and show it, with percentiles across all logged
+    sessions, in a collapsible sidebar panel. Call it at the end of a page.
+    """
+    if not ENABLED:
+        return
+
+    import pandas as pd
+    import streamlit as st
+
+    records = _records()
+    if records is None:
+        return
+    del st.session_state['_profiler_records']
+    run = {
+        'time': time.time(),
+        'page': page,
+        'stages': records['stages'],
+        'cache': records['cache'],
+    }
+    _append_log(run)
+
+    with st.sidebar.expander("Rerun Profile"):
+        if run['stages']:
+            st.write("This rerun:")
+            st.dataframe(pd.DataFrame(run['stages']).set_index('stage').round(1), use_container_width=True)
+        if run['cache']:
+            st.dataframe(
+                pd.DataFrame(run['cache'], index=['hits', 'misses']).T, use_container_width=True
+            )
+
+        stages, caches = summarize(read_log())
+        if stages:
+            st.write("Across sessions:")
+            st.dataframe(pd.DataFrame(stages).T.round(1), use_container_width=True)
+        if caches:
+            st.dataframe(pd.DataFrame(caches).T, use_container_width=True)
+
+
+if __name__ == '__main__':
+    # Print the percentile summary of the log: python app/profiler.py
+    stages, caches = summarize(read_log())
+    for name, summary in sorted(stages.items()):
+        print(f"{name}: {summary['runs']} runs, " + ', '.join(
+            f"p{p} {summary[f'p{p}_ms']:.1f} ms" for p in PERCENTILES
+        ))
+    for name, summary in sorted(caches.items()):
+        print(f"cache {name}: {summary['hits']} hits, {summary['misses']} misses")
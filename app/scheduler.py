@@ -0,0 +1,169 @@
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import types
+from concurrent.futures.process import BrokenProcessPool
+
+import streamlit as st
+
+from figures import cached_chart, chart_output, display_chart, import_renderer, render_chart, render_image, store_chart
+from profiler import current_records, recording, stage
+
+logger = logging.getLogger(__name__)
+
+# Threads computing the data of a page's charts and other independent parts
+THREADS = int(os.environ.get('PAGE_THREADS', 4))
+
+# Processes rendering matplotlib charts side by side, one per core by
+# default. With 0 (the default on single-core hosts) charts are rendered in
+# the threads instead, one at a time: about 0.2s per chart, so a filter
+# change that redraws the Malaysian page's nine charts takes a couple of
+# seconds there. CHART_RENDERER=vega-lite leaves the drawing to the browser.
+PROCESSES = int(os.environ.get('CHART_PROCESSES', min(4, os.cpu_count() or 1) if (os.cpu_count() or 1) > 1 else 0))
+
+_lock = threading.Lock()
+_threads = None
+_processes = None
+
+
+def _thread_pool():
+    global _threads
+    with _lock:
+        if _threads is None:
+            _threads = concurrent.futures.ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix='page-tasks')
+        return _threads
+
+
+def _launch(pool):
+    """
+    Start every chart process of a new pool at once. Streamlit runs each
+    page as the __main__ module, and spawned processes import __main__
+    again on start, so the page is hidden while they are started ('fork'
+    would not import it, but would copy the server's threads and locks).
+    This is the one place the app touches __main__, and it is safe because:
+
+     - it happens once per server process, for as long as it takes to
+       start PROCESSES processes, with _lock held by _process_pool() so no
+       two launches overlap. The pool only starts processes while it has
+       fewer than PROCESSES, so later submits never spawn, and a broken
+       pool is not restarted;
+     - nothing reads a page through __main__ meanwhile: charts are sent to
+       the workers as figures.py objects, and st.cache_data keys functions
+       by their source, not by sys.modules;
+     - a page installed by another script run in the meantime is kept.
+    """
+    page = sys.modules.get('__main__')
+    placeholder = sys.modules['__main__'] = types.ModuleType('__main__')
+    try:
+        # One process per task that finds none idle, i.e. all of them
+        return [pool.submit(import_renderer) for _ in range(PROCESSES)]
+    finally:
+        if sys.modules.get('__main__') is placeholder:
+            sys.modules['__main__'] = page
+
+
+def _process_pool():
+    """
+    The shared chart processes, or None when charts are rendered in threads.
+    Started with 'spawn', so the workers do not inherit the server's threads
+    and locks, all together when the pool is created.
+    """
+    global _processes
+    with _lock:
+        if _processes is None:
+            _processes = False
+            if PROCESSES > 0:
+                try:
+                    pool = concurrent.futures.ProcessPoolExecutor(
+                        max_workers=PROCESSES, mp_context=multiprocessing.get_context('spawn'),
+                    )
+                    _launch(pool)
+                    _processes = pool
+                except (OSError, ValueError) as e:
+                    logger.warning("Could not start chart processes (%s), rendering in threads", e)
+        return _processes or None
+
+
+def start_workers():
+    """
+    Function to start the chart processes ahead of the first chart. Each
+    one imports the renderer as soon as it is up.
+    """
+    _process_pool()
+
+
+def _render(chart, output):
+    global _processes
+    pool = _process_pool() if output != 'vega-lite' else None
+    if pool is not None:
+        try:
+            return pool.submit(render_image, chart, output).result()
+        except BrokenProcessPool as e:
+            logger.warning("Chart processes failed (%s), rendering in threads", e)
+            with _lock:
+                _processes = False
+    return render_chart(chart, output)
+
+
+class PageTasks:
+    """
+    Independent parts of a page (typically charts) computed in the
+    background while the script goes on. Each part gets a placeholder where
+    it is added, and run() fills the placeholders in as the parts finish.
+    """
+
+    def __init__(self):
+        self._pending = {}
+
+    def add(self, compute, show, message="Loading..."):
+        """
+        Compute `compute()` in the thread pool, then call
+        `show(placeholder, result)` in the script thread.
+        """
+        placeholder = st.empty()
+        placeholder.caption(message)
+        # Stages and cache counts of the task belong to this rerun
+        records = current_records()
+
+        def task():
+            with recording(records):
+                return compute()
+
+        self._pending[_thread_pool().submit(task)] = (placeholder, show)
+
+    def chart(self, name, state, data_version, build):
+        """
+        Display a chart through the chart cache (see figures.get_chart): a
+        cached chart is displayed right away, a missing one is built in the
+        thread pool and rendered in the process pool.
+        """
+        rendered = cached_chart(name, state, data_version)
+        if rendered is not None:
+            display_chart(st, rendered)
+            return
+
+        def compute():
+            with stage(f'render {name}'):
+                rendered = _render(build(), chart_output())
+            store_chart(name, state, data_version, rendered)
+            return rendered
+
+        self.add(compute, display_chart, "Rendering the chart...")
+
+    def run(self):
+        """
+        Wait for the pending parts, filling in each placeholder as soon as
+        its part is done, in whatever order they finish. A part that fails
+        shows its error in its placeholder, without holding up the others.
+        """
+        with stage('page tasks'):
+            for future in concurrent.futures.as_completed(self._pending):
+                placeholder, show = self._pending[future]
+                try:
+                    show(placeholder, future.result())
+                except Exception as e:
+                    placeholder.exception(e)
+        self._pending = {}
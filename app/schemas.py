@@ -0,0 +1,135 @@
+import hashlib
+import json
+import logging
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+# Arrow-backed strings: one contiguous buffer per column instead of a Python
+# object per value, and zero-copy views of a memory-mapped snapshot
+STRING_DTYPE = pd.StringDtype('pyarrow')
+
+# Read-time dtypes of the datasets in datasets.SOURCES, by column:
+#  - 'category' for text with few distinct values (codes, countries, states)
+#  - 'string' for mostly distinct text, such as names
+#  - the smallest integer type that holds the values (checked on load)
+#  - float32 where 7 significant digits are plenty (map coordinates);
+#    measures that are summed, forecast or exported keep float64
+#  - 'datetime64[s]' for dates, the coarsest resolution pandas has
+# Columns not listed here are kept as parsed.
+SCHEMAS = {
+    'gapminder': {
+        'country': 'category',
+        'continent': 'category',
+        'year': 'int16',
+        'pop': 'float64',
+        'lifeExp': 'float64',
+        'gdpPercap': 'float64',
+    },
+    'us_airports': {
+        'iata': 'string',
+        'airport': 'string',
+        'city': 'string',
+        'state': 'category',
+        'country': 'category',
+        'lat': 'float32',
+        'long': 'float32',
+        'cnt': 'int32',
+    },
+    'malaysia_population': {
+        'date': 'datetime64[s]',
+        'sex': 'category',
+        'age': 'category',
+        'ethnicity': 'category',
+        'population': 'float64',
+    },
+}
+
+
+def schema_version(name):
+    """
+    Function to get a fingerprint of a dataset's schema, so snapshots written
+    with other dtypes are not reused.
+    """
+    return hashlib.sha256(json.dumps(SCHEMAS.get(name, {}), sort_keys=True).encode()).hexdigest()[:8]
+
+
+def frame_bytes(df):
+    """
+    Function to get the memory held by a dataframe, including the Python
+    strings of object columns.
+    """
+    return int(df.memory_usage(deep=True).sum()) if df is not None else 0
+
+
+def _convert(values, dtype):
+    if dtype == 'string':
+        return values.astype(STRING_DTYPE)
+    if dtype.startswith('datetime64'):
+        return pd.to_datetime(values, errors='coerce').astype(dtype)
+    if dtype == 'category':
+        return values.astype('category')
+
+    target = np.dtype(dtype)
+    if target.kind in 'iu':
+        # Narrowing must not wrap around, and NaN has no integer value
+        info = np.iinfo(target)
+        if values.isna().any() or values.min() < info.min or values.max() > info.max:
+            raise ValueError(f"values do not fit in {dtype}")
+    return values.astype(target)
+
+
+def apply_schema(name, df):
+    """
+    Function to convert a freshly parsed dataset to the dtypes declared in
+    SCHEMAS. A column that does not fit its declared dtype (e.g. a mirror
+    with larger values) is kept as parsed.
+
+    Returns the converted frame and its footprint in bytes, before and after.
+    """
+    before = frame_bytes(df)
+    columns = {}
+    for column, dtype in SCHEMAS.get(name, {}).items():
+        if column not in df or str(df[column].dtype) == dtype:
+            continue
+        try:
+            columns[column] = _convert(df[column], dtype)
+        except (TypeError, ValueError) as e:
+            logger.warning("Keeping '%s.%s' as %s (%s)", name, column, df[column].dtype, e)
+    df = df.assign(**columns)
+    return df, {'before_bytes': before, 'after_bytes': frame_bytes(df)}
+
+
+def _pandas_type(arrow_type):
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return STRING_DTYPE
+    return None
+
+
+def table_to_frame(table):
+    """
+    Function to convert an Arrow snapshot back to a dataframe with its
+    declared dtypes. Categoricals and numeric types round-trip on their own;
+    string columns would come back as Python objects without the mapper.
+    """
+    return table.to_pandas(types_mapper=_pandas_type)
+
+
+if __name__ == '__main__':
+    from datasets import SOURCES, load_dataset, memory_usage
+
+    # Footprint of each dataset as parsed and with its declared dtypes
+    for name in SOURCES:
+        load_dataset(name)
+    for name, usage in memory_usage().items():
+        footprint = usage['footprint']
+        if footprint:
+            print(
+                f"{name:<22}{footprint['before_bytes'] / 1024:>10.0f} KB ->{footprint['after_bytes'] / 1024:>8.0f} KB"
+                f"  ({1 - footprint['after_bytes'] / max(footprint['before_bytes'], 1):.0%} smaller)"
+            )
+        else:
+            print(f"{name:<22}no footprint recorded for this snapshot")
@@ -0,0 +1,191 @@
+import hashlib
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from ingestion import concat_frames
+from lru import SizedLRU
+from profiler import count, stage
+
+# Budgets for a parsed upload. Reading stops at whichever is hit first and
+# the result is marked as truncated.
+UPLOAD_MAX_ROWS = int(os.environ.get('UPLOAD_MAX_ROWS', 1_000_000))
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', 200 * 1024 * 1024))
+
+# Rows read at a time, and rows read up front to infer the column dtypes
+CHUNK_ROWS = 100_000
+SAMPLE_ROWS = 10_000
+
+# A text column becomes categorical when its sample has at most this share
+# of distinct values
+CATEGORY_RATIO = 0.5
+
+# Rows sampled for the preview of an upload
+PREVIEW_ROWS = 100
+
+# Distinct values are counted exactly up to this many per column
+DISTINCT_LIMIT = 10_000
+
+# Upper bound for the parsed uploads kept in memory by this process. The
+# latest upload is always kept, so the cache never holds more than this or
+# one upload, whichever is larger.
+UPLOAD_CACHE_BYTES = int(os.environ.get('UPLOAD_CACHE_BYTES', 64 * 1024 * 1024))
+
+# Parsed uploads by content hash, shared by all sessions
+_upload_cache = SizedLRU(UPLOAD_CACHE_BYTES)
+
+
+def infer_dtypes(sample):
+    """
+    Function to choose read dtypes from a sample of a CSV: text columns with
+    few distinct values are read as categoricals. Numeric columns are left
+    to the parser and downcast per chunk. Columns without a value in the
+    sample (e.g. a file with only a header) are left as parsed.
+    """
+    dtypes = {}
+    for column in sample.columns:
+        values = sample[column]
+        if values.dtype == object and 0 < values.nunique() <= max(1, CATEGORY_RATIO * values.count()):
+            dtypes[column] = 'category'
+    return dtypes
+
+
+def downcast(df):
+    """
+    Function to store the numeric columns of a chunk in the smallest dtype
+    that holds their values. A float column is only narrowed when every
+    value survives the round trip, so 0.1 stays 0.1 (see schemas.SCHEMAS).
+    """
+    for column in df.columns:
+        values = df[column]
+        kind = values.dtype.kind
+        if kind in 'iu':
+            df[column] = pd.to_numeric(values, downcast='integer' if kind == 'i' else 'unsigned')
+        elif kind == 'f':
+            narrow = pd.to_numeric(values, downcast='float')
+            if narrow.dtype != values.dtype and ((narrow.astype(values.dtype) == values) | values.isna()).all():
+                df[column] = narrow
+    return df
+
+
+class ColumnProfile:
+    """
+    Per-column profile (non-null count, nulls, min, max, distinct values)
+    accumulated one chunk at a time, so profiling needs no second pass over
+    the data.
+    """
+
+    def __init__(self):
+        self.columns = {}
+
+    def update(self, chunk):
+        for column in chunk.columns:
+            values = chunk[column]
+            stats = self.columns.setdefault(
+                column, {'count': 0, 'nulls': 0, 'min': None, 'max': None, 'distinct': set(), 'capped': False}
+            )
+            present = values.dropna()
+            stats['count'] += len(present)
+            stats['nulls'] += len(values) - len(present)
+            stats['dtype'] = values.dtype
+
+            if len(present) and values.dtype.kind in 'iufmM':
+                low, high = present.min(), present.max()
+                stats['min'] = low if stats['min'] is None else min(stats['min'], low)
+                stats['max'] = high if stats['max'] is None else max(stats['max'], high)
+
+            if not stats['capped']:
+                stats['distinct'].update(present.unique())
+                if len(stats['distinct']) > DISTINCT_LIMIT:
+                    stats['distinct'] = set()
+                    stats['capped'] = True
+
+    def result(self):
+        """
+        The profile as a dataframe with one row per column.
+        """
+        return pd.DataFrame([
+            {
+                'column': column,
+                'dtype': str(stats['dtype']),
+                'count': stats['count'],
+                'nulls': stats['nulls'],
+                # As text, since columns of different types share these
+                'min': None if stats['min'] is None else str(stats['min']),
+                'max': None if stats['max'] is None else str(stats['max']),
+                'distinct': f'>{DISTINCT_LIMIT}' if stats['capped'] else str(len(stats['distinct'])),
+            }
+            for column, stats in self.columns.items()
+        ])
+
+
+def parse_upload(data, max_rows=UPLOAD_MAX_ROWS, max_bytes=UPLOAD_MAX_BYTES):
+    """
+    Function to parse an uploaded CSV (bytes) in chunks within the row and
+    memory budgets, with dtypes inferred from a sample and downcast.
+
+    Returns a dict with the dataframe, its column profile, the number of
+    rows read and why reading stopped early ('rows', 'memory' or None).
+    load_upload() adds the cache key as its 'version'.
+    """
+    sample = pd.read_csv(io.BytesIO(data), nrows=SAMPLE_ROWS)
+    dtypes = infer_dtypes(sample)
+
+    chunks, profile = [], ColumnProfile()
+    rows, size, truncated = 0, 0, None
+    for chunk in pd.read_csv(io.BytesIO(data), chunksize=CHUNK_ROWS, dtype=dtypes):
+        if rows + len(chunk) > max_rows:
+            chunk = chunk.iloc[:max_rows - rows]
+            truncated = 'rows'
+        chunk = downcast(chunk)
+        chunk_size = int(chunk.memory_usage(deep=True).sum())
+        if size + chunk_size > max_bytes:
+            truncated = 'memory'
+        # Keep the share of the chunk that still fits. A part of a chunk
+        # costs a little more per row (its index and categories stay), so
+        # the share may need to be cut again.
+        while len(chunk) and size + chunk_size > max_bytes:
+            keep = min(len(chunk) - 1, int(len(chunk) * (max_bytes - size) / chunk_size))
+            chunk = chunk.iloc[:max(keep, 0)]
+            chunk_size = int(chunk.memory_usage(deep=True).sum())
+
+        chunks.append(chunk)
+        profile.update(chunk)
+        rows += len(chunk)
+        size += chunk_size
+        if truncated:
+            break
+
+    df = concat_frames(chunks) if chunks else sample.iloc[:0]
+    return {'frame': df, 'profile': profile.result(), 'rows': rows, 'bytes': size, 'truncated': truncated}
+
+
+def load_upload(uploaded_file, max_rows=UPLOAD_MAX_ROWS, max_bytes=UPLOAD_MAX_BYTES):
+    """
+    Function to get the parsed result of an uploaded file, cached by the
+    hash of its content (and the budgets), so reruns and other sessions
+    uploading the same file do not parse it again.
+    """
+    data = uploaded_file.getvalue()
+    key = (hashlib.sha256(data).hexdigest(), max_rows, max_bytes)
+    cached = _upload_cache.get(key)
+    count('uploads', cached is not None)
+    if cached is None:
+        with stage('parse upload'):
+            cached = parse_upload(data, max_rows, max_bytes)
+        cached['version'] = key
+        _upload_cache.put(key, cached, cached['bytes'])
+    return cached
+
+
+def sample_rows(df, n, seed=0):
+    """
+    Function to get a reproducible random sample of `n` rows, in their
+    original order.
+    """
+    if len(df) <= n:
+        return df
+    positions = np.sort(np.random.default_rng(seed).choice(len(df), n, replace=False))
+    return df.take(positions)
@@ -0,0 +1,181 @@
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+
+import streamlit as st
+
+from profiler import ENABLED as DIAGNOSTICS
+
+logger = logging.getLogger(__name__)
+
+# Set APP_WARMUP=0 to skip the warm-up, e.g. to measure a cold first visit
+ENABLED = os.environ.get('APP_WARMUP', '1') != '0'
+
+# Threads of the warm-up pool. Downloads, parsing and rendering mostly
+# release the GIL, so the datasets are prepared side by side.
+WORKERS = int(os.environ.get('WARMUP_WORKERS', 4))
+
+# Set WARMUP_CHART_WORKERS=1 to also start the chart processes (see
+# scheduler.py) during the warm-up. Off by default: they take a few
+# hundred MB and seconds of CPU to import matplotlib, and are otherwise
+# started with the first chart that is not cached.
+CHART_WORKERS = os.environ.get('WARMUP_CHART_WORKERS', '0') == '1'
+
+
+def _warm_assets():
+    from assets import asset_data_uri
+
+    # Loads every optimized image, and encodes the sidebar background
+    asset_data_uri('sidebar_background')
+
+
+def _warm_gapminder():
+    from datasets import dataset_version, load_dataset
+    from gapminder import gapminder_store
+    from paged_table import table_index
+
+    table_index('gapminder', dataset_version('gapminder'), load_dataset('gapminder'))
+    gapminder_store()
+
+
+def _warm_airports():
+    from airports import airport_geo, load_airports, map_layers
+    from datasets import dataset_version
+    from paged_table import table_index
+
+    table_index('us_airports', dataset_version('us_airports'), load_airports())
+
+    # Layers of the page's default maps: the whole country, and the state
+    # the selectbox starts on
+    states = airport_geo().states()
+    if states:
+        map_layers(None)
+        map_layers(states[0])
+
+
+def _warm_malaysia():
+    from datasets import dataset_version, load_table
+    from figures import get_chart, state_key
+    from malaysia import (
+        default_filters, load_population, population_charts, population_cube, population_filter_index,
+        population_version,
+    )
+    from paged_table import table_index
+
+    table_index('malaysia_raw', dataset_version('malaysia_population'), load_table('malaysia_population'))
+    data_version = population_version()
+    table_index('malaysia_filtered', data_version, load_population())
+    filter_index = population_filter_index()
+    if filter_index.year_bounds is None:
+        return
+
+    # Same keys the page computes for its default filters
+    selections, year_filter = default_filters(filter_index)
+    filter_state = state_key(selections, year_filter)
+    filter_index.positions(selections, year_filter)
+    for name, build in population_charts(population_cube(), filter_index, selections, year_filter).items():
+        get_chart(name, filter_state, data_version, build)
+
+
+def _warm_chart_workers():
+    from scheduler import start_workers
+
+    start_workers()
+
+
+# Warm-up tasks, by name: (description shown while waiting, function)
+TASKS = {
+    'assets': ("page images", _warm_assets),
+    'gapminder': ("gapminder data", _warm_gapminder),
+    'us_airports': ("airport data", _warm_airports),
+    'malaysia_population': ("Malaysian population data", _warm_malaysia),
+}
+if CHART_WORKERS:
+    TASKS['chart_workers'] = ("chart renderers", _warm_chart_workers)
+
+_lock = threading.Lock()
+_tasks = {}
+
+
+def _run(name, warm):
+    task = _tasks[name]
+    task['state'] = 'running'
+    start = time.perf_counter()
+    try:
+        warm()
+        task['state'] = 'ready'
+    except Exception as e:
+        # The page loads the data itself, and reports the error if it persists
+        task['state'] = 'failed'
+        task['error'] = f"{type(e).__name__}: {e}"
+        logger.warning("Warm-up of '%s' failed (%s), it will be loaded on demand", name, task['error'])
+    finally:
+        task['seconds'] = time.perf_counter() - start
+
+
+def start():
+    """
+    Function to start the warm-up once per process: every dataset in TASKS
+    is fetched, prepared and indexed in a background thread pool, and the
+    charts of the default selections are pre-rendered into the shared
+    caches. Returns immediately.
+    """
+    if not ENABLED:
+        return
+    with _lock:
+        if _tasks:
+            return
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='warmup')
+        for name, (label, warm) in TASKS.items():
+            _tasks[name] = {'label': label, 'state': 'pending', 'seconds': None, 'error': None}
+            _tasks[name]['future'] = executor.submit(_run, name, warm)
+        # The queued tasks still run; the threads exit once they are done
+        executor.shutdown(wait=False)
+
+
+def status():
+    """
+    Function to get the readiness of each warm-up task: its state
+    ('pending', 'running', 'ready' or 'failed'), duration and error.
+    Empty if the warm-up has not started or is disabled.
+    """
+    return {
+        name: {key: value for key, value in task.items() if key != 'future'}
+        for name, task in _tasks.items()
+    }
+
+
+def wait_for(name):
+    """
+    Function for a page to wait for the warm-up of its data before using
+    it, behind a spinner, instead of repeating work that is in progress.
+    Returns at once when the task is done, failed or not warmed up at all;
+    the page then loads whatever is missing itself.
+    """
+    start()
+    task = _tasks.get(name)
+    if task is None or task['future'].done():
+        return
+    with st.spinner(f"Warming up the {task['label']}, the page will be ready in a moment..."):
+        concurrent.futures.wait([task['future']])
+
+
+def warmup_panel():
+    """
+    Function to show the warm-up progress in the sidebar while it is still
+    running, and its timings when APP_DIAGNOSTICS is set.
+    """
+    tasks = status()
+    if not tasks:
+        return
+    if DIAGNOSTICS:
+        with st.sidebar.expander("Warm-up"):
+            for task in tasks.values():
+                seconds = f" in {task['seconds']:.1f}s" if task['seconds'] is not None else ""
+                error = f" ({task['error']})" if task['error'] else ""
+                st.markdown(f"- **{task['label']}:** {task['state']}{seconds}{error}")
+    elif any(task['state'] in ('pending', 'running') for task in tasks.values()):
+        waiting = [task['label'] for task in tasks.values() if task['state'] in ('pending', 'running')]
+        st.sidebar.caption(f"Warming up: {', '.join(waiting)}...")
@@ -0,0 +1,99 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+
+# File name of each fixture, by source name in datasets.SOURCES
+FIXTURES = {
+    'gapminder': 'gapminder.csv',
+    'us_airports': 'airports.csv',
+    'malaysia_population': 'population_malaysia.parquet',
+}
+
+# Rows of each dataset at scale 1x, about the size of the real files
+GAPMINDER_COUNTRIES = 142
+AIRPORTS = 3500
+DOSM_DATES = 55
+
+CONTINENTS = ['Asia', 'Europe', 'Africa', 'Americas', 'Oceania']
+
+
+def gapminder(scale, rng):
+    """
+    Function to make a gapminder-shaped table: one row per (country, year)
+    for 1952-2007 every 5 years, with `scale` times the countries.
+    """
+    countries = GAPMINDER_COUNTRIES * scale
+    years = np.arange(1952, 2008, 5)
+    country = np.repeat([f'Country {i}' for i in range(countries)], len(years))
+    continent = np.repeat(rng.choice(CONTINENTS, countries), len(years))
+    return pd.DataFrame({
+        'country': country,
+        'year': np.tile(years, countries),
+        'pop': rng.uniform(1e5, 1e9, len(country)).round(),
+        'continent': continent,
+        'lifeExp': rng.uniform(30, 85, len(country)),
+        'gdpPercap': rng.lognormal(8, 1.2, len(country)),
+    })
+
+
+def airports(scale, rng):
+    """
+    Function to make an airport-traffic-shaped table with `scale` times the
+    airports, spread over the mainland US.
+    """
+    from airports import STATE_NAMES
+
+    n = AIRPORTS * scale
+    return pd.DataFrame({
+        'iata': [f'A{i}' for i in range(n)],
+        'airport': [f'Airport {i}' for i in range(n)],
+        'city': [f'City {i % 5000}' for i in range(n)],
+        'state': rng.choice(list(STATE_NAMES), n),
+        'country': 'USA',
+        'lat': rng.uniform(25, 49, n),
+        'long': rng.uniform(-124, -67, n),
+        'cnt': rng.lognormal(8, 2, n).round().astype(int),
+    })
+
+
+def dosm_population(scale, rng):
+    """
+    Function to make a DOSM-population-shaped table: every (sex, age,
+    ethnicity) code for `scale` times as many dates, with some unknown codes
+    and invalid dates mixed in like the real file.
+    """
+    from malaysia import AGE_GROUPS, ETHNICITY_GROUPS
+
+    step = max(1, 365 // scale)
+    dates = pd.date_range('1970-01-01', periods=DOSM_DATES * scale, freq=f'{step}D')
+    ages = list(AGE_GROUPS) + ['0-4', '5-9', '10-14']
+    index = pd.MultiIndex.from_product(
+        [dates, ['both', 'male', 'female'], ages, list(ETHNICITY_GROUPS) + ['unknown']],
+        names=['date', 'sex', 'age', 'ethnicity'],
+    )
+    df = index.to_frame(index=False)
+    df['population'] = rng.uniform(0, 500, len(df))
+    df.loc[rng.choice(len(df), max(1, len(df) // 1000), replace=False), 'date'] = pd.NaT
+    return df
+
+
+def write_fixtures(directory, scale, seed=0):
+    """
+    Function to write the fixtures of one scale to `directory`. Returns the
+    paths by source name.
+    """
+    # The code lists come from the app, imported only here so the worker can
+    # point the app at the fixtures before it is first imported
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    paths = {name: os.path.join(directory, filename) for name, filename in FIXTURES.items()}
+    gapminder(scale, rng).to_csv(paths['gapminder'], index=False)
+    airports(scale, rng).to_csv(paths['us_airports'], index=False)
+    dosm_population(scale, rng).to_parquet(paths['malaysia_population'], index=False)
+    return paths
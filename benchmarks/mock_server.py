@@ -0,0 +1,150 @@
+"""
+Local stand-in for the dataset servers, for tests and benchmarks.
+
+Serves the files of a directory like the real hosts do: with ETag and
+Last-Modified validators, 304 answers to conditional requests and 206
+answers to Range requests. A fixed latency and failing requests can be
+injected, so loads are predictable and retries can be exercised.
+
+    python benchmarks/mock_server.py --scale 10 --port 8765
+
+writes the synthetic fixtures (fixtures.py) and prints the DATASET_URL_*
+variables that point the app at them.
+"""
+import argparse
+import email.utils
+import functools
+import hashlib
+import http.server
+import os
+import re
+import tempfile
+import threading
+import time
+
+from fixtures import FIXTURES, write_fixtures
+
+
+class MockHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def __init__(self, *args, directory, latency=0.0, failures=None, **kwargs):
+        self.directory = directory
+        self.latency = latency
+        self.failures = failures
+        super().__init__(*args, **kwargs)
+
+    def log_message(self, *args):
+        pass
+
+    def _etag(self, path, stat):
+        # Content hash, cached per (path, mtime, size) on the server
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        if key not in self.server.etags:
+            with open(path, 'rb') as f:
+                self.server.etags[key] = f'"{hashlib.sha256(f.read()).hexdigest()[:16]}"'
+        return self.server.etags[key]
+
+    def _send(self, status, headers, body=b''):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failures is not None and self.failures.take():
+            self._send(503, {'Retry-After': '0'})
+            return
+
+        path = os.path.join(self.directory, os.path.basename(self.path.split('?')[0]))
+        if not os.path.isfile(path):
+            self._send(404, {})
+            return
+        stat = os.stat(path)
+        etag = self._etag(path, stat)
+        headers = {'ETag': etag, 'Last-Modified': email.utils.formatdate(stat.st_mtime, usegmt=True)}
+
+        if self.headers.get('If-None-Match') == etag:
+            self._send(304, headers)
+            return
+
+        with open(path, 'rb') as f:
+            body = f.read()
+
+        # A single 'bytes=start-[end]' range, if the validator still matches
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if match and self.headers.get('If-Range', etag) == etag:
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else len(body) - 1, len(body) - 1)
+            if start >= len(body):
+                self._send(416, dict(headers, **{'Content-Range': f'bytes */{len(body)}'}))
+                return
+            headers['Content-Range'] = f'bytes {start}-{end}/{len(body)}'
+            self._send(206, headers, body[start:end + 1])
+            return
+        self._send(200, headers, body)
+
+
+class Failures:
+    """
+    Counter of requests to answer with a 503 before serving normally.
+    """
+
+    def __init__(self, count):
+        self.count = count
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            if self.count > 0:
+                self.count -= 1
+                return True
+            return False
+
+
+def serve(directory, port=0, latency=0.0, failures=0):
+    """
+    Function to serve `directory` in a background thread. Returns the
+    server, whose `requests` lists the paths requested so far, and its base
+    URL.
+    """
+    handler = functools.partial(
+        MockHandler, directory=directory, latency=latency, failures=Failures(failures) if failures else None,
+    )
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    server.requests = []
+    server.etags = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}/'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the synthetic datasets locally.")
+    parser.add_argument('--directory', help="folder with the fixtures (default: write them to a temporary folder)")
+    parser.add_argument('--scale', type=int, default=1, help="size of the written fixtures, as a multiple of the real files")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument('--failures', type=int, default=0, help="answer this many requests with 503 first")
+    args = parser.parse_args()
+
+    directory = args.directory or tempfile.mkdtemp(prefix='mock-datasets-')
+    if not args.directory:
+        write_fixtures(directory, args.scale)
+    server, base_url = serve(directory, args.port, args.latency, args.failures)
+    print(f"Serving {directory} at {base_url}")
+    for name, filename in FIXTURES.items():
+        print(f"export DATASET_URL_{name.upper()}={base_url}{filename}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
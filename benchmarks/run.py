@@ -0,0 +1,196 @@
+"""
+Headless benchmarks of the page scripts against synthetic datasets.
+
+Every page is run with Streamlit's AppTest through the scripted interactions
+in scenarios.py, against local fixtures (fixtures.py) at each scale, served
+by the mock server (mock_server.py), so no network is needed. Each rerun
+reports its latency, peak traced memory and payload (element protos plus
+media files) sent to the browser.
+
+    python benchmarks/run.py                          # 1x and 10x
+    python benchmarks/run.py --scales 1 10 100 --save benchmarks/baseline.json
+    python benchmarks/run.py --compare benchmarks/baseline.json
+
+With --compare, reruns that got slower, bigger or heavier than the baseline
+by more than --threshold are listed and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARK_DIR)
+
+METRICS = ['latency_ms', 'peak_memory_bytes', 'payload_bytes']
+
+
+def _payload_bytes(node):
+    proto = getattr(node, 'proto', None)
+    size = proto.ByteSize() if hasattr(proto, 'ByteSize') else 0
+    return size + sum(_payload_bytes(child) for child in getattr(node, 'children', {}).values())
+
+
+def run_worker(fixture_dir, scale, pages, latency):
+    """
+    Run the scenarios of `pages` in this process, against the fixtures in
+    `fixture_dir` served with `latency` seconds per request, and return one
+    result per rerun.
+    """
+    from fixtures import FIXTURES
+    from mock_server import serve
+    from scenarios import SCENARIOS
+
+    # Point the app at the fixtures and at a scratch cache before it loads
+    _, base_url = serve(fixture_dir, latency=latency)
+    for name, filename in FIXTURES.items():
+        os.environ[f'DATASET_URL_{name.upper()}'] = base_url + filename
+    os.environ['DATASET_CACHE_DIR'] = os.path.join(fixture_dir, 'cache', 'datasets')
+    os.chdir(ROOT_DIR)
+    sys.path.insert(0, os.path.join(ROOT_DIR, 'app'))
+
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.testing.v1 import AppTest
+
+    # Media files (images, downloads) are served apart from the element
+    # protos, so count their bytes as they are stored
+    media_bytes = [0]
+    load_and_get_id = MemoryMediaFileStorage.load_and_get_id
+
+    def counting_load_and_get_id(self, path_or_data, *args, **kwargs):
+        if isinstance(path_or_data, bytes):
+            media_bytes[0] += len(path_or_data)
+        return load_and_get_id(self, path_or_data, *args, **kwargs)
+
+    MemoryMediaFileStorage.load_and_get_id = counting_load_and_get_id
+
+    tracemalloc.start()
+    results = []
+    for page in pages:
+        at = AppTest.from_file(page, default_timeout=600)
+        for step, action in SCENARIOS[page]:
+            if action is not None:
+                action(at)
+            media_bytes[0] = 0
+            tracemalloc.reset_peak()
+            start = time.perf_counter()
+            at.run()
+            latency = time.perf_counter() - start
+            results.append({
+                'scale': scale,
+                'page': os.path.basename(page),
+                'step': step,
+                'latency_ms': latency * 1000,
+                'peak_memory_bytes': tracemalloc.get_traced_memory()[1],
+                'payload_bytes': _payload_bytes(at._tree) + media_bytes[0],
+                'exceptions': [str(e.value) for e in at.exception],
+            })
+            if at.exception:
+                # Later steps need the widgets of a successful run
+                break
+    return results
+
+
+def run_scale(scale, pages, work_dir, latency):
+    """
+    Write the fixtures of one scale and run the scenarios in a fresh process,
+    so module caches and memory do not carry over between scales.
+    """
+    from fixtures import write_fixtures
+
+    fixture_dir = os.path.join(work_dir, f'scale-{scale}')
+    write_fixtures(fixture_dir, scale)
+    process = subprocess.run(
+        [sys.executable, __file__, '--worker', fixture_dir, '--scales', str(scale), '--latency', str(latency),
+         '--pages', *pages],
+        capture_output=True, text=True,
+    )
+    if process.returncode != 0:
+        sys.exit(f"Benchmark worker for scale {scale}x failed:\n{process.stderr[-4000:]}")
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def _key(result):
+    return result['scale'], result['page'], result['step']
+
+
+def compare(results, baseline, threshold):
+    """
+    Function to list the reruns whose metrics grew by more than `threshold`
+    (a fraction) over the baseline.
+    """
+    previous = {_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get(_key(result))
+        if before is None:
+            continue
+        for metric in METRICS:
+            if before[metric] and result[metric] > before[metric] * (1 + threshold):
+                regressions.append((result, metric, before[metric]))
+    return regressions
+
+
+def report(results, baseline=None):
+    previous = {_key(result): result for result in baseline or []}
+    print(f"{'scale':>5}  {'page':<36} {'step':<22} {'latency':>10} {'peak mem':>10} {'payload':>10}")
+    for result in results:
+        line = (
+            f"{result['scale']:>4}x  {result['page'][:36]:<36} {result['step']:<22} "
+            f"{result['latency_ms']:>8.0f}ms {result['peak_memory_bytes'] / 2**20:>8.1f}MB "
+            f"{result['payload_bytes'] / 1024:>8.0f}KB"
+        )
+        before = previous.get(_key(result))
+        if before and before['latency_ms']:
+            line += f"  ({result['latency_ms'] / before['latency_ms'] - 1:+.0%} latency)"
+        if result['exceptions']:
+            line += f"  EXCEPTION: {result['exceptions'][0][:80]}"
+        print(line)
+
+
+def main():
+    from scenarios import SCENARIOS
+
+    parser = argparse.ArgumentParser(description="Benchmark the page scripts against synthetic datasets.")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10])
+    parser.add_argument('--pages', nargs='+', default=list(SCENARIOS), help="page scripts, relative to the repo root")
+    parser.add_argument('--save', help="write the results to this JSON file, e.g. as a new baseline")
+    parser.add_argument('--compare', help="baseline JSON file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="allowed growth over the baseline (fraction)")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds the mock server adds to every request")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.scales[0], args.pages, args.latency)))
+        return 0
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = [result for scale in args.scales for result in run_scale(scale, args.pages, work_dir, args.latency)]
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    report(results, baseline)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'created': time.time(), 'results': results}, f, indent=1)
+
+    failed = any(result['exceptions'] for result in results)
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for result, metric, before in regressions:
+            print(f"REGRESSION {result['scale']}x {result['page']} / {result['step']}: "
+                  f"{metric} {before:.0f} -> {result[metric]:.0f}")
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+# Scripted interactions per page. Each step is (label, action), where the
+# action sets widget values on an AppTest before the rerun that is measured;
+# the first step of every page is the initial run.
+
+
+def _widget(widgets, label):
+    return next(widget for widget in widgets if widget.label == label)
+
+
+def _next_option(widget):
+    options = list(widget.options)
+    return options[(options.index(widget.value) + 1) % len(options)] if widget.value in options else options[-1]
+
+
+def change_continent(at):
+    selectbox = _widget(at.selectbox, "Select a Continent")
+    selectbox.set_value(_next_option(selectbox))
+
+
+def change_country(at):
+    selectbox = _widget(at.selectbox, "Select a Country")
+    selectbox.set_value(_next_option(selectbox))
+
+
+def narrow_years(at):
+    slider = _widget(at.slider, "Select Year Range")
+    start, end = slider.value
+    slider.set_value((start + 10, end))
+
+
+def compare_countries(at):
+    multiselect = _widget(at.multiselect, "Select countries to compare")
+    multiselect.set_value(list(multiselect.options)[:4])
+
+
+def change_state(at):
+    selectbox = _widget(at.selectbox, "Select a State")
+    selectbox.set_value(_next_option(selectbox))
+
+
+def drop_first(label):
+    def action(at):
+        multiselect = _widget(at.multiselect, label)
+        multiselect.set_value(list(multiselect.value)[1:])
+    return action
+
+
+def select_groups(label, count):
+    def action(at):
+        multiselect = _widget(at.multiselect, label)
+        multiselect.set_value(list(multiselect.options)[:count])
+    return action
+
+
+def extend_horizon(at):
+    number_input = _widget(at.number_input, "Select End Year:")
+    number_input.set_value(number_input.value + 20)
+    _widget(at.button, "Update Years").click()
+
+
+SCENARIOS = {
+    'app/1_Introduction_🎊.py': [
+        ('initial', None),
+        ('rerun', lambda at: None),
+    ],
+    'app/pages/2_Continents_Population_🌍.py': [
+        ('initial', None),
+        ('change continent', change_continent),
+        ('change country', change_country),
+        ('narrow years', narrow_years),
+        ('compare countries', compare_countries),
+    ],
+    'app/pages/3_US_Airport_Traffic_🇺🇸.py': [
+        ('initial', None),
+        ('change state', change_state),
+        ('change state again', change_state),
+    ],
+    'app/pages/4_Malaysian_Population_🇲🇾.py': [
+        ('initial', None),
+        ('toggle gender', drop_first("Select Gender:")),
+        ('toggle age group', drop_first("Select Age Group:")),
+        ('toggle ethnicity', drop_first("Select Ethnicity:")),
+        ('predict age groups', select_groups("Select Age Groups for Prediction:", 2)),
+        ('predict ethnicities', select_groups("Select Ethnicities for Prediction:", 2)),
+        ('extend horizon', extend_horizon),
+    ],
+}
@@ -0,0 +1,292 @@
+"""
+Startup-time report of the page scripts: what a cold server process pays
+for the first visit to each page, with the warm-up in its default state.
+
+Every page gets a fresh interpreter, which runs the page once with
+Streamlit's AppTest against the 1x fixtures (fixtures.py) served by the
+mock server (mock_server.py), and then waits for the warm-up to finish.
+The modules each phase loaded are then imported again, in the same order,
+by a fresh interpreter started with `python -X importtime`. importtime
+cannot attribute imports made by several threads at once, like the page
+and the warm-up do. Imports are summed per package and per phase:
+
+  - server: Streamlit itself, loaded before any page
+  - first run: everything imported until the first run of the page is
+    done, by the script or by the warm-up threads meanwhile
+  - warm-up: what the warm-up imported in the background afterwards
+
+    python benchmarks/startup.py                      # every page
+    python benchmarks/startup.py --save benchmarks/startup_baseline.json
+    python benchmarks/startup.py --compare benchmarks/startup_baseline.json
+
+With --compare, pages whose first run imports got slower than the baseline
+by more than --threshold are listed and the exit status is 1.
+"""
+import argparse
+import glob
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARK_DIR)
+APP_DIR = os.path.join(ROOT_DIR, 'app')
+
+# Written to stderr by the worker between phases, among the importtime lines
+PHASE_MARKER = 'startup phase: '
+PHASES = ['server', 'first run', 'warm-up']
+
+# Libraries worth naming in the report even when they are not among the
+# slowest imports: whether a page loads them at all is the point
+HEAVY_PACKAGES = ['pandas', 'numpy', 'pyarrow', 'matplotlib', 'seaborn', 'scipy', 'PIL', 'pydeck', 'urllib3']
+
+# Packages listed per page
+TOP_PACKAGES = 8
+
+# Seconds to wait for the warm-up after the first run
+WARMUP_TIMEOUT = 600
+
+
+def default_pages():
+    return sorted(
+        os.path.relpath(path, ROOT_DIR)
+        for path in glob.glob(os.path.join(APP_DIR, '*.py')) + glob.glob(os.path.join(APP_DIR, 'pages', '*.py'))
+        if os.path.basename(path)[0].isdigit()
+    )
+
+
+def _phase(name):
+    print(PHASE_MARKER + name, file=sys.stderr, flush=True)
+
+
+def run_worker(page):
+    """
+    Run the first visit of `page` in this process and return the run's
+    latency and the modules each phase loaded, in order. The datasets and
+    the cache directory come from the environment (see measure).
+    """
+    modules, loaded = {}, set(sys.modules)
+
+    def phase_done(name):
+        # Only modules that can be imported by name again
+        modules[name] = [
+            module for module, value in list(sys.modules.items())
+            if module not in loaded and getattr(value, '__spec__', None) is not None
+        ]
+        loaded.update(sys.modules)
+
+    from streamlit.testing.v1 import AppTest
+
+    os.chdir(ROOT_DIR)
+    sys.path.insert(0, APP_DIR)
+    at = AppTest.from_file(page, default_timeout=600)
+    phase_done('server')
+
+    start = time.perf_counter()
+    at.run()
+    run_ms = (time.perf_counter() - start) * 1000
+    phase_done('first run')
+
+    # Imported by the page already
+    from warmup import status
+
+    deadline = time.monotonic() + WARMUP_TIMEOUT
+    while any(task['state'] in ('pending', 'running') for task in status().values()):
+        if time.monotonic() > deadline:
+            break
+        time.sleep(0.05)
+    phase_done('warm-up')
+    return {'run_ms': run_ms, 'exceptions': [str(e.value) for e in at.exception], 'modules': modules}
+
+
+def run_replay(path):
+    """
+    Import the modules of each phase in `path` (see run_worker) in order,
+    in this process, started with -X importtime. Modules that cannot be
+    imported on their own are skipped.
+    """
+    with open(path) as f:
+        modules = json.load(f)
+    os.chdir(ROOT_DIR)
+    sys.path.insert(0, APP_DIR)
+    for phase in PHASES:
+        _phase(phase)
+        for module in modules.get(phase, []):
+            try:
+                importlib.import_module(module)
+            except Exception:
+                pass
+
+
+def _app_modules():
+    return {os.path.splitext(os.path.basename(path))[0] for path in glob.glob(os.path.join(APP_DIR, '*.py'))}
+
+
+def parse_importtime(stderr):
+    """
+    Function to sum the self time (microseconds) of the modules in a
+    `-X importtime` log per phase and top-level package. The modules of the
+    app are summed under 'app'.
+    """
+    app_modules = _app_modules()
+    phases = {}
+    packages = None
+    for line in stderr.splitlines():
+        if line.startswith(PHASE_MARKER):
+            packages = phases.setdefault(line[len(PHASE_MARKER):], {})
+            continue
+        if packages is None or not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        root = name.strip().split('.')[0]
+        root = 'app' if root in app_modules else root
+        packages[root] = packages.get(root, 0) + int(self_us)
+    return phases
+
+
+def _python(args, env, what):
+    process = subprocess.run([sys.executable, *args], capture_output=True, text=True, env=env)
+    if process.returncode != 0:
+        sys.exit(f"{what} failed:\n{process.stderr[-4000:]}")
+    return process
+
+
+def measure(page, env):
+    """
+    Run the first visit of `page` in a fresh interpreter, with a cache
+    directory of its own, and return its latency and the import time of
+    what it loaded, per phase and package.
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        env = dict(env, DATASET_CACHE_DIR=os.path.join(work_dir, 'datasets'))
+        process = _python([__file__, '--worker', page], env, f"First run of {page}")
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+
+        modules_path = os.path.join(work_dir, 'modules.json')
+        with open(modules_path, 'w') as f:
+            json.dump(result.pop('modules'), f)
+        process = _python(['-X', 'importtime', __file__, '--replay', modules_path], env, f"Import replay of {page}")
+    result['phases'] = parse_importtime(process.stderr)
+    return result
+
+
+def _median_packages(runs):
+    names = set().union(*runs)
+    packages = {name: statistics.median(run.get(name, 0) for run in runs) / 1000 for name in names}
+    return dict(sorted(packages.items(), key=lambda item: -item[1]))
+
+
+def run_page(page, repeat, env):
+    """
+    Median over `repeat` fresh interpreters of the first run's latency and
+    of the import time of each phase and package, in milliseconds.
+    """
+    runs = [measure(page, env) for _ in range(repeat)]
+    phases = {
+        phase: _median_packages([run['phases'].get(phase, {}) for run in runs])
+        for phase in PHASES
+    }
+    return {
+        'page': page,
+        'run_ms': statistics.median(run['run_ms'] for run in runs),
+        'import_ms': statistics.median(sum(run['phases'].get('first run', {}).values()) for run in runs) / 1000,
+        'server_import_ms': statistics.median(sum(run['phases'].get('server', {}).values()) for run in runs) / 1000,
+        'warmup_import_ms': statistics.median(sum(run['phases'].get('warm-up', {}).values()) for run in runs) / 1000,
+        'packages': phases['first run'],
+        'warmup_packages': phases['warm-up'],
+        'exceptions': runs[-1]['exceptions'],
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Function to list the pages whose first run imports grew by more than
+    `threshold` (a fraction) over the baseline.
+    """
+    previous = {result['page']: result for result in baseline}
+    return [
+        (result, previous[result['page']]['import_ms'])
+        for result in results
+        if result['page'] in previous and result['import_ms'] > previous[result['page']]['import_ms'] * (1 + threshold)
+    ]
+
+
+def _heavy(packages, exclude=()):
+    return ', '.join(name for name in HEAVY_PACKAGES if packages.get(name) and name not in exclude) or 'none'
+
+
+def report(results, baseline=None):
+    previous = {result['page']: result for result in baseline or []}
+    if results:
+        print(f"server (Streamlit) imports: {statistics.median(r['server_import_ms'] for r in results):.0f}ms")
+    for result in results:
+        line = f"{result['page']:<48} first run {result['run_ms']:>7.0f}ms, imports {result['import_ms']:>6.0f}ms"
+        before = previous.get(result['page'])
+        if before and before['import_ms']:
+            line += f"  ({result['import_ms'] / before['import_ms'] - 1:+.0%} imports)"
+        if result['exceptions']:
+            line += f"  EXCEPTION: {result['exceptions'][0][:80]}"
+        print(line)
+        packages = result['packages']
+        for name in list(packages)[:TOP_PACKAGES]:
+            print(f"    {name:<24} {packages[name]:>8.1f}ms")
+        print(f"    heavy packages loaded by the first run: {_heavy(packages)}")
+        print(f"    loaded later by the warm-up ({result['warmup_import_ms']:.0f}ms): "
+              f"{_heavy(result['warmup_packages'], result['packages'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report what the first visit to each page pays for imports.")
+    parser.add_argument('--pages', nargs='+', default=default_pages(), help="page scripts, relative to the repo root")
+    parser.add_argument('--repeat', type=int, default=3, help="fresh interpreters per page, the median is reported")
+    parser.add_argument('--save', help="write the results to this JSON file, e.g. as a new baseline")
+    parser.add_argument('--compare', help="baseline JSON file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="allowed growth over the baseline (fraction)")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--replay', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker)))
+        return 0
+    if args.replay:
+        run_replay(args.replay)
+        return 0
+
+    from fixtures import FIXTURES, write_fixtures
+    from mock_server import serve
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        write_fixtures(work_dir, 1)
+        _, base_url = serve(work_dir)
+        env = dict(os.environ)
+        for name, filename in FIXTURES.items():
+            env[f'DATASET_URL_{name.upper()}'] = base_url + filename
+        results = [run_page(page, args.repeat, env) for page in args.pages]
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    report(results, baseline)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'created': time.time(), 'results': results}, f, indent=1)
+
+    failed = any(result['exceptions'] for result in results)
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for result, before in regressions:
+            print(f"REGRESSION {result['page']}: first run imports {before:.0f}ms -> {result['import_ms']:.0f}ms")
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,15 @@
+import os
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The app modules import each other by name, like Streamlit runs them
+sys.path.insert(0, os.path.join(ROOT_DIR, 'app'))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'benchmarks'))
+
+# Datasets are cached in a scratch folder and served from memory (see
+# data_sources.register_stub), set before any app module is imported
+os.environ.setdefault('DATASET_CACHE_DIR', os.path.join(tempfile.mkdtemp(prefix='app-tests-'), 'datasets'))
+for name in ('gapminder', 'us_airports', 'malaysia_population'):
+    os.environ.setdefault(f'DATASET_URL_{name.upper()}', 'stub:')
@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import airports
+from airports import AirportGeo, AirportSummary, airport_summary, load_airports, map_layers
+from data_sources import register_stub
+from fixtures import airports as airport_fixture
+from geo import view_bbox
+
+# A small state, so its map is zoomed in enough to show its neighbours
+SMALL_STATE = 'RI'
+
+
+@pytest.fixture(scope='module')
+def source():
+    df = airport_fixture(1, np.random.default_rng(0))
+    small = df['state'] == SMALL_STATE
+    rng = np.random.default_rng(1)
+    df.loc[small, 'lat'] = rng.uniform(41.3, 41.8, small.sum())
+    df.loc[small, 'long'] = rng.uniform(-71.8, -71.3, small.sum())
+    # Neighbours close enough to be in the small state's view
+    df.loc[df.index[:20], ['state', 'lat', 'long']] = ['CT', 41.5, -72.0]
+    register_stub('us_airports', df.to_csv(index=False).encode())
+    return df
+
+
+@pytest.fixture
+def df(source):
+    return load_airports()
+
+
+def test_state_names_leave_the_shared_dataset_alone(df):
+    from datasets import load_dataset
+
+    shared = load_dataset('us_airports')
+    assert 'state_full' in df and 'lon' in df
+    assert 'state_full' not in shared and 'long' in shared
+    assert not np.shares_memory(df['lat'].to_numpy(), shared['lat'].to_numpy())
+
+
+def test_country_layer_holds_every_airport(df):
+    (latitude, longitude, zoom), (data, clustered), nearby = map_layers()
+    assert not clustered and nearby is None
+    assert len(data) == len(df)
+    assert list(data.columns) == airports.POINT_COLUMNS
+    assert data['cnt'].sum() == df['cnt'].sum()
+
+
+def test_large_layers_are_clustered(df, monkeypatch):
+    monkeypatch.setattr(airports, 'MAX_POINTS_PER_LAYER', 100)
+    geo = AirportGeo(df)
+    data, clustered = geo.layer_data(zoom=3)
+    assert clustered
+    assert data['count'].sum() == len(df)
+    assert data['cnt'].sum() == df['cnt'].sum()
+    # From DETAIL_ZOOM on, points are drawn as they are
+    data, clustered = geo.layer_data(zoom=airports.DETAIL_ZOOM)
+    assert not clustered and len(data) == len(df)
+
+
+def test_state_layer_holds_the_state_airports(df):
+    state = df['state_full'].iloc[-1]
+    _, (data, _), _ = map_layers(state)
+    expected = df[df['state_full'] == state]
+    assert len(data) == len(expected)
+    assert sorted(data['airport']) == sorted(expected['airport'])
+
+
+def test_small_state_shows_the_other_airports_in_view(df):
+    state = airports.STATE_NAMES[SMALL_STATE]
+    (latitude, longitude, zoom), (data, _), nearby = map_layers(state)
+    assert zoom >= airports.DETAIL_ZOOM
+    assert (data['state_full'] == state).all()
+
+    nearby_data, clustered = nearby
+    west, south, east, north = view_bbox(latitude, longitude, zoom)
+    in_view = (
+        df['lon'].between(west, east) & df['lat'].between(south, north) & (df['state_full'] != state)
+    )
+    assert not clustered
+    assert list(nearby_data.columns) == airports.CONTEXT_COLUMNS
+    assert len(nearby_data) == in_view.sum() > 0
+    pd.testing.assert_frame_equal(
+        nearby_data.sort_values(['lon', 'lat']).reset_index(drop=True),
+        df.loc[in_view, ['lon', 'lat']].astype('float64').round(4).sort_values(['lon', 'lat']).reset_index(drop=True),
+    )
+
+
+def test_summary_matches_pandas(df):
+    summary = airport_summary()
+    pd.testing.assert_series_equal(
+        summary.state_traffic, df.groupby('state_full', observed=True)['cnt'].sum(), check_names=False,
+    )
+    assert summary.busiest['airport'] == df.loc[df['cnt'].idxmax(), 'airport']
+
+    expected = df.sort_values('cnt', ascending=False, kind='stable').head(airports.TOP_AIRPORTS)
+    assert summary.top_airports()['airport'].tolist() == expected['airport'].tolist()
+    assert summary.top_airports(3)['airport'].tolist() == expected['airport'].head(3).tolist()
+
+    state = airports.STATE_NAMES[SMALL_STATE]
+    in_state = df[df['state_full'] == state]
+    expected = in_state.sort_values('cnt', ascending=False, kind='stable').head(airports.TOP_AIRPORTS)
+    assert summary.top_airports(state=state)['airport'].tolist() == expected['airport'].tolist()
+    assert summary.busiest_by_state[state]['airport'] == in_state.loc[in_state['cnt'].idxmax(), 'airport']
+    assert len(summary.top_airports(state='Atlantis')) == 0
+
+
+def test_summary_centroids_and_boxes(df):
+    summary = airport_summary()
+    state = airports.STATE_NAMES[SMALL_STATE]
+    in_state = df[df['state_full'] == state].astype({'lat': 'float64', 'lon': 'float64'})
+    assert summary.centroids[state] == pytest.approx((in_state['lat'].mean(), in_state['lon'].mean()))
+    assert summary.bboxes[state] == pytest.approx(
+        (in_state['lon'].min(), in_state['lat'].min(), in_state['lon'].max(), in_state['lat'].max())
+    )
+    assert summary.centroids[None] == pytest.approx((df['lat'].astype('float64').mean(), df['lon'].astype('float64').mean()))
+    # Every state's view is centred on its centroid, capped in zoom
+    for key, (latitude, longitude, zoom) in summary.views.items():
+        assert (latitude, longitude) == summary.centroids[key]
+        assert zoom <= airports.MAX_MAP_ZOOM
+
+
+def test_summary_of_no_airports(df):
+    summary = AirportSummary(df.head(0))
+    assert summary.busiest is None
+    assert len(summary.top_airports()) == 0
+    assert summary.views == {}
@@ -0,0 +1,77 @@
+import base64
+import os
+
+import pytest
+from PIL import Image
+
+import assets
+from assets import asset_bytes, asset_data_uri, precompute_assets
+
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    """
+    Two source images of this test's own, optimized into a scratch folder,
+    with the per-process caches cleared around the test.
+    """
+    Image.new('RGBA', (600, 300), (200, 30, 30, 128)).save(tmp_path / 'photo.png')
+    # A JPEG saved at low quality: re-encoding it at a higher one is larger
+    Image.effect_noise((200, 200), 64).convert('RGB').save(tmp_path / 'noise.jpg', quality=20)
+
+    monkeypatch.setattr(assets, 'ROOT_DIR', str(tmp_path))
+    monkeypatch.setattr(assets, 'OPTIMIZED_DIR', str(tmp_path / 'optimized'))
+    monkeypatch.setattr(assets, 'ASSETS', {
+        'photo': {'path': 'photo.png', 'max_size': (100, 100), 'format': 'JPEG', 'quality': 75},
+        'noise': {'path': 'noise.jpg', 'max_size': (400, 400), 'format': 'JPEG', 'quality': 95},
+    })
+    assets._registry.cache_clear()
+    asset_data_uri.cache_clear()
+    yield tmp_path
+    assets._registry.cache_clear()
+    asset_data_uri.cache_clear()
+
+
+def test_variants_fit_their_spec(sources):
+    paths = precompute_assets()
+    with Image.open(paths['photo']) as image:
+        assert image.format == 'JPEG'
+        assert image.mode == 'RGB'
+        # Downsized within the bounds, keeping the aspect ratio
+        assert image.size == (100, 50)
+
+
+def test_original_is_kept_when_re_encoding_is_larger(sources):
+    paths = precompute_assets()
+    assert open(paths['noise'], 'rb').read() == (sources / 'noise.jpg').read_bytes()
+
+
+def test_up_to_date_variants_are_not_rebuilt(sources, monkeypatch):
+    first = precompute_assets()
+    built = []
+    monkeypatch.setattr(assets, '_optimize', lambda spec, path: built.append(path))
+    assert precompute_assets() == first
+    assert built == []
+
+
+def test_changed_source_or_spec_replaces_the_variant(sources, monkeypatch):
+    first = precompute_assets()
+
+    Image.new('RGB', (300, 300), (0, 0, 255)).save(sources / 'photo.png')
+    os.utime(sources / 'photo.png', ns=(1, 1))
+    second = precompute_assets()
+    assert second['photo'] != first['photo']
+    assert second['noise'] == first['noise']
+
+    monkeypatch.setitem(assets.ASSETS['noise'], 'max_size', (50, 50))
+    third = precompute_assets()
+    assert third['noise'] != second['noise']
+    # Only the current variants are kept
+    assert sorted(os.listdir(assets.OPTIMIZED_DIR)) == sorted(os.path.basename(path) for path in third.values())
+
+
+def test_data_uri_encodes_the_optimized_bytes(sources):
+    uri = asset_data_uri('photo')
+    prefix = 'data:image/jpeg;base64,'
+    assert uri.startswith(prefix)
+    assert base64.b64decode(uri[len(prefix):]) == asset_bytes('photo')
+    assert asset_data_uri('photo') is uri
@@ -0,0 +1,126 @@
+import json
+
+import pytest
+
+import data_sources
+from data_sources import FetchError, FileSource, HttpSource, StubSource, configure, register_stub, source_backend
+from mock_server import serve
+
+BODY = bytes(range(256)) * 64
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    # No waiting between retries, on a pool of this test's own
+    monkeypatch.setattr(data_sources, 'BACKOFF_SECONDS', 0)
+    monkeypatch.setattr(data_sources, '_pool', None)
+    directory = tmp_path / 'served'
+    directory.mkdir()
+    (directory / 'data.bin').write_bytes(BODY)
+
+    def start(failures=0):
+        server, base_url = serve(str(directory), failures=failures)
+        return server, base_url + 'data.bin'
+
+    yield start
+
+
+def _partial(tmp_path, data, validator):
+    partial_path = str(tmp_path / 'download.part')
+    with open(partial_path, 'wb') as f:
+        f.write(data)
+    with open(partial_path + '.json', 'w') as f:
+        json.dump({'validator': validator}, f)
+    return partial_path
+
+
+def test_conditional_request_gets_304(server, tmp_path):
+    _, url = server()
+    status, body, headers = HttpSource(url).fetch(None, str(tmp_path / 'download.part'))
+    assert (status, body) == (200, BODY)
+    status, body, _ = HttpSource(url).fetch({'etag': headers['ETag']}, str(tmp_path / 'download.part'))
+    assert (status, body) == (304, None)
+
+
+def test_interrupted_download_is_resumed(server, tmp_path):
+    _, url = server()
+    _, _, headers = HttpSource(url).fetch(None, str(tmp_path / 'first.part'))
+    # Marked bytes, to tell what came from the partial file
+    partial_path = _partial(tmp_path, b'\xff' * 1000, headers['ETag'])
+
+    status, body, _ = HttpSource(url).fetch(None, partial_path)
+    assert (status, body) == (200, b'\xff' * 1000 + BODY[1000:])
+    # The partial file is gone once the download is complete
+    assert not (tmp_path / 'download.part').exists()
+
+
+def test_changed_source_restarts_the_download(server, tmp_path):
+    _, url = server()
+    # If-Range does not match: the server sends the whole file again
+    partial_path = _partial(tmp_path, b'stale bytes', '"old-etag"')
+    status, body, _ = HttpSource(url).fetch(None, partial_path)
+    assert (status, body) == (200, BODY)
+
+
+def test_unsatisfiable_range_restarts_the_download(server, tmp_path):
+    _, url = server()
+    _, _, headers = HttpSource(url).fetch(None, str(tmp_path / 'first.part'))
+    # Longer than the source: 416, then a fresh download
+    partial_path = _partial(tmp_path, BODY + b'extra', headers['ETag'])
+    status, body, _ = HttpSource(url).fetch(None, partial_path)
+    assert (status, body) == (200, BODY)
+
+
+def test_failed_requests_are_retried(server, tmp_path):
+    mock, url = server(failures=data_sources.RETRIES)
+    status, body, _ = HttpSource(url).fetch(None, str(tmp_path / 'download.part'))
+    assert (status, body) == (200, BODY)
+    assert len(mock.requests) == data_sources.RETRIES + 1
+
+
+def test_persistent_failures_raise_fetch_error(server, tmp_path):
+    _, url = server(failures=100)
+    with pytest.raises(FetchError):
+        HttpSource(url).fetch(None, str(tmp_path / 'download.part'))
+
+
+def test_missing_file_raises_fetch_error(server, tmp_path):
+    _, url = server()
+    with pytest.raises(FetchError):
+        HttpSource(url.replace('data.bin', 'missing.bin')).fetch(None, str(tmp_path / 'download.part'))
+
+
+def test_stub_source_answers_conditional_requests():
+    register_stub('test_stub', lambda: b'a,b\n1,2\n')
+    status, body, headers = StubSource('test_stub').fetch(None, None)
+    assert (status, body) == (200, b'a,b\n1,2\n')
+    assert StubSource('test_stub').fetch({'etag': headers['ETag']}, None)[0] == 304
+    with pytest.raises(FetchError):
+        StubSource('not_registered').fetch(None, None)
+
+
+def test_file_source_answers_conditional_requests(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_bytes(b'a\n1\n')
+    status, body, headers = FileSource(str(path)).fetch(None, None)
+    assert (status, body) == (200, b'a\n1\n')
+    assert FileSource(str(path)).fetch({'etag': headers['ETag']}, None)[0] == 304
+    with pytest.raises(FetchError):
+        FileSource(str(tmp_path / 'missing.csv')).fetch(None, None)
+
+
+def test_source_backend_by_scheme():
+    assert isinstance(source_backend('a', 'https://example.com/a.csv'), HttpSource)
+    assert isinstance(source_backend('a', 'stub:'), StubSource)
+    assert isinstance(source_backend('a', 'file:///tmp/a.csv'), FileSource)
+    assert source_backend('a', 'data/a.csv').path.endswith('data/a.csv')
+
+
+def test_configure_environment_wins_over_the_file(tmp_path, monkeypatch):
+    config = tmp_path / 'data_sources.toml'
+    config.write_text('[example]\nurl = "http://mirror.local/a.csv"\nttl = 60\n')
+    monkeypatch.setattr(data_sources, 'CONFIG_PATH', str(config))
+    monkeypatch.setenv('DATASET_TTL_EXAMPLE', '5')
+
+    sources = configure({'example': {'url': 'https://example.com/a.csv', 'ttl': 3600}})
+    assert sources['example'] == {'url': 'http://mirror.local/a.csv', 'ttl': 5.0}
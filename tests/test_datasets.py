@@ -0,0 +1,167 @@
+import os
+import threading
+
+import pytest
+
+import data_sources
+import datasets
+from data_sources import FetchError, register_stub
+from datasets import dataset_version, load_dataset
+from lru import SizedLRU
+from mock_server import serve
+
+NAME = 'test_dataset'
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    """
+    A dataset of this test's own, cached in a scratch folder, with an empty
+    in-process cache. Returns a function to point it at a URL.
+    """
+    monkeypatch.setattr(datasets, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(datasets, '_memory_cache', SizedLRU(datasets.MEMORY_LIMIT_BYTES))
+    monkeypatch.setitem(datasets._source_locks, NAME, threading.Lock())
+    monkeypatch.setattr(data_sources, 'BACKOFF_SECONDS', 0)
+    monkeypatch.setattr(data_sources, '_pool', None)
+
+    def point(url, ttl=3600):
+        monkeypatch.setitem(datasets.SOURCES, NAME, {'url': url, 'format': 'csv', 'ttl': ttl})
+
+    return point
+
+
+@pytest.fixture
+def stub():
+    """
+    The stub body of the test dataset, counting the fetches that read it.
+    """
+    state = {'body': b'x,y\n1,a\n2,b\n', 'fetches': 0}
+
+    def body():
+        state['fetches'] += 1
+        return state['body']
+
+    register_stub(NAME, body)
+    yield state
+    data_sources._stubs.pop(NAME, None)
+
+
+def _restart():
+    # A new server process: nothing in memory, the snapshot still on disk
+    datasets._memory_cache.clear()
+
+
+def test_fresh_snapshot_needs_no_fetch(source, stub):
+    source('stub:')
+    first = load_dataset(NAME)
+    assert first['x'].tolist() == [1, 2]
+    assert stub['fetches'] == 1
+
+    # Reruns are served from memory, a restart from the snapshot on disk
+    assert load_dataset(NAME) is first
+    _restart()
+    assert load_dataset(NAME)['x'].tolist() == [1, 2]
+    assert stub['fetches'] == 1
+
+
+def test_expired_ttl_revalidates_and_keeps_the_snapshot_on_304(source, stub, monkeypatch):
+    source('stub:', ttl=0)
+    first = load_dataset(NAME)
+    version = dataset_version(NAME)
+
+    parsed = []
+    monkeypatch.setattr(datasets, '_parse', lambda body, fmt: parsed.append(body))
+    assert load_dataset(NAME) is first
+    assert dataset_version(NAME) == version
+    assert stub['fetches'] > 1
+    # A 304 is not parsed again, and the snapshot is not stale
+    assert parsed == []
+    assert datasets._read_meta(NAME)['stale'] is False
+
+
+def test_expired_ttl_with_changed_content_makes_a_new_version(source, stub):
+    source('stub:', ttl=0)
+    first = load_dataset(NAME)
+    version = dataset_version(NAME)
+
+    stub['body'] = b'x,y\n1,a\n2,b\n3,c\n'
+    second = load_dataset(NAME)
+    assert second is not first
+    assert second['x'].tolist() == [1, 2, 3]
+    assert dataset_version(NAME) != version
+    # The in-process copy and the disk hold only the new version
+    assert datasets._memory_cache.get(NAME)['meta']['version'] == dataset_version(NAME)
+    snapshots = [f for f in os.listdir(datasets._source_dir(NAME)) if f.endswith('.arrow')]
+    assert snapshots == [f'{dataset_version(NAME)}.arrow']
+
+
+def test_snapshot_in_use_is_removed_by_a_later_refresh(source, stub, monkeypatch):
+    source('stub:', ttl=0)
+    load_dataset(NAME)
+    old_snapshot = datasets._snapshot_path(NAME, dataset_version(NAME))
+
+    # Still memory-mapped on Windows: the old snapshot cannot be removed yet
+    remove = os.remove
+
+    def locked_remove(path):
+        if path == old_snapshot:
+            raise PermissionError(13, "The process cannot access the file", path)
+        remove(path)
+
+    monkeypatch.setattr(os, 'remove', locked_remove)
+    stub['body'] = b'x,y\n1,a\n2,b\n3,c\n'
+    assert load_dataset(NAME)['x'].tolist() == [1, 2, 3]
+    assert os.path.exists(old_snapshot)
+
+    # Unmapped by now: the next revalidation (a 304) removes it
+    monkeypatch.setattr(os, 'remove', remove)
+    load_dataset(NAME)
+    snapshots = [f for f in os.listdir(datasets._source_dir(NAME)) if f.endswith('.arrow')]
+    assert snapshots == [f'{dataset_version(NAME)}.arrow']
+
+
+def test_offline_serves_the_last_good_snapshot(source, tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_bytes(b'x\n1\n2\n')
+    source(f'file://{path}', ttl=0)
+    version = dataset_version(NAME)
+
+    path.unlink()
+    _restart()
+    assert load_dataset(NAME)['x'].tolist() == [1, 2]
+    assert dataset_version(NAME) == version
+    assert datasets._read_meta(NAME)['stale'] is True
+
+
+def test_offline_without_a_snapshot_raises(source, tmp_path):
+    source(f'file://{tmp_path / "missing.csv"}')
+    with pytest.raises(FetchError):
+        load_dataset(NAME)
+
+
+def test_http_source_revalidates_against_the_server(source, tmp_path):
+    directory = tmp_path / 'served'
+    directory.mkdir()
+    (directory / 'data.csv').write_bytes(b'x\n1\n')
+    server, base_url = serve(str(directory))
+    source(base_url + 'data.csv', ttl=0)
+
+    first = load_dataset(NAME)
+    version = dataset_version(NAME)
+    assert load_dataset(NAME) is first
+    assert len(server.requests) >= 2
+
+    # Changed on the server: the next revalidation downloads it
+    (directory / 'data.csv').write_bytes(b'x\n1\n2\n')
+    assert load_dataset(NAME)['x'].tolist() == [1, 2]
+    assert dataset_version(NAME) != version
+
+    # Server gone: the last good snapshot is served
+    server.shutdown()
+    server.server_close()
+    # Kept-alive connections would still reach the handler threads
+    data_sources._connection_pool().clear()
+    _restart()
+    assert load_dataset(NAME)['x'].tolist() == [1, 2]
+    assert datasets._read_meta(NAME)['stale'] is True
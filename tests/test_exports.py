@@ -0,0 +1,113 @@
+import gzip
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import exports
+from exports import export_data, export_file, export_key, write_export
+
+
+@pytest.fixture(autouse=True)
+def export_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(exports, 'EXPORT_DIR', str(tmp_path / 'exports'))
+    monkeypatch.setattr(exports, '_export_cache', exports.SizedLRU(exports.EXPORT_CACHE_BYTES))
+    # Several chunks even for small frames
+    monkeypatch.setattr(exports, 'CHUNK_ROWS', 64)
+    return tmp_path / 'exports'
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'Year': np.arange(300) % 50 + 1970,
+        'Ethnicity': rng.choice(['Malay', 'Chinese', 'Indian'], 300),
+        'Population': rng.uniform(0, 500, 300),
+    })
+
+
+def _read(path, fmt):
+    if fmt == 'parquet':
+        return pd.read_parquet(path)
+    with (gzip.open if fmt == 'csv.gz' else open)(path, 'rt') as f:
+        return pd.read_csv(f)
+
+
+@pytest.mark.parametrize('fmt', list(exports.FORMATS))
+@pytest.mark.parametrize('rows', [0, 1, 300])
+def test_export_round_trips(tmp_path, df, fmt, rows):
+    path = str(tmp_path / f'export.{fmt}')
+    write_export(df.head(rows), fmt, path)
+    result = _read(path, fmt)
+    assert list(result.columns) == list(df.columns)
+    pd.testing.assert_frame_equal(result, df.head(rows), check_dtype=rows > 0)
+
+
+@pytest.mark.parametrize('fmt', list(exports.FORMATS))
+@pytest.mark.parametrize('step', [1, 3, 1000])
+def test_export_of_positions_matches_the_taken_rows(tmp_path, df, fmt, step):
+    positions = np.arange(0, len(df), step)
+    path = str(tmp_path / f'export.{fmt}')
+    write_export(df, fmt, path, positions)
+    pd.testing.assert_frame_equal(_read(path, fmt), df.take(positions).reset_index(drop=True))
+
+
+def test_export_file_is_written_once(df):
+    path = export_file('test', df, 'state', 'csv', 'v1')
+    modified = os.path.getmtime(path)
+    os.utime(path, (0, 0))
+    assert export_file('test', df.head(0), 'state', 'csv', 'v1') == path
+    # Reused (and marked as recently used), not written again
+    assert len(_read(path, 'csv')) == len(df)
+    assert os.path.getmtime(path) >= modified
+    assert export_file('test', df, 'state', 'csv', 'v2') != path
+
+
+def test_least_recently_prepared_exports_are_pruned(df, monkeypatch):
+    first = export_file('test', df, 'first', 'csv', 'v1')
+    monkeypatch.setattr(exports, 'EXPORT_LIMIT_BYTES', os.path.getsize(first) + 1)
+    os.utime(first, (0, 0))
+    second = export_file('test', df, 'second', 'csv', 'v1')
+    assert not os.path.exists(first)
+    assert os.path.exists(second)
+
+
+def test_export_data_is_read_once(df):
+    path = export_file('test', df, 'state', 'csv', 'v1')
+    key = export_key('test', 'state', 'csv', 'v1')
+    data = export_data(key, path)
+    os.remove(path)
+    # Served from memory after the first read
+    assert export_data(key, path) is data
+    with pytest.raises(FileNotFoundError):
+        export_data(export_key('test', 'other', 'csv', 'v1'), path)
+
+
+def export_page():
+    import pandas as pd
+    from exports import export_controls
+
+    df = pd.DataFrame({'Year': [2000, 2001], 'Population': [1.0, 2.0]})
+    export_controls('test', df, 'state', 'v1', 'test_export')
+
+
+def test_pruned_export_is_prepared_again(export_dir):
+    at = AppTest.from_function(export_page)
+    at.run()
+    assert not at.get('download_button')
+    at.button(key='test_export_prepare').click().run()
+    assert len(at.get('download_button')) == 1
+
+    # Pruned by another session before this one served it
+    exports._export_cache.clear()
+    for filename in os.listdir(export_dir):
+        os.remove(export_dir / filename)
+    at.run()
+    assert not at.exception
+    assert not at.get('download_button')
+    assert 'test_export' not in at.session_state
+    at.button(key='test_export_prepare').click().run()
+    assert len(at.get('download_button')) == 1
@@ -0,0 +1,83 @@
+import pandas as pd
+import pytest
+
+import figures
+from figures import BarChart, LineChart, cached_chart, get_chart, state_key
+from lru import SizedLRU
+
+
+@pytest.fixture(autouse=True)
+def chart_cache(monkeypatch):
+    # An empty cache of this test's own, rendering PNGs
+    monkeypatch.setattr(figures, '_chart_cache', SizedLRU(figures.MEMORY_LIMIT_BYTES))
+    monkeypatch.setattr(figures, 'RENDERER', 'matplotlib')
+    monkeypatch.setattr(figures, 'IMAGE_FORMAT', 'png')
+
+
+def _line():
+    data = pd.DataFrame({'Year': [2000, 2001, 2000, 2001], 'sum': [1.0, 2.0, 3.0, 1.0], 'Series': list('aabb')})
+    return LineChart(data, x='Year', y='sum', series='Series', title="Trend", xlabel="Year", ylabel="Population",
+                     styles={'b': {'linestyle': '--'}})
+
+
+def test_state_key_ignores_the_order_of_selections():
+    selections = {'Gender': ['male', 'female'], 'Ethnicity': ['Malay', 'Chinese']}
+    reordered = {'Ethnicity': ['Chinese', 'Malay'], 'Gender': ['female', 'male']}
+    assert state_key(selections, (1990, 2000)) == state_key(reordered, (1990, 2000))
+    hash(state_key(selections, (1990, 2000)))
+
+
+def test_state_key_tells_different_states_apart():
+    selections = {'Gender': ['male'], 'Ethnicity': ['Malay']}
+    assert state_key(selections, (1990, 2000)) != state_key(selections, (2000, 1990))
+    assert state_key(selections, (1990, 2000)) != state_key(dict(selections, Gender=['female']), (1990, 2000))
+    assert state_key(['a'], 'b') != state_key(['a', 'b'])
+
+
+def test_chart_is_built_once_per_state():
+    built = []
+
+    def build():
+        built.append(True)
+        return _line()
+
+    first = get_chart('trend', state_key({'a': ['x', 'y']}), 'v1', build)
+    assert first.startswith(b'\x89PNG')
+    assert get_chart('trend', state_key({'a': ['y', 'x']}), 'v1', build) is first
+    assert len(built) == 1
+
+    # Another data version or renderer output is rendered again
+    get_chart('trend', state_key({'a': ['x', 'y']}), 'v2', build)
+    assert len(built) == 2
+    assert cached_chart('trend', state_key({'a': ['x', 'y']}), 'v3') is None
+
+
+def test_renderer_outputs_are_cached_apart(monkeypatch):
+    key = state_key({'a': ['x']})
+    image = get_chart('trend', key, 'v1', _line)
+    monkeypatch.setattr(figures, 'RENDERER', 'vega-lite')
+    assert cached_chart('trend', key, 'v1') is None
+    spec = get_chart('trend', key, 'v1', _line)
+    assert isinstance(spec, dict) and image.startswith(b'\x89PNG')
+    assert cached_chart('trend', key, 'v1') is spec
+
+
+def test_vega_lite_specs_carry_the_data():
+    spec = _line().vega_lite()
+    assert spec['data']['values'][0] == {'Year': 2000, 'sum': 1.0, 'Series': 'a'}
+    assert spec['encoding']['strokeDash']['condition']['test']['oneOf'] == ['b']
+
+    data = pd.DataFrame({'Ethnicity': ['Malay', 'Chinese'], 'sum': [3.0, 1.0]})
+    bars = BarChart(data, x='sum', y='Ethnicity', horizontal=True, title="By ethnicity", xlabel="Population",
+                    ylabel="Ethnicity").vega_lite()
+    assert bars['encoding']['y']['field'] == 'Ethnicity'
+    assert bars['encoding']['x']['field'] == 'sum'
+    assert len(bars['data']['values']) == len(data)
+
+
+def test_chart_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(figures, '_chart_cache', SizedLRU(1))
+    get_chart('first', (), 'v1', _line)
+    get_chart('second', (), 'v1', _line)
+    assert cached_chart('first', (), 'v1') is None
+    assert cached_chart('second', (), 'v1') is not None
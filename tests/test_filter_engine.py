@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from filter_engine import FilterIndex
+
+COLUMNS = ['Gender', 'Ethnicity']
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(0)
+    n = 5_000
+    return pd.DataFrame({
+        'Gender': rng.choice(['male', 'female', 'both'], n),
+        'Ethnicity': pd.Categorical(rng.choice(['Malay', 'Chinese', 'Indian', None], n)),
+        'Year': rng.integers(1970, 2024, n).astype('int16'),
+        'Population': rng.uniform(0, 100, n),
+    })
+
+
+def expected_mask(df, selections, year_range):
+    mask = np.ones(len(df), dtype=bool)
+    for column, selected in selections.items():
+        mask &= df[column].isin(selected).to_numpy()
+    if year_range is not None:
+        mask &= df['Year'].between(*year_range).to_numpy()
+    return mask
+
+
+@pytest.mark.parametrize('selections, year_range', [
+    ({}, None),
+    ({'Gender': ['male']}, None),
+    ({'Gender': ['male', 'female'], 'Ethnicity': ['Chinese']}, (1990, 2000)),
+    ({'Ethnicity': ['Malay', 'Indian']}, (2023, 2023)),
+    ({'Gender': []}, None),
+    ({'Gender': ['unknown']}, (1970, 2030)),
+])
+def test_positions_match_a_scan(df, selections, year_range):
+    index = FilterIndex(df, COLUMNS, 'Year')
+    positions = index.positions(selections, year_range)
+    np.testing.assert_array_equal(positions, np.flatnonzero(expected_mask(df, selections, year_range)))
+
+
+def test_filtered_totals_match_groupby(df):
+    index = FilterIndex(df, COLUMNS, 'Year')
+    selections = {'Gender': ['female'], 'Ethnicity': ['Malay', 'Chinese']}
+    filtered = index.filter(df, selections, (1980, 2010))
+    expected = df[expected_mask(df, selections, (1980, 2010))]
+    pd.testing.assert_series_equal(
+        filtered.groupby(['Year', 'Ethnicity'], observed=True)['Population'].sum(),
+        expected.groupby(['Year', 'Ethnicity'], observed=True)['Population'].sum(),
+    )
+
+
+def test_values_in_order_of_first_appearance(df):
+    index = FilterIndex(df, COLUMNS, 'Year')
+    assert index.values('Gender') == list(df['Gender'].unique())
+    # Missing values are not a value to filter on
+    assert index.values('Ethnicity') == list(df['Ethnicity'].dropna().unique())
+
+
+def test_repeated_queries_are_memoized_and_read_only(df):
+    index = FilterIndex(df, COLUMNS, 'Year')
+    first = index.positions({'Gender': ['male', 'both']}, (2000, 2010))
+    # Same selection in another order
+    second = index.positions({'Gender': ['both', 'male']}, [2000, 2010])
+    assert second is first
+    with pytest.raises(ValueError):
+        first[0] = 0
+
+
+def test_empty_frame_has_no_year_bounds():
+    empty = pd.DataFrame({
+        'Gender': pd.Series([], dtype=object),
+        'Ethnicity': pd.Series([], dtype=object),
+        'Year': pd.Series([], dtype='int16'),
+    })
+    index = FilterIndex(empty, COLUMNS, 'Year')
+    assert index.year_bounds is None
+    assert len(index.positions({'Gender': ['male']}, (2000, 2010))) == 0
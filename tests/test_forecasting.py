@@ -0,0 +1,137 @@
+import concurrent.futures
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from forecasting import TrendForecaster, fit_trends, predict
+
+
+def test_fit_trends_matches_polyfit_per_group():
+    rng = np.random.default_rng(0)
+    years = np.arange(1970, 2021)
+    totals = 1000 + 25 * (years[:, None] - 1970) * rng.uniform(0.5, 2, 6) + rng.normal(0, 50, (len(years), 6))
+    # Gaps in some groups
+    totals[rng.random(totals.shape) < 0.2] = np.nan
+
+    coefficients = fit_trends(years, totals)
+    for group in range(totals.shape[1]):
+        present = ~np.isnan(totals[:, group])
+        slope, intercept = np.polyfit(years[present], totals[present, group], 1)
+        np.testing.assert_allclose(coefficients[:, group], [intercept, slope], rtol=1e-6)
+
+
+def test_fit_trends_degenerate_groups():
+    years = np.array([2000, 2001, 2002])
+    totals = np.array([[np.nan, 5.0], [np.nan, np.nan], [np.nan, np.nan]])
+    coefficients = fit_trends(years, totals)
+    # No data: no prediction; a single year: a flat one
+    assert np.isnan(predict(coefficients, years)[:, 0]).all()
+    np.testing.assert_allclose(coefficients[:, 1], [5.0, 0.0])
+
+
+def test_predict_evaluates_every_group():
+    coefficients = np.array([[1.0, 10.0], [2.0, -1.0]])
+    np.testing.assert_allclose(predict(coefficients, [0, 1, 2]), [[1, 10], [3, 9], [5, 8]])
+
+
+def test_forecaster_only_fits_missing_groups():
+    years = np.arange(2000, 2010)
+    frame = pd.DataFrame({'a': 2.0 * years, 'b': 3.0 * years + 1, 'c': -years + 5.0}, index=years)
+    requested = []
+
+    def yearly_totals(groups):
+        requested.append(list(groups))
+        return frame[groups]
+
+    forecaster = TrendForecaster()
+    first = forecaster.fit(['a', 'b'], 'state', 'v1', yearly_totals)
+    second = forecaster.fit(['b', 'c'], 'state', 'v1', yearly_totals)
+    assert requested == [['a', 'b'], ['c']]
+    np.testing.assert_allclose(first[:, 1], second[:, 0])
+    np.testing.assert_allclose(second, [[1.0, 5.0], [3.0, -1.0]], atol=1e-6)
+
+    # A new data version refits
+    forecaster.fit(['a'], 'state', 'v2', yearly_totals)
+    assert requested[-1] == ['a']
+
+
+@pytest.mark.parametrize('cache_size', [1, 2])
+def test_forecaster_cache_is_bounded(cache_size):
+    years = np.arange(2000, 2005)
+    frame = pd.DataFrame({group: years * 1.0 for group in 'abc'}, index=years)
+    forecaster = TrendForecaster(cache_size=cache_size)
+    for group in 'abc':
+        forecaster.fit([group], 'state', 'v1', lambda groups: frame[groups])
+    assert len(forecaster._coefficients) == cache_size
+
+
+def test_fit_trends_is_accurate_far_from_year_zero():
+    # An exact line, at years where raw sums of squares lose the slope
+    years = np.arange(2_000_000, 2_000_050, dtype=float)
+    totals = (5e6 + 3.25 * (years - years[0]))[:, None]
+    coefficients = fit_trends(years, totals)
+    np.testing.assert_allclose(predict(coefficients, years), totals, rtol=1e-9)
+    assert coefficients[1, 0] == pytest.approx(3.25, rel=1e-9)
+
+
+def test_concurrent_fits_with_a_small_cache():
+    years = np.arange(2000, 2010)
+    frame = pd.DataFrame({group: years * float(i + 1) for i, group in enumerate('abcdefgh')}, index=years)
+    forecaster = TrendForecaster(cache_size=2)
+
+    def fit_many(offset):
+        for i in range(200):
+            groups = list('abcdefgh'[(offset + i) % 6:][:3])
+            result = forecaster.fit(groups, 'state', 'v1', lambda missing: frame[missing])
+            np.testing.assert_allclose(result[1], ['abcdefgh'.index(group) + 1 for group in groups], rtol=1e-6)
+
+    with concurrent.futures.ThreadPoolExecutor(8) as pool:
+        for future in [pool.submit(fit_many, offset) for offset in range(8)]:
+            future.result()
+    assert len(forecaster._coefficients) == 2
+
+
+def test_group_forecast_only_aggregates_what_it_fits():
+    import malaysia
+    from population_cube import RollupCube
+
+    years = np.arange(2000, 2010)
+    df = pd.DataFrame({
+        'Year': np.repeat(years, 3),
+        'Gender': 'male',
+        'Age_Group': 'all',
+        'Ethnicity': np.tile(['a', 'b', 'c'], len(years)),
+        'Sample_Population': np.column_stack([2.0 * years, 3.0 * years, -1.0 * years]).ravel(),
+    })
+    cube = RollupCube(df, malaysia.FILTER_COLUMNS, 'Year', 'Sample_Population')
+    selections = {'Gender': ['male'], 'Age_Group': ['all'], 'Ethnicity': ['a', 'b', 'c']}
+    year_filter = (2000, 2009)
+
+    totals = []
+    group_totals = malaysia.group_totals
+
+    def recording_totals(cube, column, groups, *args):
+        totals.append(list(groups))
+        return group_totals(cube, column, groups, *args)
+
+    def forecast(groups, future_years):
+        return malaysia.group_forecast(
+            cube, 'Ethnicity', groups, selections, year_filter, ('test', 'group_forecast'), 'v1', future_years,
+        )
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(malaysia, 'group_totals', recording_totals)
+        history, predicted = forecast(['a', 'b'], np.arange(2010, 2015))
+        assert totals == [['a', 'b'], ['a', 'b']]
+        np.testing.assert_allclose(history['a'], 2.0 * years)
+        np.testing.assert_allclose(predicted, np.arange(2010, 2015)[:, None] * [2.0, 3.0], rtol=1e-9)
+
+        # A new horizon aggregates nothing
+        _, predicted = forecast(['a', 'b'], np.arange(2010, 2030))
+        assert len(totals) == 2
+        assert predicted.shape == (20, 2)
+
+        # An extra group is only aggregated for itself to be fitted
+        forecast(['a', 'b', 'c'], np.arange(2010, 2015))
+        assert totals[2:] == [['a', 'b', 'c'], ['c']]
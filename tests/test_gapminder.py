@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fixtures import gapminder
+from gapminder import COMPARISON_METRICS, GapminderStore
+
+
+@pytest.fixture(scope='module')
+def df():
+    rng = np.random.default_rng(0)
+    df = gapminder(1, rng)
+    # Gaps in some countries' years, and categorical names like the dataset
+    df = df.drop(rng.choice(len(df), len(df) // 20, replace=False)).reset_index(drop=True)
+    return df.astype({'country': 'category', 'continent': 'category'})
+
+
+@pytest.fixture(scope='module')
+def store(df):
+    return GapminderStore(df)
+
+
+def _wide(df, metric):
+    values = df.assign(gdp=df['pop'] * df['gdpPercap'])
+    wide = values.pivot_table(index='year', columns='country', values=metric, aggfunc='mean', observed=True)
+    return wide.set_axis(wide.columns.astype(object), axis=1)
+
+
+def test_selectors_match_pandas(df, store):
+    assert store.continents() == list(df['continent'].unique())
+    for continent in store.continents():
+        assert store.countries(continent) == list(df.loc[df['continent'] == continent, 'country'].unique())
+    assert store.countries('Atlantis') == []
+    assert store.all_countries() == sorted(df['country'].unique())
+
+
+def test_metric_and_rows_match_pandas(df, store):
+    country = df['country'].iloc[0]
+    rows = df[df['country'] == country].sort_values('year', kind='stable')
+    pd.testing.assert_frame_equal(store.rows(country), rows)
+    pd.testing.assert_frame_equal(store.rows(country, (1960, 1990)), rows[rows['year'].between(1960, 1990)])
+
+    expected = rows.groupby('year')['lifeExp'].mean()
+    pd.testing.assert_series_equal(store.metric(country, 'lifeExp'), expected, check_names=False)
+    pd.testing.assert_series_equal(
+        store.metric(country, 'lifeExp', (1960, 1990)), expected.loc[1960:1990], check_names=False,
+    )
+    assert store.year_bounds(country) == (rows['year'].min(), rows['year'].max())
+
+
+@pytest.mark.parametrize('metric', COMPARISON_METRICS)
+def test_values_match_a_pivot(df, store, metric):
+    countries = store.all_countries()[::7]
+    expected = _wide(df, metric)[countries]
+    pd.testing.assert_frame_equal(store.comparison(countries, metric), expected, check_names=False, check_dtype=False)
+
+
+@pytest.mark.parametrize('metric', COMPARISON_METRICS)
+def test_growth_matches_pct_change(df, store, metric):
+    wide = _wide(df, metric)
+    spans = pd.Series(wide.index, index=wide.index).diff()
+    change = wide.pct_change(fill_method=None)
+    expected = ((1 + change).pow(1 / spans, axis=0) - 1) * 100
+
+    countries = store.all_countries()[::5]
+    actual = store.comparison(countries, metric, 'growth')
+    pd.testing.assert_frame_equal(
+        actual, expected[countries].dropna(how='all'), check_names=False, check_dtype=False,
+    )
+
+
+@pytest.mark.parametrize('metric', COMPARISON_METRICS)
+def test_ranks_match_pandas_rank(df, store, metric):
+    wide = _wide(df, metric)
+    expected = wide.rank(axis=1, ascending=False, method='first')
+    countries = store.all_countries()[::3]
+    actual = store.comparison(countries, metric, 'rank')
+    pd.testing.assert_frame_equal(actual, expected[countries].dropna(how='all'), check_names=False, check_dtype=False)
+
+
+def test_comparison_array_keeps_the_order_given(store):
+    first, second = store.all_countries()[:2]
+    years, countries, array = store.comparison_array([second, 'Atlantis', first], ['gdp', 'pop'])
+    assert countries == [second, first]
+    assert array.shape == (len(years), 2, 2)
+    _, _, swapped = store.comparison_array([first, second], ['pop', 'gdp'])
+    np.testing.assert_array_equal(array, swapped[:, ::-1, ::-1])
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from geo import (
+    GridIndex, bounding_box, cell_size_for_zoom, compact_points, grid_clusters, view_bbox, zoom_for_bbox,
+)
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(0)
+    n = 5_000
+    return pd.DataFrame({
+        'lon': rng.uniform(-124, -67, n),
+        'lat': rng.uniform(25, 49, n),
+        'cnt': rng.lognormal(8, 2, n).round(),
+    })
+
+
+def _inside(points, bbox):
+    west, south, east, north = bbox
+    mask = points['lon'].between(west, east) & points['lat'].between(south, north)
+    return np.flatnonzero(mask.to_numpy())
+
+
+@pytest.mark.parametrize('cell_size', [0.5, 1.0, 7.0])
+@pytest.mark.parametrize('bbox', [
+    (-100, 30, -90, 40),
+    (-124, 25, -67, 49),
+    (-71.3, 41.1, -71.2, 41.2),
+    # Partly and entirely outside the points
+    (-130, 20, -110, 30),
+    (0, 0, 10, 10),
+])
+def test_query_matches_a_scan(points, cell_size, bbox):
+    index = GridIndex(points['lon'], points['lat'], cell_size)
+    np.testing.assert_array_equal(index.query(bbox), _inside(points, bbox))
+
+
+def test_query_of_no_points():
+    index = GridIndex([], [], 1.0)
+    assert index.bbox is None
+    assert len(index.query((-10, -10, 10, 10))) == 0
+
+
+@pytest.mark.parametrize('zoom', [2, 4, 6])
+def test_clusters_match_a_groupby(points, zoom):
+    cell_size = cell_size_for_zoom(zoom)
+    clusters = grid_clusters(points['lon'], points['lat'], points['cnt'], cell_size)
+    assert clusters['count'].sum() == len(points)
+    assert clusters['weight'].sum() == pytest.approx(points['cnt'].sum())
+
+    cells = points.assign(
+        column=np.floor(points['lon'] / cell_size), row=np.floor(points['lat'] / cell_size),
+        lon_weighted=points['lon'] * points['cnt'], lat_weighted=points['lat'] * points['cnt'],
+    ).groupby(['column', 'row'], sort=False)[['cnt', 'lon_weighted', 'lat_weighted']].sum()
+    assert len(clusters) == len(cells)
+    expected = pd.DataFrame({
+        'lon': cells['lon_weighted'] / cells['cnt'], 'lat': cells['lat_weighted'] / cells['cnt'],
+    }).sort_values(['lon', 'lat']).reset_index(drop=True)
+    actual = clusters[['lon', 'lat']].sort_values(['lon', 'lat']).reset_index(drop=True)
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_cluster_of_zero_weights_is_the_plain_mean():
+    clusters = grid_clusters([0.1, 0.3], [0.2, 0.4], [0, 0], cell_size=1.0)
+    assert clusters[['lon', 'lat', 'weight', 'count']].iloc[0].tolist() == pytest.approx([0.2, 0.3, 0.0, 2])
+
+
+def test_compact_points_keeps_only_the_layer_columns(points):
+    compact = compact_points(points.assign(extra='x').iloc[::-1].astype({'lat': 'float32'}), ['lon', 'lat'])
+    assert list(compact.columns) == ['lon', 'lat']
+    assert compact.index.equals(pd.RangeIndex(len(points)))
+    np.testing.assert_allclose(compact['lon'], points['lon'].iloc[::-1].round(4))
+    assert compact['lat'].dtype == np.float64
+    assert (compact['lat'] == compact['lat'].round(4)).all()
+
+
+def test_fitted_zoom_shows_the_whole_box(points):
+    bbox = bounding_box(points['lon'], points['lat'])
+    zoom = zoom_for_bbox(bbox)
+    west, south, east, north = bbox
+    view = view_bbox((south + north) / 2, (west + east) / 2, zoom)
+    assert view[0] <= west and view[2] >= east
+    # Half a zoom level further in no longer shows its full width
+    closer = view_bbox((south + north) / 2, (west + east) / 2, zoom + 0.5)
+    assert closer[0] > west
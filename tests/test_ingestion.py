@@ -0,0 +1,98 @@
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+import datasets
+import malaysia
+from data_sources import register_stub
+from fixtures import dosm_population
+from ingestion import PartitionStore, concat_frames, partition_rows
+
+
+def test_partition_rows_groups_positions_by_key():
+    keys = pd.Series(['b', None, 'a', 'b', None, 'a', 'c'])
+    partitions = partition_rows(keys)
+    assert [key for key, _ in partitions] == [None, 'a', 'b', 'c']
+    assert [list(positions) for _, positions in partitions] == [[1, 4], [2, 5], [0, 3], [6]]
+
+
+def test_concat_frames_merges_categories():
+    first = pd.DataFrame({'Gender': pd.Categorical(['male']), 'Population': [1.0]})
+    second = pd.DataFrame({'Gender': pd.Categorical(['female', 'male']), 'Population': [2.0, 3.0]})
+    combined = concat_frames([first, second.iloc[:0], second])
+    assert list(combined['Gender'].cat.categories) == ['female', 'male']
+    assert list(combined['Gender']) == ['male', 'female', 'male']
+
+
+def test_store_ignores_other_schema_versions(tmp_path):
+    store = PartitionStore(str(tmp_path), schema_version=1)
+    store.write('2020-01-01', 'abc', pd.DataFrame({'x': [1]}))
+    store.commit({'partitions': {'2020-01-01': {'fingerprint': 'abc', 'rows': 1}}})
+    assert list(store.manifest()['partitions']) == ['2020-01-01']
+    assert PartitionStore(str(tmp_path), schema_version=2).manifest()['partitions'] == {}
+
+
+def test_store_commit_removes_replaced_partitions(tmp_path):
+    store = PartitionStore(str(tmp_path), schema_version=1)
+    store.write('2020-01-01', 'old', pd.DataFrame({'x': [1]}))
+    store.write('2020-01-01', 'new', pd.DataFrame({'x': [2]}))
+    store.commit({'partitions': {'2020-01-01': {'fingerprint': 'new', 'rows': 1}}})
+    assert sorted(os.listdir(tmp_path)) == ['2020-01-01-new.parquet', 'manifest.json']
+    assert store.read('2020-01-01', 'new')['x'].tolist() == [2]
+
+
+def _parquet(df):
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+def _comparable(df):
+    # Categories differ between one cleaning pass and merged partitions
+    df = df.astype({column: str for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)})
+    return df.sort_values(list(df.columns)).reset_index(drop=True)
+
+
+def test_new_release_only_cleans_new_and_changed_dates(monkeypatch):
+    release = dosm_population(1, np.random.default_rng(1))
+    source = {'body': _parquet(release)}
+    register_stub('malaysia_population', lambda: source['body'])
+    monkeypatch.setitem(datasets.SOURCES['malaysia_population'], 'ttl', 0)
+
+    cleaned = []
+    clean_population = malaysia.clean_population
+
+    def recording_clean(df):
+        cleaned.append(set(pd.to_datetime(df['date']).dropna().dt.normalize()))
+        return clean_population(df)
+
+    monkeypatch.setattr(malaysia, 'clean_population', recording_clean)
+    first = malaysia.load_population()
+    first_version = malaysia.population_version()
+    assert cleaned[-1] == set(release['date'].dropna())
+
+    # Next release: one more date, and a revised figure for an existing one
+    dates = release['date'].dropna().unique()
+    new_date, changed_date = dates.max() + pd.Timedelta(days=365), dates[10]
+    added = release[release['date'] == dates.max()].assign(date=new_date)
+    revised = release.copy()
+    revised.loc[revised['date'] == changed_date, 'population'] += 1
+    next_release = pd.concat([revised, added], ignore_index=True)
+    source['body'] = _parquet(next_release)
+
+    second = malaysia.load_population()
+    assert cleaned[-1] == {new_date, changed_date}
+    assert malaysia.population_version() != first_version
+    assert len(second) > len(first)
+
+    # Same rows as cleaning the whole release at once
+    expected, _ = clean_population(datasets.load_dataset('malaysia_population'))
+    pd.testing.assert_frame_equal(_comparable(second), _comparable(expected))
+
+    # An unchanged release cleans nothing
+    calls = len(cleaned)
+    source['body'] = _parquet(next_release)
+    malaysia.load_population()
+    assert len(cleaned) == calls
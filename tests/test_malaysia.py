@@ -0,0 +1,105 @@
+import pandas as pd
+import pytest
+
+from malaysia import AGE_GROUPS, ETHNICITY_GROUPS, clean_population
+
+
+# The row-wise classification the dashboard used before the lookup tables
+def classify_ethnicity(ethnicity):
+    if ethnicity in ['overall']:
+        return 'Overall'
+    elif ethnicity in ['bumi', 'bumi_malay']:
+        return 'Malay'
+    elif ethnicity == 'chinese':
+        return 'Chinese'
+    elif ethnicity == 'indian':
+        return 'Indian'
+    elif ethnicity in ['other', 'bumi_other', 'other_citizen', 'other_noncitizen']:
+        return 'Others'
+    else:
+        return 'Unknown'
+
+
+def classify_age_group(age):
+    if age == 'overall':
+        return 'Overall'
+    age_ranges = {
+        '18-24 (Gen Z)': ['15-19', '20-24'],
+        '25-40 (Millennial)': ['25-29', '30-34', '35-39'],
+        '41-56 (Gen X)': ['40-44', '45-49', '50-54', '55-59'],
+        '57+ (Baby Boomers)': ['60-64', '65-69', '70+', '70-74', '75-79', '80+', '80-84', '85+'],
+    }
+    for group, ranges in age_ranges.items():
+        if age in ranges:
+            return group
+    return 'Unknown'
+
+
+# Every code of the lookup tables, the totals, and codes the old rules did not
+# know (the under-15s, misspellings, missing values)
+ETHNICITY_CODES = list(ETHNICITY_GROUPS) + ['unknown', 'Chinese', 'bumi ', None]
+AGE_CODES = list(AGE_GROUPS) + ['0-4', '5-9', '10-14', '85-89', 'Overall', None]
+
+
+@pytest.mark.parametrize('code', ETHNICITY_CODES)
+def test_ethnicity_lookup_matches_the_row_rules(code):
+    assert ETHNICITY_GROUPS.get(code, 'Unknown') == classify_ethnicity(code)
+
+
+@pytest.mark.parametrize('code', AGE_CODES)
+def test_age_lookup_matches_the_row_rules(code):
+    assert AGE_GROUPS.get(code, 'Unknown') == classify_age_group(code)
+
+
+def _old_clean(df_raw):
+    # The dashboard's cleaning before the lookup tables, row by row
+    df = df_raw.copy()
+    df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    df['ethnicity'] = df['ethnicity'].apply(classify_ethnicity)
+    df['age_group'] = df['age'].apply(classify_age_group)
+    df = df[(df['ethnicity'] != 'Unknown') & (df['age_group'] != 'Unknown')]
+    return df.drop_duplicates()
+
+
+def test_clean_population_matches_the_row_rules():
+    rows = [
+        (date, sex, age, ethnicity, float(i))
+        for i, (date, sex, age, ethnicity) in enumerate(
+            (date, sex, age, ethnicity)
+            for date in ['2000-01-01', '2015-06-30', 'not a date', None]
+            for sex in ['both', 'female']
+            for age in AGE_CODES[::2]
+            for ethnicity in ETHNICITY_CODES
+        )
+    ]
+    df_raw = pd.DataFrame(rows, columns=['date', 'sex', 'age', 'ethnicity', 'population'])
+    # Exact duplicates are dropped
+    df_raw = pd.concat([df_raw, df_raw.head(5)], ignore_index=True)
+
+    cleaned, stats = clean_population(df_raw)
+    old = _old_clean(df_raw)
+
+    # Rows without a valid date are counted, and left out of the cleaned data
+    assert stats['invalid_dates'] == old['date'].isna().sum() > 0
+    old = old[old['date'].notna()]
+
+    actual = pd.DataFrame({
+        'Year': cleaned['Year'].astype(int),
+        'Gender': cleaned['Gender'].astype(str),
+        'Age': cleaned['Age'].astype(str),
+        'Ethnicity': cleaned['Ethnicity'].astype(str),
+        'Age_Group': cleaned['Age_Group'].astype(str),
+        'Sample_Population': cleaned['Sample_Population'],
+    })
+    expected = pd.DataFrame({
+        'Year': old['date'].dt.year.astype(int),
+        'Gender': old['sex'],
+        'Age': old['age'],
+        'Ethnicity': old['ethnicity'],
+        'Age_Group': old['age_group'],
+        'Sample_Population': old['population'],
+    })
+    pd.testing.assert_frame_equal(
+        actual.sort_values('Sample_Population').reset_index(drop=True),
+        expected.sort_values('Sample_Population').reset_index(drop=True),
+    )
@@ -0,0 +1,64 @@
+import types
+
+import numpy as np
+import pytest
+from streamlit.runtime import Runtime
+from streamlit.runtime.stats import CacheStat
+from streamlit.testing.v1 import AppTest
+
+from data_sources import register_stub
+from datasets import load_table
+from fixtures import gapminder
+from memory_report import memory_report, session_stats
+
+
+@pytest.fixture(scope='module')
+def source():
+    register_stub('gapminder', gapminder(1, np.random.default_rng(0)).to_csv(index=False).encode())
+
+
+def table_page():
+    import streamlit as st
+    from datasets import load_table
+
+    st.session_state['table_id'] = id(load_table('gapminder'))
+
+
+def test_sessions_share_the_mapped_tables(source):
+    first = AppTest.from_function(table_page)
+    first.run()
+    report = memory_report()
+    assert report['datasets']['gapminder']['mapped_bytes'] == load_table('gapminder').nbytes > 0
+    assert report['process_rss_bytes'] > 0
+    # Outside a running server there are no session statistics
+    assert report['sessions'] is None and report['per_session_bytes'] is None
+
+    # A second session gets the same table, and the readout does not grow
+    second = AppTest.from_function(table_page)
+    second.run()
+    assert first.session_state['table_id'] == second.session_state['table_id'] == id(load_table('gapminder'))
+    assert memory_report()['mapped_table_bytes'] == report['mapped_table_bytes']
+
+
+def _runtime(monkeypatch, runtime):
+    monkeypatch.setattr(Runtime, 'exists', staticmethod(lambda: True))
+    monkeypatch.setattr(Runtime, 'instance', staticmethod(lambda: runtime))
+
+
+def test_session_stats_from_the_runtime(monkeypatch):
+    stats = [CacheStat('st_session_state', '', 3000), CacheStat('st_cache_data', '', 5000),
+             CacheStat('st_session_state', '', 1000)]
+    _runtime(monkeypatch, types.SimpleNamespace(
+        _session_mgr=types.SimpleNamespace(num_active_sessions=lambda: 2),
+        stats_mgr=types.SimpleNamespace(get_stats=lambda: stats),
+    ))
+    assert session_stats() == (2, 4000)
+    report = memory_report()
+    assert (report['sessions'], report['session_state_bytes'], report['per_session_bytes']) == (2, 4000, 2000)
+
+
+def test_session_stats_without_the_session_manager(monkeypatch):
+    # Private to Streamlit, so it may be gone in another version
+    _runtime(monkeypatch, types.SimpleNamespace(stats_mgr=types.SimpleNamespace(get_stats=lambda: [])))
+    assert session_stats() is None
+    assert memory_report()['sessions'] is None
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import paged_table
+from paged_table import TableIndex, table_index
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(0)
+    n = 2_000
+    value = rng.integers(0, 50, n).astype(float)
+    value[rng.random(n) < 0.05] = np.nan
+    return pd.DataFrame({
+        'state': rng.choice(['Selangor', 'Johor', 'Sabah', None], n),
+        'value': value,
+        'name': [f'name {i}' for i in range(n)],
+    })
+
+
+def _expected(df, sort=None, descending=False, filter_column=None, filter_values=()):
+    rows = df if filter_column is None else df[df[filter_column].isin(filter_values)]
+    if sort is not None:
+        rows = rows.sort_values(sort, ascending=not descending, kind='stable', na_position='last')
+    return rows
+
+
+@pytest.mark.parametrize('query', [
+    (None, False, None, ()),
+    ('value', False, None, ()),
+    ('value', True, None, ()),
+    ('state', False, None, ()),
+    ('state', True, None, ()),
+    (None, False, 'state', ('Sabah', 'Johor')),
+    ('value', True, 'state', ('Selangor',)),
+    ('name', False, 'state', ('Nowhere',)),
+])
+def test_windows_match_pandas(df, query):
+    index = TableIndex(df)
+    positions = index.positions(*query)
+    expected = _expected(df, *query)
+    for start in (0, 50, len(positions) - 10):
+        window = slice(max(start, 0), max(start, 0) + 50)
+        pd.testing.assert_frame_equal(index.window(positions[window]), expected.iloc[window])
+
+
+@pytest.mark.parametrize('query', [
+    (None, False, None, ()),
+    ('value', True, None, ()),
+    (None, False, 'state', ('Sabah', 'Johor')),
+    ('name', False, 'state', ('Selangor',)),
+])
+def test_base_positions_limit_the_rows(df, query):
+    index = TableIndex(df)
+    base = np.flatnonzero(df['value'].to_numpy() > 20)
+    positions = index.positions(*query, base=base)
+    expected = _expected(df.take(base), *query)
+    pd.testing.assert_frame_equal(index.window(positions[:50]), expected.iloc[:50])
+    assert len(positions) == len(expected)
+
+
+def test_arrow_table_gives_the_same_windows(df):
+    frame_index, arrow_index = TableIndex(df), TableIndex(pa.Table.from_pandas(df, preserve_index=False))
+    assert arrow_index.rows == len(df)
+    assert arrow_index.columns == list(df.columns)
+    query = ('value', True, 'state', ('Sabah', 'Johor'))
+    positions = arrow_index.positions(*query)
+    np.testing.assert_array_equal(positions, frame_index.positions(*query))
+    pd.testing.assert_frame_equal(
+        arrow_index.window(positions[:50]), frame_index.window(positions[:50]).reset_index(drop=True),
+        check_dtype=False,
+    )
+
+
+def test_filter_values(df, monkeypatch):
+    index = TableIndex(df)
+    assert sorted(index.filter_values('state')) == ['Johor', 'Sabah', 'Selangor']
+    # Mostly distinct columns cannot be filtered on
+    monkeypatch.setattr(paged_table, 'FILTER_MAX_VALUES', 100)
+    assert TableIndex(df).filter_values('name') is None
+
+
+def test_indexes_are_shared_by_name_and_version(df, monkeypatch):
+    monkeypatch.setattr(paged_table, '_indexes', paged_table.OrderedDict())
+    monkeypatch.setattr(paged_table, 'INDEX_CACHE_SIZE', 2)
+    first = table_index('table', 'v1', df)
+    assert table_index('table', 'v1', df) is first
+    assert table_index('table', 'v2', df) is not first
+    table_index('other', 'v1', df)
+    # Least recently used first
+    assert list(paged_table._indexes) == [('table', 'v2'), ('other', 'v1')]
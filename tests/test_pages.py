@@ -0,0 +1,242 @@
+import functools
+import inspect
+import io
+import os
+from collections import Counter
+
+import numpy as np
+import pytest
+from streamlit.runtime.fragment import MemoryFragmentStorage
+from streamlit.runtime.scriptrunner_utils.script_requests import RerunData
+from streamlit.testing.v1 import AppTest, local_script_runner
+
+import gapminder
+import malaysia
+import paged_table
+import warmup
+from data_sources import register_stub
+from datasets import ROOT_DIR
+from fixtures import dosm_population, gapminder as gapminder_fixture
+
+PAGES_DIR = os.path.join(ROOT_DIR, 'app', 'pages')
+
+
+def _parquet(df):
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def fragments(monkeypatch):
+    """
+    AppTest reruns the whole page on every change, while a browser asks
+    for a rerun of the fragment the changed widget is in. This keeps the
+    fragments of the page between runs, and returns a function to rerun one
+    of them alone, by name, with the current widget values.
+    """
+    monkeypatch.setattr(warmup, 'ENABLED', False)
+    storage = MemoryFragmentStorage()
+    monkeypatch.setattr(local_script_runner, 'MemoryFragmentStorage', lambda: storage)
+
+    def rerun(at, name):
+        fragment_id, = [
+            fragment_id for fragment_id, fragment in storage._fragments.items()
+            if inspect.getclosurevars(fragment).nonlocals['non_optional_func'].__name__ == name
+        ]
+        with monkeypatch.context() as m:
+            m.setattr(local_script_runner, 'RerunData', functools.partial(
+                RerunData, fragment_id_queue=[fragment_id], is_fragment_scoped_rerun=True,
+            ))
+            at.run()
+        assert not at.exception
+        return at
+
+    return rerun
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """
+    Counter of the calls to the functions wrapped with calls.wrap(owner,
+    name, key), by name, or by key(*args, **kwargs) if given.
+    """
+    counter = Counter()
+
+    def wrap(owner, name, key=None):
+        function = getattr(owner, name)
+
+        @functools.wraps(function)
+        def counted(*args, **kwargs):
+            counter[key(*args, **kwargs) if key else name] += 1
+            return function(*args, **kwargs)
+
+        monkeypatch.setattr(owner, name, counted)
+
+    counter.wrap = wrap
+    return counter
+
+
+@pytest.fixture
+def malaysia_page(fragments):
+    """
+    The Malaysian population page, without the warm-up, on a fixture of
+    the population data.
+    """
+    register_stub('malaysia_population', _parquet(dosm_population(1, np.random.default_rng(0))))
+    return AppTest.from_file(os.path.join(PAGES_DIR, '4_Malaysian_Population_🇲🇾.py'), default_timeout=60)
+
+
+@pytest.fixture
+def continents_page(fragments):
+    """
+    The continents page, without the warm-up, on a fixture of the gapminder
+    data.
+    """
+    register_stub('gapminder', gapminder_fixture(1, np.random.default_rng(0)).to_csv(index=False).encode())
+    return AppTest.from_file(os.path.join(PAGES_DIR, '2_Continents_Population_🌍.py'), default_timeout=60)
+
+
+def _run(at):
+    at.run()
+    assert not at.exception
+    return at
+
+
+def _session_state_bytes(at):
+    # The same statistic memory_report.session_stats() sums over the sessions
+    return sum(stat.byte_length for stat in at.session_state._state.get_stats())
+
+
+def test_session_memory_stays_flat_across_filter_states(malaysia_page, monkeypatch):
+    # Every filter state renders its charts: fill a smaller cache
+    monkeypatch.setattr(paged_table, 'SESSION_CACHE_SIZE', 4)
+    at = _run(malaysia_page)
+    df = malaysia.load_population()
+    start, end = at.sidebar.slider[0].value
+
+    readouts = []
+    smallest_copy = None
+    for i in range(2 * paged_table.SESSION_CACHE_SIZE):
+        at.sidebar.slider[0].set_value((start, end - i)).run()
+        assert not at.exception
+        readouts.append(_session_state_bytes(at))
+        rows = (df['Year'] >= start) & (df['Year'] <= end - i)
+        copy_bytes = df[rows].memory_usage(deep=True).sum()
+        smallest_copy = copy_bytes if smallest_copy is None else min(smallest_copy, copy_bytes)
+
+    # The session only holds page slices and positions, never the filtered
+    # rows: with its cache full, each new filter state costs far less than
+    # one copy of them
+    filled = readouts[paged_table.SESSION_CACHE_SIZE:]
+    assert filled[-1] - filled[0] < smallest_copy / 10
+    cache = at.session_state['_paged_table_cache']
+    assert len(cache) <= paged_table.SESSION_CACHE_SIZE
+    assert all(len(entry) <= paged_table.PAGE_ROWS for entry in cache.values())
+
+    # The filtered table is indexed once, over the shared cleaned data
+    indexes = [index for (name, _), index in paged_table._indexes.items() if name == 'malaysia_filtered']
+    assert len(indexes) == 1
+    assert indexes[0].data is df
+
+
+
+
+def _widget(at, kind, label):
+    widget, = [widget for widget in at.get(kind) if widget.label == label]
+    return widget
+
+
+def _count_page_level_malaysia(calls):
+    # The filter and the dashboard charts are worked out by the page itself
+    calls.wrap(malaysia, 'population_filter_index')
+    calls.wrap(malaysia, 'population_charts')
+
+
+def test_full_run_recomputes_the_malaysian_page(malaysia_page, calls):
+    _count_page_level_malaysia(calls)
+    _run(malaysia_page)
+    assert calls['population_filter_index'] == calls['population_charts'] == 1
+
+
+def test_structure_section_reruns_alone(malaysia_page, fragments, calls):
+    import population_analytics
+
+    _count_page_level_malaysia(calls)
+    calls.wrap(population_analytics, 'structure_charts')
+    at = _run(malaysia_page)
+    calls.clear()
+    _widget(at, 'selectbox', "Break down by:").select_index(1)
+    fragments(at, 'structure_section')
+
+    assert [header.value for header in at.header] == ["Population Structure"]
+    assert calls['structure_charts'] == 1
+    assert calls['population_filter_index'] == calls['population_charts'] == 0
+
+
+def test_prediction_years_apply_on_submit(malaysia_page, fragments, calls):
+    _count_page_level_malaysia(calls)
+    # Forecasts by (column, first year, last year)
+    calls.wrap(malaysia, 'group_forecast', key=lambda *args: (args[1], int(args[-1][0]), int(args[-1][-1])))
+    at = _run(malaysia_page)
+    calls.clear()
+    start_year = _widget(at, 'number_input', "Select Start Year:")
+    end_year = _widget(at, 'number_input', "Select End Year:")
+    # Held by the browser until the form is submitted
+    assert start_year.form_id == end_year.form_id == 'prediction_years'
+    first, last = int(start_year.value), int(end_year.value)
+
+    age_groups = _widget(at, 'multiselect', "Select Age Groups for Prediction:")
+    age_groups.set_value(age_groups.options[:2])
+    fragments(at, 'prediction_section')
+    assert calls[('Age_Group', first, last)] == 1
+
+    # The end year follows a new start year, ten years on by default
+    _widget(at, 'number_input', "Select Start Year:").set_value(first + 5)
+    _widget(at, 'button', "Update Years").click()
+    fragments(at, 'prediction_section')
+    assert calls[('Age_Group', first + 5, first + 15)] == 1
+    assert [header.value for header in at.header] == ["Predict Future Population Growth"]
+    assert calls['population_filter_index'] == calls['population_charts'] == 0
+
+
+def _count_page_level_continents(calls):
+    calls.wrap(gapminder, 'gapminder_store')
+    calls.wrap(
+        gapminder.GapminderStore, 'metric',
+        key=lambda store, country, metric, year_range=None: 'metric' if year_range is None else 'filtered metric',
+    )
+    calls.wrap(gapminder.GapminderStore, 'comparison')
+
+
+def test_full_run_recomputes_the_continents_page(continents_page, calls):
+    _count_page_level_continents(calls)
+    _run(continents_page)
+    assert calls['gapminder_store'] == 1
+    assert calls['metric'] == calls['filtered metric'] == 3
+    assert calls['comparison'] > 0
+
+
+def test_year_section_reruns_alone(continents_page, fragments, calls):
+    _count_page_level_continents(calls)
+    at = _run(continents_page)
+    calls.clear()
+    year_range = _widget(at, 'slider', "Select Year Range")
+    start, end = year_range.value
+    year_range.set_value((start + 10, end))
+    fragments(at, 'year_section')
+
+    assert calls['filtered metric'] == 3
+    assert calls['gapminder_store'] == calls['metric'] == calls['comparison'] == 0
+
+
+def test_comparison_section_reruns_alone(continents_page, fragments, calls):
+    _count_page_level_continents(calls)
+    at = _run(continents_page)
+    calls.clear()
+    countries = _widget(at, 'multiselect', "Select countries to compare")
+    countries.set_value(countries.options[:3])
+    fragments(at, 'comparison_section')
+
+    assert calls['comparison'] == len(_widget(at, 'multiselect', "Select metrics to compare").value)
+    assert calls['gapminder_store'] == calls['metric'] == calls['filtered metric'] == 0
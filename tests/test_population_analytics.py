@@ -0,0 +1,48 @@
+import warnings
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import pytest
+
+from figures import LineChart
+from fixtures import dosm_population
+from population_analytics import PopulationAnalytics
+
+
+@pytest.fixture(scope='module')
+def analytics():
+    return PopulationAnalytics(dosm_population(1, np.random.default_rng(0)))
+
+
+@pytest.mark.parametrize('by, total, parts', [
+    ('Gender', ['both'], ['male', 'female']),
+    ('Ethnicity', ['Overall'], ['Malay', 'Chinese', 'Indian', 'Others']),
+    ('Age_Group', ['Overall'], ['18-24 (Gen Z)', '25-40 (Millennial)', '41-56 (Gen X)', '57+ (Baby Boomers)']),
+])
+def test_total_alone_stands_for_its_parts(analytics, by, total, parts):
+    totals = analytics.totals(by, {by: total})
+    assert len(totals.columns) and (totals.to_numpy() > 0).all()
+    pd.testing.assert_frame_equal(totals[parts], analytics.totals(by, {by: parts})[parts])
+
+
+def test_total_with_a_part_keeps_the_selection(analytics):
+    # 'bumi' (Malay) is a total of Malay and Others codes: Malay alone does
+    # not bring in the Others code
+    totals = analytics.totals('Ethnicity', {'Ethnicity': ['Malay']})
+    assert list(totals.columns) == ['Malay']
+
+
+def test_line_chart_without_lines_has_no_legend():
+    chart = LineChart(pd.DataFrame({'Year': [], 'Share': [], 'Gender': []}), x='Year', y='Share', series='Gender',
+                      title="", xlabel="", ylabel="")
+    fig, ax = plt.subplots()
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        chart.draw(ax)
+    assert ax.get_legend() is None
+    plt.close(fig)
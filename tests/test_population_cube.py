@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from population_cube import RollupCube
+
+DIMENSIONS = ['Gender', 'Age_Group', 'Ethnicity']
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(0)
+    n = 20_000
+    return pd.DataFrame({
+        'Year': rng.integers(1970, 2024, n).astype('int16'),
+        'Gender': pd.Categorical(rng.choice(['male', 'female'], n)),
+        'Age_Group': pd.Categorical(rng.choice(['18-24 (Gen Z)', '25-40 (Millennial)', 'Overall'], n)),
+        'Ethnicity': pd.Categorical(rng.choice(['Malay', 'Chinese', 'Indian', 'Others'], n)),
+        'Sample_Population': rng.uniform(0, 500, n),
+    })
+
+
+def _row_rollup(df, by, selections, year_range):
+    mask = df['Year'].between(*year_range) if year_range else pd.Series(True, index=df.index)
+    for column, selected in selections.items():
+        mask &= df[column].isin(selected)
+    return df[mask].groupby(by, observed=True)['Sample_Population'].agg(['sum', 'count', 'mean']).reset_index()
+
+
+@pytest.mark.parametrize('by, selections, year_range', [
+    (['Year'], {}, None),
+    (['Year', 'Ethnicity'], {'Gender': ['female']}, (1990, 2010)),
+    (['Age_Group'], {'Ethnicity': ['Malay', 'Indian'], 'Age_Group': ['Overall', '18-24 (Gen Z)']}, (2000, 2000)),
+    (['Year', 'Gender'], {'Gender': []}, None),
+])
+def test_rollup_matches_row_groupby(df, by, selections, year_range):
+    cube = RollupCube(df, DIMENSIONS, 'Year', 'Sample_Population')
+    result = cube.rollup(by, selections, year_range)
+    expected = _row_rollup(df, by, selections, year_range)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_categorical=False)
+
+
+def test_cube_from_partition_cells_matches_whole_cube(df):
+    whole = RollupCube(df, DIMENSIONS, 'Year', 'Sample_Population')
+    # Partitions sharing groups, like dates of the same year
+    shuffled = df.sample(frac=1, random_state=0)
+    parts = [
+        RollupCube.aggregate(shuffled.iloc[positions], DIMENSIONS, 'Year', 'Sample_Population')
+        for positions in np.array_split(np.arange(len(df)), 4)
+    ]
+    merged = RollupCube.from_cells(parts, DIMENSIONS, 'Year')
+    selections = {'Gender': ['male'], 'Ethnicity': ['Chinese', 'Others']}
+    pd.testing.assert_frame_equal(
+        merged.rollup(['Year', 'Age_Group'], selections, (1980, 2000)),
+        whole.rollup(['Year', 'Age_Group'], selections, (1980, 2000)),
+        check_dtype=False, check_categorical=False,
+    )
+
+
+def test_cube_has_one_cell_per_group(df):
+    cube = RollupCube(df, DIMENSIONS, 'Year', 'Sample_Population')
+    assert len(cube.data) == len(df.groupby(['Year'] + DIMENSIONS, observed=True))
+    assert cube.data['count'].sum() == len(df)
@@ -0,0 +1,102 @@
+import types
+
+import numpy as np
+import pytest
+import streamlit.runtime.scriptrunner as scriptrunner
+
+import profiler
+from profiler import count, current_records, profiled_fragment, read_log, recording, stage, summarize
+
+
+@pytest.fixture
+def run_context(tmp_path, monkeypatch):
+    """
+    Profiler switched on, logging to a scratch file, in a fake script run
+    (a full run unless fragment ids are set).
+    """
+    monkeypatch.setattr(profiler, 'ENABLED', True)
+    monkeypatch.setattr(profiler, 'LOG_PATH', str(tmp_path / 'runs.jsonl'))
+    ctx = types.SimpleNamespace(session_state={}, widget_ids_this_run=set(), fragment_ids_this_run=[])
+    monkeypatch.setattr(scriptrunner, 'get_script_run_ctx', lambda suppress_warning=False: ctx)
+    return ctx
+
+
+def test_summarize_matches_numpy_percentiles():
+    rng = np.random.default_rng(0)
+    times, deltas = rng.uniform(0, 100, 50), rng.integers(-1000, 1000, 50)
+    runs = [
+        {'page': 'malaysia', 'stages': [{'stage': 'load', 'ms': ms, 'memory_delta': int(delta)}],
+         'cache': {'charts': [i % 2, 1]}}
+        for i, (ms, delta) in enumerate(zip(times, deltas))
+    ]
+    stages, caches = summarize(runs)
+    assert list(stages) == ['malaysia: load']
+    summary = stages['malaysia: load']
+    assert summary['runs'] == 50
+    for p in profiler.PERCENTILES:
+        assert summary[f'p{p}_ms'] == pytest.approx(np.percentile(times, p))
+        assert summary[f'p{p}_memory'] == pytest.approx(np.percentile(deltas, p))
+    assert caches['charts'] == {'hits': 25, 'misses': 50, 'hit_rate': 25 / 75}
+
+
+def test_summarize_keeps_fragment_runs_apart():
+    runs = [
+        {'page': 'malaysia', 'stages': [{'stage': 'render', 'ms': 10.0, 'memory_delta': 0}]},
+        {'page': 'malaysia', 'fragment': 'prediction_section',
+         'stages': [{'stage': 'render', 'ms': 2.0, 'memory_delta': 0}]},
+    ]
+    stages, caches = summarize(runs)
+    assert stages['malaysia: render']['p50_ms'] == 10.0
+    assert stages['malaysia / prediction_section: render']['p50_ms'] == 2.0
+    assert caches == {}
+
+
+def test_disabled_profiler_records_nothing(monkeypatch):
+    monkeypatch.setattr(profiler, 'ENABLED', False)
+    with stage('load'):
+        count('charts', True)
+    assert current_records() is None
+
+
+def test_stages_and_counts_go_to_the_run(run_context):
+    with stage('load'):
+        count('charts', True)
+        count('charts', False)
+    records = current_records()
+    assert [record['stage'] for record in records['stages']] == ['load']
+    assert records['stages'][0]['ms'] >= 0
+    assert records['cache'] == {'charts': [1, 1]}
+
+    # A worker thread reports to the records it is handed
+    worker_records = {'stages': [], 'cache': {}}
+    with recording(worker_records):
+        count('tables', True)
+    assert worker_records['cache'] == {'tables': [1, 0]}
+    assert 'tables' not in records['cache']
+
+
+def test_fragment_rerun_is_logged_as_its_own_run(run_context):
+    @profiled_fragment('malaysia')
+    def prediction_section():
+        with stage('render'):
+            pass
+
+    run_context.fragment_ids_this_run = ['fragment']
+    prediction_section()
+    runs = read_log()
+    assert len(runs) == 1
+    assert (runs[0]['page'], runs[0]['fragment']) == ('malaysia', 'prediction_section')
+    assert [record['stage'] for record in runs[0]['stages']] == ['render']
+    # The next run starts from empty records
+    assert '_profiler_records' not in run_context.session_state
+
+
+def test_fragment_in_a_full_run_belongs_to_the_page(run_context):
+    @profiled_fragment('malaysia')
+    def prediction_section():
+        with stage('render'):
+            pass
+
+    prediction_section()
+    assert read_log() == []
+    assert [record['stage'] for record in current_records()['stages']] == ['render']
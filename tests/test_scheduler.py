@@ -0,0 +1,48 @@
+import concurrent.futures
+import sys
+
+import pandas as pd
+import pytest
+
+import figures
+import scheduler
+from figures import LineChart, cached_chart
+from lru import SizedLRU
+from scheduler import PageTasks
+
+
+@pytest.fixture
+def chart_processes(monkeypatch):
+    # A pool of this test's own, with a single chart process
+    monkeypatch.setattr(scheduler, 'PROCESSES', 1)
+    monkeypatch.setattr(scheduler, '_processes', None)
+    monkeypatch.setattr(figures, 'RENDERER', 'matplotlib')
+    monkeypatch.setattr(figures, '_chart_cache', SizedLRU(figures.MEMORY_LIMIT_BYTES))
+    yield
+    if scheduler._processes:
+        scheduler._processes.shutdown()
+
+
+def test_chart_is_rendered_in_a_chart_process(chart_processes):
+    main = sys.modules['__main__']
+    data = pd.DataFrame({'Year': [2000, 2001, 2002], 'Population': [1.0, 2.0, 4.0]})
+    built = []
+
+    def build():
+        built.append(True)
+        return LineChart(data, x='Year', y='Population', title="Test", xlabel="Year", ylabel="Population")
+
+    tasks = PageTasks()
+    tasks.chart('test_chart', ('state',), 'v1', build)
+    tasks.run()
+
+    assert built == [True]
+    assert isinstance(scheduler._processes, concurrent.futures.ProcessPoolExecutor)
+    assert cached_chart('test_chart', ('state',), 'v1').startswith(b'\x89PNG')
+    # The page's module is back once the processes are started
+    assert sys.modules['__main__'] is main
+
+    # Cached now: displayed without building it again
+    tasks.chart('test_chart', ('state',), 'v1', build)
+    tasks.run()
+    assert built == [True]
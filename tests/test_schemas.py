@@ -0,0 +1,79 @@
+import io
+import logging
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import schemas
+from fixtures import airports, dosm_population, gapminder
+from schemas import STRING_DTYPE, apply_schema, schema_version, table_to_frame
+
+FIXTURES = {'gapminder': gapminder, 'us_airports': airports, 'malaysia_population': dosm_population}
+
+
+def _parsed(name):
+    # As datasets.py parses a CSV download (parquet keeps its own types)
+    df = FIXTURES[name](1, np.random.default_rng(0))
+    if name == 'malaysia_population':
+        return df
+    return pd.read_csv(io.StringIO(df.to_csv(index=False)))
+
+
+@pytest.mark.parametrize('name', list(FIXTURES))
+def test_declared_dtypes_keep_the_values(name):
+    parsed = _parsed(name)
+    converted, footprint = apply_schema(name, parsed)
+    for column, dtype in schemas.SCHEMAS[name].items():
+        expected = STRING_DTYPE if dtype == 'string' else dtype
+        assert converted[column].dtype == expected, column
+
+    # Same values as parsed, except for the float32 coordinates
+    comparable = converted.astype({
+        column: parsed[column].dtype for column in converted.columns if column not in ('lat', 'long')
+    })
+    pd.testing.assert_frame_equal(comparable.drop(columns=['lat', 'long'], errors='ignore'),
+                                  parsed.drop(columns=['lat', 'long'], errors='ignore'))
+    for column in ('lat', 'long'):
+        if column in converted:
+            np.testing.assert_allclose(converted[column], parsed[column], rtol=1e-6)
+    assert footprint['after_bytes'] < footprint['before_bytes']
+
+
+def test_column_that_does_not_fit_is_kept_as_parsed(caplog):
+    parsed = pd.DataFrame({'year': [1952, 100_000], 'pop': [1.0, 2.0], 'extra': ['a', 'b']})
+    with caplog.at_level(logging.WARNING, logger='schemas'):
+        converted, _ = apply_schema('gapminder', parsed)
+    assert converted['year'].dtype == parsed['year'].dtype
+    assert converted['year'].tolist() == [1952, 100_000]
+    # Unlisted columns are left alone
+    assert converted['extra'].dtype == object
+    assert "gapminder.year" in caplog.text
+
+    # Missing values have no integer dtype either
+    converted, _ = apply_schema('gapminder', pd.DataFrame({'year': [1952, None]}))
+    assert converted['year'].dtype == np.float64
+
+
+def test_dates_are_coarsened_and_bad_dates_become_nat():
+    parsed = pd.DataFrame({'date': ['2020-01-01', 'not a date', None]})
+    converted, _ = apply_schema('malaysia_population', parsed)
+    assert converted['date'].dtype == 'datetime64[s]'
+    assert converted['date'].iloc[0] == pd.Timestamp('2020-01-01')
+    assert converted['date'].iloc[1:].isna().all()
+
+
+@pytest.mark.parametrize('name', list(FIXTURES))
+def test_arrow_snapshot_round_trips_the_dtypes(name):
+    converted, _ = apply_schema(name, _parsed(name))
+    table = pa.Table.from_pandas(converted, preserve_index=False)
+    pd.testing.assert_frame_equal(table_to_frame(table), converted)
+
+
+def test_schema_version_follows_the_schema(monkeypatch):
+    version = schema_version('gapminder')
+    assert schema_version('gapminder') == version
+    monkeypatch.setitem(schemas.SCHEMAS['gapminder'], 'year', 'int32')
+    assert schema_version('gapminder') != version
+    assert schema_version('unknown') == schema_version('other unknown')
@@ -0,0 +1,106 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import uploads
+from uploads import load_upload, parse_upload, sample_rows
+
+
+def _csv(rows=1000):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'id': np.arange(rows),
+        'state': rng.choice(['Selangor', 'Johor', 'Sabah'], rows),
+        'name': [f'name {i}' for i in range(rows)],
+        'value': rng.uniform(0, 1, rows),
+    }).to_csv(index=False).encode()
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    # Several chunks even for small files
+    monkeypatch.setattr(uploads, 'CHUNK_ROWS', 128)
+
+
+def test_whole_file_within_budgets():
+    result = parse_upload(_csv())
+    expected = pd.read_csv(io.BytesIO(_csv()))
+    assert result['truncated'] is None
+    assert result['rows'] == len(result['frame']) == 1000
+    pd.testing.assert_frame_equal(result['frame'].astype(expected.dtypes.to_dict()), expected)
+
+
+def test_row_budget_truncates_mid_chunk():
+    result = parse_upload(_csv(), max_rows=300)
+    assert result['truncated'] == 'rows'
+    assert result['rows'] == len(result['frame']) == 300
+    assert result['frame']['id'].tolist() == list(range(300))
+
+
+def test_memory_budget_truncates_within_the_budget():
+    full = parse_upload(_csv())
+    budget = full['bytes'] // 3
+    result = parse_upload(_csv(), max_bytes=budget)
+    assert result['truncated'] == 'memory'
+    assert 0 < result['rows'] < 1000
+    assert result['bytes'] <= budget
+    assert result['frame']['id'].tolist() == list(range(result['rows']))
+
+
+def test_dtypes_are_inferred_and_downcast():
+    frame = parse_upload(_csv())['frame']
+    assert isinstance(frame['state'].dtype, pd.CategoricalDtype)
+    assert frame['name'].dtype == object
+    assert frame['id'].dtype == np.int16
+    # Random floats need all of float64
+    assert frame['value'].dtype == np.float64
+
+
+def test_floats_are_only_narrowed_when_exact():
+    frame = parse_upload(b'a,b,c\n0.1,0.5,1.5\n123456.789,,2.25\n')['frame']
+    assert frame['a'].tolist() == [0.1, 123456.789]
+    assert frame['a'].dtype == np.float64
+    # Halves and quarters are exact in float32, the empty cell stays missing
+    assert frame['b'].dtype == frame['c'].dtype == np.float32
+    assert frame['b'].iloc[0] == 0.5 and pd.isna(frame['b'].iloc[1])
+    assert frame['c'].tolist() == [1.5, 2.25]
+
+
+def test_header_only_file_keeps_text_columns():
+    result = parse_upload(b'a,b,c\n')
+    assert result['rows'] == 0
+    assert (result['frame'].dtypes == object).all()
+
+
+def test_profile_matches_the_data():
+    data = b'x,y\n1,a\n,b\n3,a\n'
+    profile = parse_upload(data)['profile'].set_index('column')
+    assert profile.loc['x', ['count', 'nulls', 'min', 'max', 'distinct']].tolist() == [2, 1, '1.0', '3.0', '2']
+    assert profile.loc['y', ['count', 'nulls', 'distinct']].tolist() == [3, 0, '2']
+
+
+def test_uploads_are_cached_by_content(monkeypatch):
+    monkeypatch.setattr(uploads, '_upload_cache', uploads.SizedLRU(uploads.UPLOAD_CACHE_BYTES))
+    first = load_upload(io.BytesIO(_csv()))
+    assert load_upload(io.BytesIO(_csv())) is first
+    # Other budgets are parsed again
+    assert load_upload(io.BytesIO(_csv()), max_rows=10)['rows'] == 10
+
+
+def test_upload_cache_has_its_own_budget(monkeypatch):
+    monkeypatch.setattr(uploads, '_upload_cache', uploads.SizedLRU(1))
+    load_upload(io.BytesIO(_csv(10)))
+    load_upload(io.BytesIO(_csv(20)))
+    # Only the latest upload is kept over the budget
+    assert len(uploads._upload_cache._entries) == 1
+
+
+def test_sample_rows_keeps_the_original_order():
+    df = pd.DataFrame({'x': range(1000)})
+    sample = sample_rows(df, 50)
+    assert len(sample) == 50
+    assert sample['x'].is_monotonic_increasing
+    pd.testing.assert_frame_equal(sample, sample_rows(df, 50))
+    assert sample_rows(df, 5000) is df
@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+import warmup
+from warmup import start, status, wait_for
+
+
+@pytest.fixture
+def tasks(monkeypatch):
+    """
+    Warm-up tasks of this test's own, set with tasks.update(), and a
+    warm-up that has not started yet.
+    """
+    monkeypatch.setattr(warmup, 'ENABLED', True)
+    monkeypatch.setattr(warmup, '_tasks', {})
+    monkeypatch.setattr(warmup, 'TASKS', {})
+    return warmup.TASKS
+
+
+def _wait_all():
+    for task in warmup._tasks.values():
+        task['future'].result()
+
+
+def test_tasks_run_once_per_process(tasks):
+    calls = []
+    tasks.update({'a': ("data a", lambda: calls.append('a')), 'b': ("data b", lambda: calls.append('b'))})
+    start()
+    start()
+    _wait_all()
+    assert sorted(calls) == ['a', 'b']
+    assert {name: task['state'] for name, task in status().items()} == {'a': 'ready', 'b': 'ready'}
+    assert all(task['seconds'] >= 0 and task['error'] is None for task in status().values())
+    assert 'future' not in status()['a']
+
+
+def test_failed_task_is_reported_without_stopping_the_others(tasks):
+    def fail():
+        raise OSError("offline")
+
+    tasks.update({'broken': ("broken data", fail), 'fine': ("fine data", lambda: None)})
+    start()
+    _wait_all()
+    assert status()['broken']['state'] == 'failed'
+    assert status()['broken']['error'] == "OSError: offline"
+    assert status()['fine']['state'] == 'ready'
+
+
+def test_wait_for_returns_once_the_task_is_done(tasks):
+    release = threading.Event()
+    tasks['slow'] = ("slow data", release.wait)
+    start()
+    assert status()['slow']['state'] in ('pending', 'running')
+
+    waiter = threading.Thread(target=wait_for, args=('slow',))
+    waiter.start()
+    waiter.join(0.2)
+    assert waiter.is_alive()
+    release.set()
+    waiter.join(5)
+    assert not waiter.is_alive()
+    assert status()['slow']['state'] == 'ready'
+
+    # Tasks that do not exist are not waited for
+    wait_for('unknown')
+
+
+def test_disabled_warm_up_does_nothing(tasks, monkeypatch):
+    monkeypatch.setattr(warmup, 'ENABLED', False)
+    tasks['a'] = ("data a", lambda: pytest.fail("warm-up ran while disabled"))
+    start()
+    assert status() == {}
+    wait_for('a')